@@ -52,10 +52,212 @@ class Conf:
             required=False,
             help='if specified, runs prometheus deamon on specified port, which provide statistic and performance data',
         )
+        add(
+            '--response-cache-size',
+            type=int,
+            env_var='RESPONSE_CACHE_SIZE',
+            help='megabytes of memory for results of cached API methods, kept until indexer completes next block; 0 disables the cache',
+            default=0,
+        )
+        add(
+            '--response-cached-methods',
+            type=str,
+            nargs='+',
+            env_var='RESPONSE_CACHED_METHODS',
+            help='API methods which results are cached when --response-cache-size is set',
+            default=['bridge.get_ranked_posts', 'bridge.get_post', 'bridge.get_discussion', 'condenser_api.get_content'],
+        )
+        add(
+            '--batch-request-concurrency',
+            type=int,
+            env_var='BATCH_REQUEST_CONCURRENCY',
+            help='max number of members of single JSON-RPC batch request which are processed at the same time; 0 means no limit',
+            default=8,
+        )
+        add(
+            '--single-flight',
+            type=strtobool,
+            env_var='SINGLE_FLIGHT',
+            help='identical API calls made at the same time (by any clients) share one call of the method; set to false to run each of them',
+            default=True,
+        )
+        add(
+            '--workers',
+            type=int,
+            env_var='WORKERS',
+            help='number of server processes accepting connections on the same port; SIGHUP replaces them one by one',
+            default=1,
+        )
+        add('--db-pool-min-size', type=int, env_var='DB_POOL_MIN_SIZE', help='number of database connections kept open by the server', default=1)
+        add('--db-pool-max-size', type=int, env_var='DB_POOL_MAX_SIZE', help='max number of database connections of the server (of each worker)', default=20)
+        add(
+            '--db-acquire-timeout',
+            type=float,
+            env_var='DB_ACQUIRE_TIMEOUT',
+            help='seconds an API call waits for free database connection before it fails; 0 means no limit',
+            default=0,
+        )
+        add(
+            '--replica-urls',
+            type=str,
+            nargs='+',
+            env_var='REPLICA_URLS',
+            help='connection urls of read replicas of the database, used for queries of API methods',
+            default=[],
+        )
+        add(
+            '--replica-weights',
+            type=int,
+            nargs='+',
+            env_var='REPLICA_WEIGHTS',
+            help='relative share of queries sent to each of --replica-urls (1 for each when not given)',
+            default=[],
+        )
+        add(
+            '--replica-max-lag',
+            type=int,
+            env_var='REPLICA_MAX_LAG',
+            help='replica which head block is more blocks behind primary is not used until it catches up',
+            default=20,
+        )
+        add(
+            '--db-pool-size',
+            type=int,
+            env_var='DB_POOL_SIZE',
+            help='max number of idle database connections of indexer kept open for reuse; 0 closes connections after each use',
+            default=20,
+        )
+        add(
+            '--live-parallel-steps',
+            type=int,
+            env_var='LIVE_PARALLEL_STEPS',
+            help='number of connections running independent steps of updating tables after blocks are processed in live sync; '
+            '1 runs all steps in the transaction of blocks, above 1 steps run after blocks are committed, so until they '
+            'finish API readers may see new posts and votes with not yet updated rshares, children counts, feeds, '
+            'notifications, follow counts or reputations',
+            default=1,
+        )
+        add(
+            '--live-wait-channel',
+            type=str,
+            env_var='LIVE_WAIT_CHANNEL',
+            help='notification channel LISTENed on for new blocks in live sync; HAF database has to NOTIFY it (f.e. from a trigger), empty disables',
+            default='',
+        )
+        add(
+            '--live-wait-max-interval',
+            type=float,
+            env_var='LIVE_WAIT_MAX_INTERVAL',
+            help='max time in seconds live sync waits before querying for a new block again, waits grow up to it while there is no block',
+            default=0.5,
+        )
+        add(
+            '--primary-methods',
+            type=str,
+            nargs='+',
+            env_var='PRIMARY_METHODS',
+            help='API methods which always query primary database, as they need the latest state',
+            default=['hive.db_head_state', 'hive.get_info', 'bridge.unread_notifications'],
+        )
+        add(
+            '--statement-timeouts',
+            type=str,
+            nargs='+',
+            env_var='STATEMENT_TIMEOUTS',
+            help='statement timeouts of queries of API methods given as method=milliseconds, f.e. bridge.get_discussion=5000; default=milliseconds applies to other methods',
+            default=[],
+        )
 
         # sync
         add('--max-workers', type=int, env_var='MAX_WORKERS', help='max workers for batch requests', default=6)
         add('--max-batch', type=int, env_var='MAX_BATCH', help='max chunk size for batch requests', default=35)
+        add(
+            '--operations-fetchers',
+            type=int,
+            env_var='OPERATIONS_FETCHERS',
+            help='number of connections fetching operations for disjoint block ranges in parallel during massive sync',
+            default=1,
+        )
+        add(
+            '--flush-with-copy',
+            type=strtobool,
+            env_var='FLUSH_WITH_COPY',
+            help='flush indexer data with binary COPY into staging tables; set to false to use VALUES statements',
+            default=True,
+        )
+        add(
+            '--pipelined-flush-generations',
+            type=int,
+            env_var='PIPELINED_FLUSH_GENERATIONS',
+            help='during massive sync flush data of up to that many batches of blocks in background, while next batches are processed; 0 flushes every batch before processing next one',
+            default=0,
+        )
+        add(
+            '--batch-op-writes',
+            type=strtobool,
+            env_var='BATCH_OP_WRITES',
+            help='during massive sync collect writes of comment, comment_options, delete_comment, promotion transfer, reblog deletion, notify and community operations and apply consecutive writes of the same kind together; set to false to write them one by one',
+            default=True,
+        )
+        add(
+            '--partitioned-tables',
+            type=str,
+            nargs='+',
+            env_var='PARTITIONED_TABLES',
+            help='tables partitioned by ranges of block_num when database schema is created: hive_feed_cache, hive_notifs',
+            default=[],
+        )
+        add(
+            '--partition-retention',
+            type=str,
+            nargs='+',
+            env_var='PARTITION_RETENTION',
+            help='retention of partitions of partitioned tables given as table=days, f.e. hive_notifs=90; older partitions are retired (APIs no longer see their rows), tables not given keep all partitions; not allowed for hive_feed_cache, which holds whole blogs of accounts',
+            default=[],
+        )
+        add(
+            '--retired-partitions',
+            type=str,
+            env_var='RETIRED_PARTITIONS',
+            choices=['detach', 'drop'],
+            help='what is done with partitions past retention: detach keeps them as standalone tables, drop removes them',
+            default='detach',
+        )
+        add(
+            '--live-batch-size',
+            type=int,
+            env_var='LIVE_BATCH_SIZE',
+            help='max number of blocks processed in one transaction of live sync when it is behind; 1 processes blocks one by one',
+            default=20,
+        )
+        add(
+            '--in-memory-reputations',
+            type=strtobool,
+            env_var='IN_MEMORY_REPUTATIONS',
+            help='calculate account reputations in memory during massive sync, instead of by database afterwards',
+            default=False,
+        )
+        add(
+            '--check-reputations',
+            type=strtobool,
+            env_var='CHECK_REPUTATIONS',
+            help='check reputations calculated in memory against ones calculated by database (slow, for testing)',
+            default=False,
+        )
+        add(
+            '--maintenance-memory',
+            type=int,
+            env_var='MAINTENANCE_MEMORY',
+            help='memory (MB) shared by index builds and vacuums run concurrently after massive sync; 0 uses quarter of RAM',
+            default=0,
+        )
+        add(
+            '--post-ids-cache-size',
+            type=int,
+            env_var='POST_IDS_CACHE_SIZE',
+            help='number of posts which ids are cached during sync, so flushed data refers to posts by ids instead of names; 0 disables the cache',
+            default=2000000,
+        )
 
         # --sync-to-s3 seems to be unnecessary
         add(
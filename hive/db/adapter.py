@@ -1,6 +1,7 @@
 """Wrapper for sqlalchemy, providing a simple interface."""
 
 from collections import OrderedDict
+from functools import lru_cache
 import logging
 from time import perf_counter as perf
 
@@ -9,12 +10,22 @@ import sqlalchemy
 
 
 from hive.db.autoexplain_controller import AutoExplainWrapper
+from hive.db.prepared_sql import PreparedSql
 from hive.utils.stats import Stats
 
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 
 log = logging.getLogger(__name__)
 
+# compiled texts of most recently used queries are reused; long queries usually have data embedded and are not
+STATEMENT_CACHE_SIZE = 1024
+MAX_CACHED_STATEMENT_LENGTH = 4096
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _cached_text(sql):
+    return sqlalchemy.text(sql)
+
 
 class Db:
     """RDBMS adapter for hive. Handles connecting and querying."""
@@ -63,7 +74,8 @@ class Db:
         self._conn = []
         self._engine = None
         self._trx_active = False
-        self._prep_sql = {}
+        # names of statements prepared on the connection
+        self._prepared = set()
 
         self.name = name
 
@@ -157,7 +169,7 @@ class Db:
             sql, kwargs = sql
 
         # this method is reserved for anything but SELECT
-        assert self._is_write_query(sql), sql
+        assert self._is_write_query(sql.sql if isinstance(sql, PreparedSql) else sql), sql
         return self._query(sql, **kwargs)
 
     def query_prepared(self, sql, **kwargs):
@@ -186,6 +198,20 @@ class Db:
         row = first(self._query(sql, **kwargs))
         return first(row) if row else None
 
+    def copy_expert(self, sql, stream):
+        """Perform a `COPY ... FROM STDIN`, reading data from `stream`."""
+        try:
+            start = perf()
+            cursor = self._basic_connection.connection.cursor()
+            try:
+                cursor.copy_expert(sql, stream)
+            finally:
+                cursor.close()
+            Stats.log_db(sql, perf() - start)
+        except Exception as e:
+            log.warning("[SQL-ERR] %s in query %s", e.__class__.__name__, sql)
+            raise e
+
     def engine_name(self):
         """Get the name of the engine (e.g. `postgresql`, `mysql`)."""
         _engine_name = self.get_dialect().name
@@ -242,17 +268,24 @@ class Db:
         return (sql, values)
 
     def _sql_text(self, sql, is_prepared):
-        #        if sql in self._prep_sql:
-        #            query = self._prep_sql[sql]
-        #        else:
-        #            query = sqlalchemy.text(sql).execution_options(autocommit=False)
-        #            self._prep_sql[sql] = query
         if is_prepared:
             query = sql
+        elif len(sql) <= MAX_CACHED_STATEMENT_LENGTH:
+            query = _cached_text(sql)
         else:
             query = sqlalchemy.text(sql)
         return query
 
+    def _prepare(self, prepared: PreparedSql) -> str:
+        """Prepares the statement on the connection when it is used for the first time, returns query executing it.
+
+        Prepared statements outlive transactions, so they are prepared once for the lifetime of the connection.
+        """
+        if prepared.name not in self._prepared:
+            self._basic_connection.execute(sqlalchemy.text(prepared.prepare_sql))
+            self._prepared.add(prepared.name)
+        return prepared.execute_sql
+
     def _query(self, sql, is_prepared: bool = False, **kwargs):
         """Send a query off to SQLAlchemy."""
         if sql == 'START TRANSACTION':
@@ -264,7 +297,11 @@ class Db:
 
         try:
             start = perf()
-            query = self._sql_text(sql, is_prepared)
+            if isinstance(sql, PreparedSql):
+                prepared, sql = sql, sql.sql
+                query = self._sql_text(self._prepare(prepared), is_prepared)
+            else:
+                query = self._sql_text(sql, is_prepared)
             if 'log_query' in kwargs and kwargs['log_query']:
                 log.info(f"QUERY: {query}")
             result = self._basic_connection.execution_options(autocommit=False).execute(query, **kwargs)
@@ -0,0 +1,226 @@
+"""Bulk loading of indexer flush data through binary COPY into staging tables."""
+
+from datetime import datetime
+from decimal import Decimal
+import io
+import logging
+import struct
+from typing import Iterable, List, Sequence, Tuple
+
+from hive.utils.misc import chunks
+from hive.utils.normalize import escape_characters, escape_characters_batch
+
+log = logging.getLogger(__name__)
+
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_HEADER = COPY_SIGNATURE + struct.pack('!ii', 0, 0)
+COPY_TRAILER = struct.pack('!h', -1)
+
+NULL_FIELD = struct.pack('!i', -1)
+
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+TIMESTAMP_INFINITY = 0x7FFFFFFFFFFFFFFF
+TIMESTAMP_MINUS_INFINITY = -0x8000000000000000
+
+NUMERIC_POS = 0x0000
+NUMERIC_NEG = 0x4000
+NUMERIC_NAN = 0xC000
+
+
+def _encode_int2(value) -> bytes:
+    return struct.pack('!h', int(value))
+
+
+def _encode_int4(value) -> bytes:
+    return struct.pack('!i', int(value))
+
+
+def _encode_int8(value) -> bytes:
+    return struct.pack('!q', int(value))
+
+
+def _encode_bool(value) -> bytes:
+    return struct.pack('!?', bool(value))
+
+
+def _encode_float8(value) -> bytes:
+    return struct.pack('!d', float(value))
+
+
+def _encode_text(value) -> bytes:
+    # nul char cannot be stored in string column - same replacement as in escape_characters
+    return str(value).replace('\x00', ' ').encode('utf-8')
+
+
+def _encode_timestamp(value) -> bytes:
+    if isinstance(value, str):
+        if value == 'infinity':
+            return struct.pack('!q', TIMESTAMP_INFINITY)
+        if value == '-infinity':
+            return struct.pack('!q', TIMESTAMP_MINUS_INFINITY)
+        value = datetime.fromisoformat(value)
+    delta = value.replace(tzinfo=None) - POSTGRES_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return struct.pack('!q', micros)
+
+
+def _encode_numeric(value) -> bytes:
+    """Encode a number in postgres binary NUMERIC format (base 10000 digits)."""
+    # going through str keeps floats at their shortest repr, as they would be printed into VALUES
+    value = Decimal(str(value))
+    if value.is_nan():
+        return struct.pack('!hhHh', 0, 0, NUMERIC_NAN, 0)
+
+    sign, digits, exponent = value.as_tuple()
+    scale = max(0, -exponent)
+    digits_str = ''.join(str(d) for d in digits)
+    if exponent > 0:
+        digits_str += '0' * exponent
+
+    digits_str = digits_str.rjust(scale + 1, '0')
+    int_part = digits_str[: len(digits_str) - scale]
+    frac_part = digits_str[len(digits_str) - scale :]
+    int_part = int_part.rjust(-(-len(int_part) // 4) * 4, '0')
+    frac_part = frac_part.ljust(-(-len(frac_part) // 4) * 4, '0')
+
+    groups = [int(int_part[i : i + 4]) for i in range(0, len(int_part), 4)]
+    groups += [int(frac_part[i : i + 4]) for i in range(0, len(frac_part), 4)]
+    weight = len(int_part) // 4 - 1
+
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    header = struct.pack('!hhHh', len(groups), weight, NUMERIC_NEG if sign else NUMERIC_POS, scale)
+    return header + struct.pack(f'!{len(groups)}h', *groups)
+
+
+ENCODERS = {
+    'SMALLINT': _encode_int2,
+    'INT': _encode_int4,
+    'INTEGER': _encode_int4,
+    'BIGINT': _encode_int8,
+    'BOOLEAN': _encode_bool,
+    'FLOAT8': _encode_float8,
+    'TEXT': _encode_text,
+    'VARCHAR': _encode_text,
+    'TIMESTAMP': _encode_timestamp,
+    'NUMERIC': _encode_numeric,
+}
+
+
+def encode_copy_binary(rows: Iterable[Sequence], types: Sequence[str]) -> bytes:
+    """Build a complete `COPY ... (FORMAT binary)` payload for given rows."""
+    encoders = [ENCODERS[type_] for type_ in types]
+    field_count = struct.pack('!h', len(encoders))
+
+    out = io.BytesIO()
+    out.write(COPY_HEADER)
+    for row in rows:
+        assert len(row) == len(encoders), f"Expected {len(encoders)} fields, got: {row}"
+        out.write(field_count)
+        for value, encoder in zip(row, encoders):
+            if value is None:
+                out.write(NULL_FIELD)
+            else:
+                data = encoder(value)
+                out.write(struct.pack('!i', len(data)))
+                out.write(data)
+    out.write(COPY_TRAILER)
+    return out.getvalue()
+
+
+def sql_literal(value, type_: str) -> str:
+    """Format a value as a typed SQL literal, as used by `VALUES` based flushes."""
+    if value is None:
+        return f'NULL::{type_}'
+    if type_ in ('TEXT', 'VARCHAR'):
+        return f'{escape_characters(str(value))}::{type_}'
+    if type_ == 'TIMESTAMP':
+        return f"'{value}'::{type_}"
+    return f'{value}::{type_}'
+
+
+class StagingTable:
+    """Session-local table to which indexer rows are copied before being merged into target tables.
+
+    Temporary tables are never WAL-logged and are private to the connection, so every indexer
+    (each with its own connection during massive sync) can stage its data concurrently.
+    """
+
+    def __init__(self, name: str, columns: List[Tuple[str, str]]):
+        self.name = name
+        self.columns = columns
+        self.column_names = [column for column, _ in columns]
+        self.types = [type_ for _, type_ in columns]
+
+    def create_sql(self) -> str:
+        columns = ', '.join(f'{column} {type_}' for column, type_ in self.columns)
+        return f'CREATE TEMPORARY TABLE IF NOT EXISTS {self.name} ({columns})'
+
+    def truncate_sql(self) -> str:
+        return f'TRUNCATE {self.name}'
+
+    def copy_sql(self) -> str:
+        return f"COPY {self.name} ({', '.join(self.column_names)}) FROM STDIN (FORMAT binary)"
+
+    def values_source(self, rows: Iterable[Sequence]) -> str:
+        rows = list(rows)
+        columns = []
+        for idx, type_ in enumerate(self.types):
+            column = [row[idx] for row in rows]
+            if type_ in ('TEXT', 'VARCHAR'):
+                escaped = iter(escape_characters_batch([str(value) for value in column if value is not None]))
+                columns.append([f'NULL::{type_}' if value is None else f'{next(escaped)}::{type_}' for value in column])
+            else:
+                columns.append([sql_literal(value, type_) for value in column])
+        values = ','.join(f"({', '.join(row)})" for row in zip(*columns))
+        return f'(VALUES {values})'
+
+
+class BulkLoader:
+    """Writes rows collected by indexers to the database.
+
+    `merge_sql` passed to `write` is a statement with a single `{}` placeholder, which stands
+    for the relation rows are read from. With COPY enabled it is the staging table filled with
+    one binary COPY, otherwise it is a `VALUES` list (executed in chunks of `VALUES_LIMIT` rows).
+    Fewer than `COPY_MIN_ROWS` rows (f.e. single operation written in live sync) always go in a
+    `VALUES` list, a single query instead of four round trips of staging.
+    """
+
+    VALUES_LIMIT = 1000
+    COPY_MIN_ROWS = 100
+
+    use_copy = True
+
+    @classmethod
+    def setup(cls, use_copy: bool) -> None:
+        cls.use_copy = use_copy
+        log.info(f"Flushing indexer data with {'binary COPY' if use_copy else 'VALUES'} statements")
+
+    @classmethod
+    def write(cls, db, staging: StagingTable, rows: List[Sequence], merge_sql: str, print_query=False) -> int:
+        """Write all rows with `merge_sql`; returns number of rows written."""
+        if not rows:
+            return 0
+
+        if cls.use_copy and len(rows) >= cls.COPY_MIN_ROWS:
+            db.query_no_return(staging.create_sql())
+            db.query_no_return(staging.truncate_sql())
+            db.copy_expert(staging.copy_sql(), io.BytesIO(encode_copy_binary(rows, staging.types)))
+            query = merge_sql.format(staging.name)
+            if print_query:
+                log.info(f"Executing query:\n{query}")
+            db.query_prepared(query)
+        else:
+            for chunk in chunks(rows, cls.VALUES_LIMIT):
+                query = merge_sql.format(staging.values_source(chunk))
+                if print_query:
+                    log.info(f"Executing query:\n{query}")
+                db.query_prepared(query)
+
+        return len(rows)
@@ -0,0 +1,85 @@
+"""Database connections of the indexer kept open between uses."""
+
+import logging
+import threading
+from typing import List, Optional
+
+from hive.db.adapter import Db
+
+log = logging.getLogger(__name__)
+
+# application name of idle pooled connections; leased ones are renamed after their lease
+IDLE_NAME = 'pooled'
+
+
+class ConnectionPool:
+    """Connections of the indexer database leased under names, reused instead of being opened for each use.
+
+    Leased connection shows up in `pg_stat_activity` as `hivemind_<lease name>`; on release its session
+    is reset (which brings back `hivemind_pooled` name) and up to `max_idle` of them are kept open.
+    Statements prepared on a connection stay prepared for its next leases. Without setup (or for other
+    databases) leases are just new connections closed on release.
+    """
+
+    _db: Optional[Db] = None
+    _max_idle = 0
+    _idle: List[Db] = []
+    _leased = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def setup(cls, db: Db, max_idle: int) -> None:
+        cls.close()
+        cls._db = db
+        cls._max_idle = max(0, max_idle)
+        log.info(f"Keeping up to {cls._max_idle} idle database connections open for reuse")
+
+    @classmethod
+    def lease(cls, db: Db, name: str) -> Db:
+        if db is not cls._db:
+            return db.clone(name)
+
+        with cls._lock:
+            leased = cls._idle.pop() if cls._idle else None
+        if leased is None:
+            leased = db.clone(IDLE_NAME)
+        leased.name = name
+        leased.query_no_return("SELECT set_config('application_name', :name, false)", name=f'hivemind_{name}')
+        with cls._lock:
+            cls._leased.add(leased)
+        return leased
+
+    @classmethod
+    def release(cls, db: Db) -> None:
+        with cls._lock:
+            is_leased = db in cls._leased
+            cls._leased.discard(db)
+        if not is_leased:
+            db.close()
+            return
+
+        try:
+            if db.is_trx_active():
+                db.query_no_return("ROLLBACK")
+            db.query_no_return("RESET ALL")
+        except Exception as ex:
+            log.warning(f"Closing database connection '{db.name}' which cannot be reused: {ex}")
+            db.close()
+            return
+
+        db.name = IDLE_NAME
+        with cls._lock:
+            if len(cls._idle) < cls._max_idle:
+                cls._idle.append(db)
+                return
+        db.close()
+
+    @classmethod
+    def close(cls) -> None:
+        """Closes idle connections; leased ones are closed on release."""
+        with cls._lock:
+            idle, cls._idle = cls._idle, []
+            cls._db = None
+            cls._max_idle = 0
+        for db in idle:
+            db.close()
@@ -6,9 +6,11 @@ from concurrent.futures import as_completed, ThreadPoolExecutor
 import logging
 import time
 from time import perf_counter
-from typing import Optional
+from typing import Dict, List, Optional
 
 import sqlalchemy
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
 
 from hive.conf import (
    SCHEMA_NAME
@@ -16,16 +18,44 @@ from hive.conf import (
   )
 
 from hive.db.adapter import Db
-from hive.db.schema import build_metadata, perform_db_upgrade, setup, setup_runtime_code, teardown
+from hive.db.maintenance_scheduler import MaintenanceJob, MaintenanceScheduler
+from hive.db.schema import (
+    build_metadata,
+    PARTITIONABLE_TABLES,
+    perform_db_upgrade,
+    setup,
+    setup_runtime_code,
+    teardown,
+)
 from hive.indexer.auto_db_disposer import AutoDbDisposer
 from hive.server.common.payout_stats import PayoutStats
 from hive.utils.communities_rank import update_communities_posts_and_rank
 from hive.utils.misc import get_memory_amount
 from hive.utils.stats import FinalOperationStatusManager as FOSM
+from hive.utils.task_graph import TaskGraph
 
 log = logging.getLogger(__name__)
 
 SYNCED_BLOCK_LIMIT = 7 * 24 * 1200  # 7 days
+BLOCKS_PER_DAY = 24 * 1200
+
+
+# tables which can be partitioned, but must keep all partitions: blogs of accounts
+# (bridge_get_account_posts_by_blog, condenser_get_blog, condenser_get_by_blog) are read from hive_feed_cache
+NO_RETENTION_TABLES = ('hive_feed_cache',)
+
+
+def parse_partition_retention(entries: List[str]) -> Dict[str, int]:
+    """Map of `table=days` entries."""
+    retention = {}
+    for entry in entries or ():
+        table, sep, days = entry.partition('=')
+        if not sep or not days.strip().isdigit():
+            raise ValueError(f"partition retention should be given as table=days, got: {entry}")
+        if table.strip() in NO_RETENTION_TABLES:
+            raise ValueError(f"partitions of {table.strip()} cannot be retired, it holds whole blogs of accounts")
+        retention[table.strip()] = int(days)
+    return retention
 
 
 class DbState:
@@ -36,13 +66,33 @@ class DbState:
     # prop is true until massive sync complete
     _is_massive_sync = True
 
+    # tables partitioned by ranges of block_num (beside notification cache) with retention of their partitions in blocks
+    _partitioned_tables = {}
+    _detach_retired_partitions = True
+
+    # memory (MB) shared by index builds and vacuums run concurrently after massive sync, 0 for quarter of RAM
+    _maintenance_memory = 0
+
     @classmethod
-    def initialize(cls, enter_massive: bool, schema_upgrade: bool):
+    def initialize(
+        cls,
+        enter_massive: bool,
+        schema_upgrade: bool,
+        partitioned_tables=(),
+        partition_retention: Optional[Dict[str, int]] = None,
+        retired_partitions: str = 'detach',
+        maintenance_memory: int = 0,
+    ):
         """Perform startup database checks.
 
         1) Load schema if needed
         2) Run migrations if needed
         3) Check if massive sync has completed
+
+        `partitioned_tables` are partitioned by ranges of block_num when schema is created. Partitions of
+        tables given in `partition_retention` (in days) are retired (detached or dropped, as given by
+        `retired_partitions`) when all their blocks are older. Indexes are built after massive sync within
+        `maintenance_memory` (MB).
         """
 
         log.info("Welcome to hive!")
@@ -54,7 +104,7 @@ class DbState:
             log.info("Create db schema...")
             db_setup_admin = cls.db().clone('setup_admin')
 
-            setup(admin_db=db_setup_admin, db=db_setup_owner)
+            setup(admin_db=db_setup_admin, db=db_setup_owner, partitioned_tables=partitioned_tables)
             db_setup_admin.close()
         elif schema_upgrade == True:
             log.info("Attempting to perform db schema upgrade...")
@@ -67,11 +117,59 @@ class DbState:
 
         db_setup_owner.close()
 
+        cls._maintenance_memory = maintenance_memory or 0
+        cls._load_partitioned_tables(partitioned_tables, partition_retention or {}, retired_partitions)
+
         # check if massive sync complete
         cls._is_massive_sync = enter_massive
         if enter_massive:
           log.info("[MASSIVE] Continue with massive sync...")
 
+    @classmethod
+    def _load_partitioned_tables(cls, requested_tables, retention: Dict[str, int], retired_partitions: str) -> None:
+        sql = f"""
+            SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = '{SCHEMA_NAME}' AND c.relkind = 'p' AND c.relname = ANY(:tables)
+        """
+        tables = cls.db().query_col(sql, tables=list(PARTITIONABLE_TABLES))
+        if set(requested_tables) != set(tables):
+            log.warning(
+                f"Partitioning of tables is chosen when schema is created, partitioned tables are: {sorted(tables)}"
+            )
+        unknown = set(retention) - set(tables)
+        assert not unknown, f"partition retention given for tables which are not partitioned: {sorted(unknown)}"
+        assert retired_partitions in ('detach', 'drop'), f"unknown action on retired partitions: {retired_partitions}"
+
+        cls._partitioned_tables = {table: retention.get(table, 0) * BLOCKS_PER_DAY for table in tables}
+        cls._detach_retired_partitions = retired_partitions == 'detach'
+        for table, retention_blocks in cls._partitioned_tables.items():
+            if retention_blocks:
+                log.info(f"Table {table} is partitioned by block_num, partitions older than {retention_blocks} blocks are retired")
+            else:
+                log.info(f"Table {table} is partitioned by block_num, all partitions are kept")
+
+    @classmethod
+    def prepare_partitions(cls, first_block: int, last_block: int) -> None:
+        """Create missing partitions of partitioned tables for given blocks, retire the ones past retention of their table.
+
+        Blocks before `first_block` are expected to be processed already, retention is counted from them.
+        """
+        for table, retention_blocks in cls._partitioned_tables.items():
+            sql = f"SELECT {SCHEMA_NAME}.create_block_partitions(:table, :first_block, :last_block)"
+            created = cls.db().query_one(sql, table=table, first_block=first_block, last_block=last_block)
+            if created:
+                log.info(f"Created {created} partitions of {table} for blocks up to {last_block}")
+
+            if not retention_blocks:
+                continue
+            sql = f"SELECT {SCHEMA_NAME}.retire_block_partitions(:table, :limit_block, :detach)"
+            retired = cls.db().query_one(
+                sql, table=table, limit_block=first_block - 1 - retention_blocks, detach=cls._detach_retired_partitions
+            )
+            if retired:
+                action = 'Detached' if cls._detach_retired_partitions else 'Dropped'
+                log.info(f"{action} {retired} partitions of {table} older than {retention_blocks} blocks")
+
     @classmethod
     def teardown(cls):
         """Drop all tables in db."""
@@ -173,8 +271,12 @@ class DbState:
         return to_return
 
     @classmethod
-    def has_index(cls, db, idx_name):
+    def has_index(cls, db, idx_name, valid=False):
+        """Check if index exists; with `valid` also require it to be usable (index of partitioned table whose
+        build was interrupted is not valid until it is attached on all partitions)."""
         sql = "SELECT count(*) FROM pg_class WHERE relname = :relname"
+        if valid:
+            sql = "SELECT count(*) FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :relname AND i.indisvalid"
         count = db.query_one(sql, relname=idx_name)
         if count == 1:
             return True
@@ -220,66 +322,176 @@ class DbState:
             assert work_mem_after == work_mem_before, f'work_mem was changed: {work_mem_before} -> {work_mem_after}'
 
     @classmethod
-    def processing_indexes_per_table(cls, db, table_name, indexes, is_pre_process, drop, create):
+    def processing_indexes_per_table(cls, db, table_name, indexes, is_pre_process):
         log.info("[MASSIVE] Begin %s-massive sync hooks for table %s", "pre" if is_pre_process else "post", table_name)
         with AutoDbDisposer(db, table_name) as db_mgr:
             engine = db_mgr.db.engine()
 
-            any_index_created = False
-
             for index in indexes:
-                log.info("%s index %s.%s", ("Drop" if is_pre_process else "Recreate"), index.table, index.name)
+                log.info("Drop index %s.%s", index.table, index.name)
                 try:
-                    if drop:
-                        if cls.has_index(db_mgr.db, index.name):
-                            time_start = perf_counter()
-                            index.drop(engine)
-                            end_time = perf_counter()
-                            elapsed_time = end_time - time_start
-                            log.info("Index %s dropped in time %.4f s", index.name, elapsed_time)
-                except sqlalchemy.exc.ProgrammingError as ex:
-                    log.warning(f"Ignoring ex: {ex}")
-
-                if create:
                     if cls.has_index(db_mgr.db, index.name):
-                        log.info("Index %s already exists... Creation skipped.", index.name)
-                    else:
                         time_start = perf_counter()
-                        index.create(engine)
+                        index.drop(engine)
                         end_time = perf_counter()
                         elapsed_time = end_time - time_start
-                        log.info("Index %s created in time %.4f s", index.name, elapsed_time)
-                        any_index_created = True
+                        log.info("Index %s dropped in time %.4f s", index.name, elapsed_time)
+                except sqlalchemy.exc.ProgrammingError as ex:
+                    log.warning(f"Ignoring ex: {ex}")
 
         log.info("[MASSIVE] End %s-massive sync hooks for table %s", "pre" if is_pre_process else "post", table_name)
 
     @classmethod
-    def processing_indexes(cls, is_pre_process, drop, create):
-        start_time = FOSM.start()
-        action = 'CREATING' if create else 'DROPPING'
-        _indexes = cls._disableable_indexes()
-
-        methods = []
-        for _key_table, indexes in _indexes.items():
-            methods.append(
-                (
-                    _key_table.name,
-                    cls.processing_indexes_per_table,
-                    [cls.db(), _key_table.name, indexes, is_pre_process, drop, create],
+    def _relations(cls) -> Dict[str, dict]:
+        """Tables of the schema with their size (MB) and partitions (leaf ones, with their size)."""
+        sql = f"""
+            SELECT c.relname, c.relkind, pg_total_relation_size(c.oid) / 1048576.0 AS size_mb, p.relname AS parent
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND c.relispartition
+            LEFT JOIN pg_class p ON p.oid = i.inhparent
+            WHERE n.nspname = '{SCHEMA_NAME}' AND c.relkind IN ('r', 'p')
+        """
+        relations = {}
+        rows = cls.db().query_all(sql)
+        for row in rows:
+            relations[row['relname']] = dict(size_mb=float(row['size_mb']), partitions={}, partitioned=row['relkind'] == 'p')
+        for row in rows:
+            if row['parent'] in relations:
+                relations[row['parent']]['partitions'][row['relname']] = relations[row['relname']]['size_mb']
+                relations[row['parent']]['size_mb'] += relations[row['relname']]['size_mb']
+        return relations
+
+    @classmethod
+    def _index_jobs(cls, relations: Dict[str, dict]) -> List[MaintenanceJob]:
+        """Jobs creating missing disableable indexes.
+
+        Index of partitioned table is created on the parent only and then built on each partition by separate
+        job which attaches it, so partitions of the same table are indexed concurrently as well.
+        """
+        jobs = []
+        for table, indexes in cls._disableable_indexes().items():
+            relation = relations.get(table.name, dict(size_mb=0.0, partitions={}, partitioned=False))
+            for index in indexes:
+                if cls.has_index(cls.db(), index.name, valid=True):
+                    log.info("Index %s already exists... Creation skipped.", index.name)
+                    continue
+                sql = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+                on_table = f" ON {SCHEMA_NAME}.{table.name} "
+                if not relation['partitioned']:
+                    jobs.append(MaintenanceJob(f"index {index.name}", table.name, relation['size_mb'], [sql]))
+                    continue
+
+                parent_job = MaintenanceJob(
+                    f"index {index.name}",
+                    table.name,
+                    0.0,
+                    [sql.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1).replace(on_table, f" ON ONLY {SCHEMA_NAME}.{table.name} ", 1)],
                 )
+                jobs.append(parent_job)
+                for partition, size_mb in relation['partitions'].items():
+                    partition_index = f"{index.name}_{partition[len(table.name) + 1:]}"
+                    partition_sql = sql.replace(f"CREATE INDEX {index.name} ", f"CREATE INDEX IF NOT EXISTS {partition_index} ", 1)
+                    jobs.append(
+                        MaintenanceJob(
+                            f"index {partition_index}",
+                            partition,
+                            size_mb,
+                            [
+                                partition_sql.replace(on_table, f" ON {SCHEMA_NAME}.{partition} ", 1),
+                                f"ALTER INDEX {SCHEMA_NAME}.{index.name} ATTACH PARTITION {SCHEMA_NAME}.{partition_index}",
+                            ],
+                            after=[parent_job],
+                        )
+                    )
+        return jobs
+
+    @classmethod
+    def _analyze_jobs(cls, relations: Dict[str, dict], index_jobs: List[MaintenanceJob]) -> List[MaintenanceJob]:
+        """Jobs vacuuming and analyzing tables changed since they were last analyzed, once their indexes are built.
+
+        Parents of partitioned tables are only analyzed (autovacuum never does it), after their changed partitions.
+        """
+        sql = f"""
+            SELECT relname FROM pg_stat_user_tables
+            WHERE schemaname = '{SCHEMA_NAME}' AND (n_mod_since_analyze > 0 OR n_ins_since_vacuum > 0)
+        """
+        changed = set(cls.db().query_col(sql))
+        jobs = {}
+        for table in sorted(changed & relations.keys()):
+            jobs[table] = MaintenanceJob(
+                f"vacuum {table}",
+                table,
+                relations[table]['size_mb'],
+                [f"VACUUM (ANALYZE) {SCHEMA_NAME}.{table}"],
+                after=[job for job in index_jobs if job.table == table],
             )
+        for table, relation in relations.items():
+            changed_partitions = [jobs[partition] for partition in relation['partitions'] if partition in jobs]
+            if relation['partitioned'] and changed_partitions:
+                jobs[table] = MaintenanceJob(
+                    f"analyze {table}",
+                    table,
+                    relation['size_mb'],
+                    [f"ANALYZE {SCHEMA_NAME}.{table}"],
+                    after=changed_partitions + [job for job in index_jobs if job.table == table],
+                )
+        return list(jobs.values())
+
+    @classmethod
+    def _run_maintenance(cls, action: str, create_indexes: bool, analyze: bool) -> None:
+        """Builds missing indexes and/or vacuums changed tables, concurrently within limits of connections and memory."""
+        start_time = FOSM.start()
+        relations = cls._relations()
+        jobs = cls._index_jobs(relations) if create_indexes else []
+        if analyze:
+            jobs += cls._analyze_jobs(relations, jobs)
 
-        cls.process_tasks_in_threads("[MASSIVE] %i threads finished creating indexes.", methods)
+        memory_mb = cls._maintenance_memory or int(get_memory_amount() / 4)
+        max_jobs = Db.max_connections - Db.necessary_connections
+        log.info(f"[MASSIVE] {len(jobs)} maintenance jobs, at most {max(1, max_jobs)} concurrent ones using {memory_mb}MB")
+        MaintenanceScheduler(cls.db(), max_jobs, memory_mb).run("[MASSIVE] %i maintenance jobs finished.", jobs)
 
         real_time = FOSM.stop(start_time)
 
-        log.info(f"=== {action} INDEXES ===")
-        threads_time = FOSM.log_current(f"Total {action} indexes time")
+        log.info(f"=== {action} ===")
+        jobs_time = FOSM.log_current(f"Total {action} time")
         log.info(
-            f"Elapsed time: {real_time :.4f}s. Calculated elapsed time: {threads_time :.4f}s. Difference: {real_time - threads_time :.4f}s"
+            f"Elapsed time: {real_time :.4f}s. Calculated elapsed time: {jobs_time :.4f}s. Difference: {real_time - jobs_time :.4f}s"
         )
         FOSM.clear()
-        log.info(f"=== {action} INDEXES ===")
+        log.info(f"=== {action} ===")
+
+    @classmethod
+    def processing_indexes(cls, is_pre_process, drop, create, analyze=False):
+        if drop:
+            start_time = FOSM.start()
+            _indexes = cls._disableable_indexes()
+
+            methods = []
+            for _key_table, indexes in _indexes.items():
+                methods.append(
+                    (
+                        _key_table.name,
+                        cls.processing_indexes_per_table,
+                        [cls.db(), _key_table.name, indexes, is_pre_process],
+                    )
+                )
+
+            cls.process_tasks_in_threads("[MASSIVE] %i threads finished dropping indexes.", methods)
+
+            real_time = FOSM.stop(start_time)
+
+            log.info("=== DROPPING INDEXES ===")
+            threads_time = FOSM.log_current("Total DROPPING indexes time")
+            log.info(
+                f"Elapsed time: {real_time :.4f}s. Calculated elapsed time: {threads_time :.4f}s. Difference: {real_time - threads_time :.4f}s"
+            )
+            FOSM.clear()
+            log.info("=== DROPPING INDEXES ===")
+
+        if create:
+            cls._run_maintenance("CREATING INDEXES", True, analyze)
 
     @classmethod
     def before_massive_sync(cls, last_imported_block: int, hived_head_block: int):
@@ -375,6 +587,25 @@ class DbState:
 
     @classmethod
     def _finish_account_reputations(cls, db, last_imported_block, current_imported_block):
+        from hive.indexer.reputations import ReputationEngine
+
+        if ReputationEngine.covers(last_imported_block + 1):
+            with AutoDbDisposer(db, "finish_account_reputations") as db_mgr:
+                if ReputationEngine.check:
+                    cls._check_account_reputations(db_mgr.db, last_imported_block + 1, current_imported_block)
+
+                time_start = perf_counter()
+                written = ReputationEngine.write_changed(db_mgr.db)
+                sql = f"SELECT {SCHEMA_NAME}.truncate_account_reputation_data('30 days'::interval, True);"
+                cls._execute_query_with_modified_work_mem(db=db_mgr.db, sql=sql)
+                log.info("[MASSIVE] %i reputations calculated in memory written in %.4fs", written, perf_counter() - time_start)
+            ReputationEngine.stop()
+            return
+
+        if ReputationEngine.is_running():
+            log.info("Reputation engine didn't process all blocks since last completed one, reputations are calculated by database")
+            ReputationEngine.stop()
+
         log.info(
             f"Performing update_account_reputations on block range: {last_imported_block}:{current_imported_block}"
         )
@@ -385,6 +616,25 @@ class DbState:
             cls._execute_query_with_modified_work_mem(db=db_mgr.db, sql=sql)
             log.info("[MASSIVE] update_account_reputations executed in %.4fs", perf_counter() - time_start)
 
+    @classmethod
+    def _check_account_reputations(cls, db, first_block, last_block):
+        """Compares reputations calculated in memory with ones calculated by `calculate_account_reputations`."""
+        from hive.indexer.reputations import ReputationEngine
+
+        time_start = perf_counter()
+        sql = f"SELECT id, reputation, is_implicit FROM {SCHEMA_NAME}.calculate_account_reputations({first_block}, {last_block})"
+        expected = {row['id']: (row['reputation'], row['is_implicit']) for row in db.query_all(sql)}
+        calculated = {account_id: (reputation, is_implicit) for account_id, reputation, is_implicit in ReputationEngine.changed_reputations()}
+        mismatched = sorted(
+            account_id for account_id in expected.keys() | calculated.keys() if expected.get(account_id) != calculated.get(account_id)
+        )
+        for account_id in mismatched[:20]:
+            log.error(
+                f"Reputation of account {account_id} calculated in memory: {calculated.get(account_id)}, by database: {expected.get(account_id)}"
+            )
+        assert not mismatched, f"reputations of {len(mismatched)} accounts differ from ones calculated by database"
+        log.info(f"Reputations of {len(expected)} accounts checked in {perf_counter() - time_start:.4f}s")
+
     @classmethod
     def _finish_communities_posts_and_rank(cls, db):
         with AutoDbDisposer(db, "finish_communities_posts_and_rank") as db_mgr:
@@ -402,10 +652,10 @@ class DbState:
             log.info("[MASSIVE] update_last_completed_block executed in %.4fs", perf_counter() - time_start)
 
     @classmethod
-    def _finish_notification_cache(cls, db):
+    def _finish_notification_cache(cls, db, last_imported_block, current_imported_block):
         with AutoDbDisposer(db, "finish_notification_cache") as db_mgr:
             time_start = perf_counter()
-            sql = f"SELECT {SCHEMA_NAME}.update_notification_cache(NULL, NULL, False);"
+            sql = f"SELECT {SCHEMA_NAME}.update_notification_cache({last_imported_block}, {current_imported_block}, True);"
             cls._execute_query_with_modified_work_mem(db=db_mgr.db, sql=sql)
             log.info("[MASSIVE] update_notification_cache executed in %.4fs", perf_counter() - time_start)
 
@@ -446,49 +696,88 @@ class DbState:
         pool.shutdown()
         log.info(f'{info} Real elapsed time: {perf_counter() - start_time:.3f}', completedThreads)
 
+    @classmethod
+    def _finished_final_steps(cls, last_imported_block, current_imported_block) -> List[str]:
+        """Steps of finalization already done for the block range (by a run which was interrupted)."""
+        sql = f"""
+            SELECT step FROM {SCHEMA_NAME}.hive_finalization_steps
+            WHERE first_block_num = :first_block AND last_block_num = :last_block
+        """
+        return cls.db().query_col(sql, first_block=last_imported_block, last_block=current_imported_block)
+
+    @classmethod
+    def _save_final_step(cls, step, last_imported_block, current_imported_block) -> None:
+        sql = f"""
+            INSERT INTO {SCHEMA_NAME}.hive_finalization_steps (step, first_block_num, last_block_num)
+            VALUES (:step, :first_block, :last_block)
+            ON CONFLICT (step) DO UPDATE SET first_block_num = EXCLUDED.first_block_num, last_block_num = EXCLUDED.last_block_num
+        """
+        cls.db().query_no_return(sql, step=step, first_block=last_imported_block, last_block=current_imported_block)
+
+    @classmethod
+    def _final_steps(cls, massive_sync_preconditions, last_imported_block, current_imported_block) -> TaskGraph:
+        """Steps filling tables with final values, each depending only on steps whose results it reads."""
+        steps = TaskGraph()
+        steps.add('hive_feed_cache', cls._finish_hive_feed_cache, [cls.db(), last_imported_block, current_imported_block])
+        steps.add('hive_mentions', cls._finish_hive_mentions, [cls.db(), last_imported_block, current_imported_block])
+        steps.add('payout_stats_view', cls._finish_payout_stats_view)
+        steps.add('communities_posts_and_rank', cls._finish_communities_posts_and_rank, [cls.db()])
+        steps.add(
+            'hive_posts',
+            cls._finish_hive_posts,
+            [cls.db(), massive_sync_preconditions, last_imported_block, current_imported_block],
+        )
+        steps.add('follow_count', cls._finish_follow_count, [cls.db(), last_imported_block, current_imported_block])
+        # hive_posts_api_helper is dependent on `hive_posts/root_id` filling
+        steps.add(
+            'hive_posts_api_helper',
+            cls._finish_hive_posts_api_helper,
+            [cls.db(), last_imported_block, current_imported_block],
+            after=['hive_posts'],
+        )
+        # notifications are scored with rshares of posts and include mentions
+        steps.add(
+            'notification_cache',
+            cls._finish_notification_cache,
+            [cls.db(), last_imported_block, current_imported_block],
+            after=['hive_posts', 'hive_mentions'],
+        )
+        # blocks are marked as completed once all their data is final, so an interrupted finalization is run again
+        steps.add(
+            'blocks_consistency_flag',
+            cls._finish_blocks_consistency_flag,
+            [cls.db(), last_imported_block, current_imported_block],
+            after=steps.names(),
+        )
+        return steps
+
     @classmethod
     def _finish_all_tables(cls, massive_sync_preconditions, last_imported_block, current_imported_block):
         start_time = FOSM.start()
 
         log.info("#############################################################################")
 
-        methods = [
-            ('hive_feed_cache', cls._finish_hive_feed_cache, [cls.db(), last_imported_block, current_imported_block]),
-            ('hive_mentions', cls._finish_hive_mentions, [cls.db(), last_imported_block, current_imported_block]),
-            ('payout_stats_view', cls._finish_payout_stats_view, []),
-            ('communities_posts_and_rank', cls._finish_communities_posts_and_rank, [cls.db()]),
-            (
-                'hive_posts',
-                cls._finish_hive_posts,
-                [cls.db(), massive_sync_preconditions, last_imported_block, current_imported_block],
-            ),
-            (
-                'blocks_consistency_flag',
-                cls._finish_blocks_consistency_flag,
-                [cls.db(), last_imported_block, current_imported_block],
-            ),
-        ]
-        cls.process_tasks_in_threads("[MASSIVE] %i threads finished filling tables. Part nr 0", methods)
-
-        methods = [
-            ('notification_cache', cls._finish_notification_cache, [cls.db()]),
-            ('follow_count', cls._finish_follow_count, [cls.db(), last_imported_block, current_imported_block]),
-            (
-                'hive_posts_api_helper',
-                cls._finish_hive_posts_api_helper,
-                [cls.db(), last_imported_block, current_imported_block],
-            ),
-        ]
-        # Notifications are dependent on many tables, therefore it's necessary to calculate it at the end
-        # hive_posts_api_helper is dependent on `hive_posts/root_id` filling
-        cls.process_tasks_in_threads("[MASSIVE] %i threads finished filling tables. Part nr 1", methods)
+        steps = cls._final_steps(massive_sync_preconditions, last_imported_block, current_imported_block)
+        done = cls._finished_final_steps(last_imported_block, current_imported_block)
+        if done:
+            log.info(f"[MASSIVE] Resuming filling tables, steps already done: {done}")
+
+        def on_finished(step, elapsed_time):
+            FOSM.final_stat(step, elapsed_time)
+            cls._save_final_step(step, last_imported_block, current_imported_block)
+
+        max_workers = Db.max_connections - Db.necessary_connections
+        times = steps.run(max_workers, done=done, on_finished=on_finished)
+        log.info(f"[MASSIVE] {len(times)} threads finished filling tables.")
+        FOSM.critical_path_stat(steps.critical_path(times))
 
         real_time = FOSM.stop(start_time)
 
         log.info("=== FILLING FINAL DATA INTO TABLES ===")
         threads_time = FOSM.log_current("Total final operations time")
+        critical_path_time = FOSM.log_critical_path("Critical path of final operations")
         log.info(
-            f"Elapsed time: {real_time :.4f}s. Calculated elapsed time: {threads_time :.4f}s. Difference: {real_time - threads_time :.4f}s"
+            f"Elapsed time: {real_time :.4f}s. Calculated elapsed time: {threads_time :.4f}s. Critical path time: {critical_path_time :.4f}s. Difference: {real_time - critical_path_time :.4f}s"
         )
         FOSM.clear()
         log.info("=== FILLING FINAL DATA INTO TABLES ===")
@@ -520,15 +809,11 @@ class DbState:
             force_index_rebuild = True
             massive_sync_preconditions = True
 
-        # is_pre_process, drop, create
+        # is_pre_process, drop, create; statistics of changed tables are updated once their indexes are built
         log.info("Creating indexes: started")
-        cls.processing_indexes(False, force_index_rebuild, True)
+        cls.processing_indexes(False, force_index_rebuild, True, analyze=massive_sync_preconditions)
         log.info("Creating indexes: finished")
 
-        # Update statistics and execution plans after index creation.
-        if massive_sync_preconditions:
-            cls._execute_query(db=cls.db(), sql="VACUUM (VERBOSE,ANALYZE)")
-
         # all post-updates are executed in different threads: one thread per one table
         log.info("Filling tables with final values: started")
         cls._finish_all_tables(massive_sync_preconditions, last_imported_block, current_imported_block)
@@ -544,7 +829,7 @@ class DbState:
             create_fk(cls.db())
             log.info(f"Foreign keys were recreated in {perf_counter() - start_time_foreign_keys:.3f}s")
 
-            cls._execute_query(db=cls.db(), sql="VACUUM (VERBOSE,ANALYZE)")
+            cls._run_maintenance("ANALYZING TABLES", False, True)
 
         end_time = perf_counter()
         log.info("[MASSIVE] After massive sync actions done in %.4fs", end_time - start_time)
@@ -0,0 +1,154 @@
+"""Concurrent execution of database maintenance jobs (index builds, vacuum) within connection and memory limits."""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import logging
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional
+
+from hive.db.adapter import Db
+from hive.indexer.auto_db_disposer import AutoDbDisposer
+from hive.utils.stats import FinalOperationStatusManager as FOSM
+
+log = logging.getLogger(__name__)
+
+# how often progress of running index builds is logged, in seconds
+PROGRESS_LOG_INTERVAL = 30.0
+
+MIN_JOB_MEMORY_MB = 64
+# one parallel maintenance worker is requested per that much of relation size, up to the max
+PARALLEL_WORKER_SIZE_MB = 1024
+MAX_PARALLEL_WORKERS = 4
+
+
+class MaintenanceJob:
+    """Statements executed on own connection, once jobs given in `after` are done.
+
+    `size_mb` is the size of relation the job works on; larger jobs are started first, memory and
+    parallel workers given to the job grow with it.
+    """
+
+    def __init__(
+        self, name: str, table: str, size_mb: float, statements: List[str], after: Iterable['MaintenanceJob'] = ()
+    ):
+        self.name = name
+        self.table = table
+        self.size_mb = size_mb
+        self.statements = statements
+        self.after = list(after)
+        self.memory_mb = 0
+        self.pid: Optional[int] = None
+
+    def __repr__(self):
+        return self.name
+
+    def run(self, db: Db, parallel_workers: int) -> float:
+        with AutoDbDisposer(db, self.name[:40]) as db_mgr:
+            self.pid = db_mgr.db.query_one("SELECT pg_backend_pid()")
+            db_mgr.db.query_no_return(f"SET maintenance_work_mem = '{self.memory_mb}MB'")
+            db_mgr.db.query_no_return(f"SET max_parallel_maintenance_workers = {parallel_workers}")
+            start = perf_counter()
+            for sql in self.statements:
+                db_mgr.db.query_no_return(sql)
+            return perf_counter() - start
+
+
+class MaintenanceScheduler:
+    """Runs jobs concurrently, largest ready ones (or ones larger jobs wait for) first.
+
+    At most `max_jobs` run at a time and their `maintenance_work_mem` sums up to `memory_budget_mb` at most
+    (a job which doesn't fit waits for running ones, unless nothing runs). Progress of index builds is logged
+    from `pg_stat_progress_create_index` every `PROGRESS_LOG_INTERVAL`.
+    """
+
+    def __init__(self, db: Db, max_jobs: int, memory_budget_mb: int):
+        self._db = db
+        self._max_jobs = max(1, max_jobs)
+        self._memory_budget_mb = max(MIN_JOB_MEMORY_MB, int(memory_budget_mb))
+
+    def job_memory(self, job: MaintenanceJob) -> int:
+        return int(min(max(job.size_mb, MIN_JOB_MEMORY_MB), max(MIN_JOB_MEMORY_MB, self._memory_budget_mb // 2)))
+
+    @staticmethod
+    def parallel_workers(job: MaintenanceJob) -> int:
+        return int(min(MAX_PARALLEL_WORKERS, job.size_mb // PARALLEL_WORKER_SIZE_MB))
+
+    def run(self, info: str, jobs: List[MaintenanceJob]) -> None:
+        start_time = perf_counter()
+        # jobs others wait for are as urgent as the largest of their dependents
+        priority = {job: job.size_mb for job in jobs}
+        for job in jobs:
+            for dependency in job.after:
+                priority[dependency] = max(priority.get(dependency, 0.0), job.size_mb)
+        pending = sorted(jobs, key=lambda job: priority[job], reverse=True)
+        done = set()
+        running: Dict[Future, MaintenanceJob] = {}
+        used_memory = 0
+
+        with ThreadPoolExecutor(max_workers=self._max_jobs) as pool:
+            while pending or running:
+                for job in self._next_jobs(pending, done, running, used_memory):
+                    pending.remove(job)
+                    job.memory_mb = min(self.job_memory(job), self._memory_budget_mb - used_memory)
+                    used_memory += job.memory_mb
+                    running[pool.submit(job.run, self._db, self.parallel_workers(job))] = job
+                    log.info(
+                        f"Started {job.name} ({job.size_mb:.0f}MB, maintenance_work_mem {job.memory_mb}MB, "
+                        f"{self.parallel_workers(job)} parallel workers)"
+                    )
+
+                if not running:
+                    raise RuntimeError(f"Jobs {pending} wait for jobs which are not scheduled")
+
+                finished, _ = wait(running, timeout=PROGRESS_LOG_INTERVAL, return_when=FIRST_COMPLETED)
+                if not finished:
+                    self._log_progress(running.values())
+
+                for future in finished:
+                    job = running.pop(future)
+                    used_memory -= job.memory_mb
+                    try:
+                        elapsed_time = future.result()
+                    except Exception as exc:
+                        log.error(f'{job.name!r} generated an exception: {exc}')
+                        for other in running:
+                            other.cancel()
+                        raise exc
+                    done.add(job)
+                    FOSM.final_stat(job.name, elapsed_time)
+                    log.info(f"Finished {job.name} in {elapsed_time:.4f}s")
+
+        log.info(f'{info} Real elapsed time: {perf_counter() - start_time:.3f}', len(jobs))
+
+    def _next_jobs(self, pending, done, running, used_memory) -> List[MaintenanceJob]:
+        """Ready jobs to start now, largest first; smaller ones may take memory left by the larger ones."""
+        started = []
+        free_memory = self._memory_budget_mb - used_memory
+        for job in pending:
+            if len(running) + len(started) >= self._max_jobs:
+                break
+            if not all(dependency in done for dependency in job.after):
+                continue
+            memory = self.job_memory(job)
+            if memory <= free_memory or (not running and not started):
+                started.append(job)
+                free_memory -= memory
+        return started
+
+    def _log_progress(self, jobs: Iterable[MaintenanceJob]) -> None:
+        jobs_by_pid = {job.pid: job for job in jobs if job.pid is not None}
+        if not jobs_by_pid:
+            return
+        sql = """
+            SELECT pid, phase, blocks_done, blocks_total, tuples_done, tuples_total, partitions_done, partitions_total
+            FROM pg_stat_progress_create_index WHERE pid = ANY(:pids)
+        """
+        for row in self._db.query_all(sql, pids=list(jobs_by_pid)):
+            job = jobs_by_pid[row['pid']]
+            progress = f"{job.name}: {row['phase']}"
+            if row['blocks_total']:
+                progress += f", blocks {row['blocks_done']}/{row['blocks_total']} ({100.0 * row['blocks_done'] / row['blocks_total']:.1f}%)"
+            if row['tuples_total']:
+                progress += f", tuples {row['tuples_done']}/{row['tuples_total']}"
+            if row['partitions_total']:
+                progress += f", partitions {row['partitions_done']}/{row['partitions_total']}"
+            log.info(progress)
@@ -0,0 +1,27 @@
+"""Queries executed as server-side prepared statements."""
+
+import re
+from typing import List
+
+# same as named parameters recognized by sqlalchemy.text
+PARAM_PATTERN = re.compile(r"(?<![:\w\x5c]):(\w+)(?!:)")
+
+
+class PreparedSql:
+    """Query turned into prepared statement: named parameters are replaced by positional ones."""
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.params: List[str] = []
+
+        def positional(match):
+            param = match.group(1)
+            if param not in self.params:
+                self.params.append(param)
+            return f"${self.params.index(param) + 1}"
+
+        self.prepare_sql = f"PREPARE {name} AS {PARAM_PATTERN.sub(positional, sql)}"
+        self.execute_sql = (
+            f"EXECUTE {name}({', '.join(':' + param for param in self.params)})" if self.params else f"EXECUTE {name}"
+        )
@@ -20,9 +20,21 @@ log = logging.getLogger(__name__)
 
 # pylint: disable=line-too-long, too-many-lines, bad-whitespace
 
+# tables which can be partitioned by ranges of block_num when schema is created (hive_notification_cache always is),
+# partitions are created and retired by DbState
+PARTITIONABLE_TABLES = ('hive_feed_cache', 'hive_notifs')
 
-def build_metadata():
-    """Build schema def with SqlAlchemy"""
+
+def _partitioned_by_block_num(table_name, partitioned_tables):
+    """Dialect options of a table which is partitioned by ranges of block_num."""
+    return {'postgresql_partition_by': 'RANGE (block_num)'} if table_name in partitioned_tables else {}
+
+
+def build_metadata(partitioned_tables=()):
+    """Build schema def with SqlAlchemy
+
+    Primary keys of partitioned tables include block_num, as required for partitioned tables.
+    """
     metadata = sa.MetaData(schema=SCHEMA_NAME)
     hive_rowid_seq = sa.Sequence('hive.hivemind_app_hive_rowid_seq', metadata=metadata)
 
@@ -343,13 +355,19 @@ def build_metadata():
         sa.Column('account_id', sa.Integer, nullable=False),
         sa.Column('created_at', sa.DateTime, nullable=False),
         sa.Column('block_num', sa.Integer, nullable=False),
-        sa.PrimaryKeyConstraint('account_id', 'post_id', name='hive_feed_cache_pk'),
+        sa.PrimaryKeyConstraint(
+            'account_id',
+            'post_id',
+            *(['block_num'] if 'hive_feed_cache' in partitioned_tables else []),
+            name='hive_feed_cache_pk',
+        ),
         sa.Index('hive_feed_cache_block_num_idx', 'block_num'),
         sa.Index('hive_feed_cache_created_at_idx', 'created_at'),
         sa.Index('hive_feed_cache_post_id_idx', 'post_id'),
         # Dedicated index to bridge_get_account_posts_by_blog
         sa.Index('hive_feed_cache_account_id_created_at_post_id_idx',
           sa.text('account_id, created_at DESC, post_id DESC')),
+        **_partitioned_by_block_num('hive_feed_cache', partitioned_tables),
     )
 
     sa.Table(
@@ -362,6 +380,16 @@ def build_metadata():
         sa.Column('db_version', sa.Integer, nullable=False),
     )
 
+    # steps of finalization after massive sync done for the block range, so interrupted finalization is resumed
+    sa.Table(
+        'hive_finalization_steps',
+        metadata,
+        sa.Column('hive_rowid', sa.BigInteger, server_default=hive_rowid_seq.next_value(), nullable=False),
+        sa.Column('step', VARCHAR(64), primary_key=True),
+        sa.Column('first_block_num', sa.Integer, nullable=False),
+        sa.Column('last_block_num', sa.Integer, nullable=False),
+    )
+
     sa.Table(
         'hive_posts_api_helper',
         metadata,
@@ -387,12 +415,12 @@ def build_metadata():
         sa.UniqueConstraint('post_id', 'account_id', 'block_num', name='hive_mentions_ux1'),
     )
 
-    metadata = build_metadata_community(hive_rowid_seq, metadata)
+    metadata = build_metadata_community(hive_rowid_seq, metadata, partitioned_tables)
 
     return metadata
 
 
-def build_metadata_community(hive_rowid_seq: sa.Sequence, metadata=None):
+def build_metadata_community(hive_rowid_seq: sa.Sequence, metadata=None, partitioned_tables=()):
     """Build community schema defs"""
     if not metadata:
         metadata = sa.MetaData()
@@ -457,8 +485,8 @@ def build_metadata_community(hive_rowid_seq: sa.Sequence, metadata=None):
         'hive_notifs',
         metadata,
         sa.Column('hive_rowid', sa.BigInteger, server_default=hive_rowid_seq.next_value(), nullable=False),
-        sa.Column('id', sa.Integer, primary_key=True),
-        sa.Column('block_num', sa.Integer, nullable=False),
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('block_num', sa.Integer, primary_key='hive_notifs' in partitioned_tables, nullable=False),
         sa.Column('type_id', SMALLINT, nullable=False),
         sa.Column('score', SMALLINT, nullable=False),
         sa.Column('created_at', sa.DateTime, nullable=False),
@@ -466,7 +494,6 @@ def build_metadata_community(hive_rowid_seq: sa.Sequence, metadata=None):
         sa.Column('dst_id', sa.Integer, nullable=True),
         sa.Column('post_id', sa.Integer, nullable=True),
         sa.Column('community_id', sa.Integer, nullable=True),
-        sa.Column('block_num', sa.Integer, nullable=False),
         sa.Column('payload', sa.Text, nullable=True),
         sa.Index('hive_notifs_ix1', 'dst_id', 'id', postgresql_where=sql_text("dst_id IS NOT NULL")),
         sa.Index('hive_notifs_ix2', 'community_id', 'id', postgresql_where=sql_text("community_id IS NOT NULL")),
@@ -492,14 +519,15 @@ def build_metadata_community(hive_rowid_seq: sa.Sequence, metadata=None):
         sa.Index(
             'hive_notifs_ix6', 'dst_id', 'created_at', 'score', 'id', postgresql_where=sql_text("dst_id IS NOT NULL")
         ),  # unread
+        **_partitioned_by_block_num('hive_notifs', partitioned_tables),
     )
 
     sa.Table(
         'hive_notification_cache',
         metadata,
         sa.Column('hive_rowid', sa.BigInteger, server_default=hive_rowid_seq.next_value(), nullable=False),
-        sa.Column('id', sa.BigInteger, primary_key=True),
-        sa.Column('block_num', sa.Integer, nullable=False),
+        sa.Column('id', sa.BigInteger, primary_key=True, autoincrement=True),
+        sa.Column('block_num', sa.Integer, primary_key=True, nullable=False),
         sa.Column('type_id', sa.Integer, nullable=False),
         sa.Column('dst', sa.Integer, nullable=True),  # dst account id except persistent notifs from hive_notifs
         sa.Column('src', sa.Integer, nullable=True),  # src account id
@@ -512,6 +540,9 @@ def build_metadata_community(hive_rowid_seq: sa.Sequence, metadata=None):
         sa.Column('payload', sa.String, nullable=True),
         sa.Index('hive_notification_cache_block_num_idx', 'block_num'),
         sa.Index('hive_notification_cache_dst_score_idx', 'dst', 'score', postgresql_where=sql_text("dst IS NOT NULL")),
+        # partitions are created while blocks are appended, expired ones are dropped
+        # (see update_notification_cache in notifications_api.sql)
+        **_partitioned_by_block_num('hive_notification_cache', ['hive_notification_cache']),
     )
 
     return metadata
@@ -541,24 +572,30 @@ def create_fk(db):
     db.query_no_return("COMMIT")
 
 
-def setup(db, admin_db):
-    """Creates all tables and seed data"""
+def setup(db, admin_db, partitioned_tables=()):
+    """Creates all tables and seed data
+
+    Tables given in `partitioned_tables` (from `PARTITIONABLE_TABLES`) are partitioned by ranges of block_num.
+    """
+    unknown = set(partitioned_tables) - set(PARTITIONABLE_TABLES)
+    assert not unknown, f"tables {sorted(unknown)} can't be partitioned, partitionable ones: {PARTITIONABLE_TABLES}"
 
     # create schema and aux functions
     admin_db.query(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA_NAME} AUTHORIZATION {SCHEMA_OWNER_NAME};')
 
     prepare_app_context(db=db)
-    build_metadata().create_all(db.engine())
+    build_metadata(partitioned_tables).create_all(db.engine())
 
     # tune auto vacuum/analyze
-    reset_autovac(db)
+    reset_autovac(db, partitioned_tables)
 
     # sets FILLFACTOR:
     set_fillfactor(db)
 
     # apply inheritance
     for table in build_metadata().sorted_tables:
-        if table.name in ('hive_db_patch_level',):
+        # partitioned tables can't inherit; they are only written with irreversible blocks anyway
+        if table.name in ('hive_db_patch_level', 'hive_notification_cache') or table.name in partitioned_tables:
             continue
 
         sql = f'ALTER TABLE {SCHEMA_NAME}.{table.name} INHERIT hive.{SCHEMA_NAME};'
@@ -642,6 +679,7 @@ def setup(db, admin_db):
 def setup_runtime_code(db):
     sql_scripts = [
         "utility_functions.sql",
+        "block_partitions.sql",
         "hive_accounts_view.sql",
         "hive_accounts_info_view.sql",
         "hive_posts_base_view.sql",
@@ -707,6 +745,7 @@ def setup_runtime_code(db):
         "follows.sql",
         "is_superuser.sql",
         "update_hive_blocks_consistency_flag.sql",
+        "update_live_blocks.sql",
         "update_table_statistics.sql",
         "upgrade/update_db_patchlevel.sql",  # Additionally execute db patchlevel import to mark (already done) upgrade changes and avoid its reevaluation during next upgrade.
         "hafapp_api.sql",
@@ -757,11 +796,12 @@ def perform_db_upgrade(db, admin_db):
     else:
         log.info(f"Skipping VACUUM FULL on upgraded database (no vacuum request)")
 
-def reset_autovac(db):
+def reset_autovac(db, partitioned_tables=()):
     """Initializes/resets per-table autovacuum/autoanalyze params.
 
     We use a scale factor of 0 and specify exact threshold tuple counts,
-    per-table, in the format (autovacuum_threshold, autoanalyze_threshold)."""
+    per-table, in the format (autovacuum_threshold, autoanalyze_threshold).
+    Partitioned tables are skipped, their partitions are small enough for default params."""
 
     autovac_config = {  # vacuum  analyze
         'hive_accounts': (50000, 100000),
@@ -774,6 +814,8 @@ def reset_autovac(db):
     }
 
     for table, (n_vacuum, n_analyze) in autovac_config.items():
+        if table in partitioned_tables:
+            continue
         sql = f"""
 ALTER TABLE {SCHEMA_NAME}.{table} SET (autovacuum_vacuum_scale_factor = 0,
                                   autovacuum_vacuum_threshold = {n_vacuum},
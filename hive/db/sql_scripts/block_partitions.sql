@@ -0,0 +1,70 @@
+--- Tables partitioned by ranges of block_num have partitions named <table>_<first block of range>.
+
+DROP FUNCTION IF EXISTS hivemind_app.block_partition_size;
+CREATE OR REPLACE FUNCTION hivemind_app.block_partition_size(in _table TEXT)
+RETURNS INT
+LANGUAGE 'sql' IMMUTABLE
+AS
+$BODY$
+  SELECT CASE _table
+    WHEN 'hive_notification_cache' THEN 201600 -- about a week of blocks
+    ELSE 864000 -- about a month of blocks
+  END
+$BODY$
+;
+
+DROP FUNCTION IF EXISTS hivemind_app.create_block_partitions;
+CREATE OR REPLACE FUNCTION hivemind_app.create_block_partitions(in _table TEXT, in _first_block_num INT, in _last_block_num INT)
+RETURNS INT
+AS
+$function$
+DECLARE
+  __size INT = hivemind_app.block_partition_size(_table);
+  __start INT;
+  __partition TEXT;
+  __created INT = 0;
+BEGIN
+  FOR __start IN SELECT generate_series(GREATEST(_first_block_num, 0) / __size * __size, _last_block_num, __size) LOOP
+    __partition = _table || '_' || __start;
+    IF to_regclass(format('hivemind_app.%I', __partition)) IS NULL THEN
+      EXECUTE format('CREATE TABLE hivemind_app.%I PARTITION OF hivemind_app.%I FOR VALUES FROM (%s) TO (%s)',
+                     __partition, _table, __start, __start + __size);
+      __created = __created + 1;
+    END IF;
+  END LOOP;
+  RETURN __created;
+END
+$function$
+LANGUAGE plpgsql VOLATILE
+;
+
+DROP FUNCTION IF EXISTS hivemind_app.retire_block_partitions;
+CREATE OR REPLACE FUNCTION hivemind_app.retire_block_partitions(in _table TEXT, in _limit_block_num INT, in _detach BOOLEAN)
+RETURNS INT
+AS
+$function$
+DECLARE
+  __size INT = hivemind_app.block_partition_size(_table);
+  __partition TEXT;
+  __retired INT = 0;
+BEGIN
+  -- only partitions with all blocks up to the limit are retired, detached ones are left as standalone tables
+  FOR __partition IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = format('hivemind_app.%I', _table)::regclass
+      AND substring(c.relname FROM '_(\d+)$')::INT + __size <= _limit_block_num + 1
+  LOOP
+    IF _detach THEN
+      EXECUTE format('ALTER TABLE hivemind_app.%I DETACH PARTITION hivemind_app.%I', _table, __partition);
+    ELSE
+      EXECUTE format('DROP TABLE hivemind_app.%I', __partition);
+    END IF;
+    __retired = __retired + 1;
+  END LOOP;
+  RETURN __retired;
+END
+$function$
+LANGUAGE plpgsql VOLATILE
+;
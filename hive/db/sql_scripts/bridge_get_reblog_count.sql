@@ -9,3 +9,15 @@ BEGIN
     RETURN (SELECT COUNT(*) FROM hivemind_app.hive_reblogs hr WHERE hr.post_id = _post_id);
 end;
 $$;
+
+DROP FUNCTION IF EXISTS hivemind_app.get_reblog_counts;
+
+CREATE OR REPLACE FUNCTION hivemind_app.get_reblog_counts(_post_ids INTEGER[])
+RETURNS TABLE(post_id INTEGER, reblogs INTEGER)
+LANGUAGE 'sql'
+STABLE
+AS
+$$
+    SELECT p.post_id, (SELECT COUNT(*) FROM hivemind_app.hive_reblogs hr WHERE hr.post_id = p.post_id)::INTEGER
+    FROM ( SELECT DISTINCT unnest(_post_ids) ) AS p(post_id);
+$$;
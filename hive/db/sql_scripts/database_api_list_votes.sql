@@ -54,6 +54,72 @@ RETURN QUERY
 END
 $function$;
 
+DROP FUNCTION IF EXISTS hivemind_app.find_votes_for_posts( INT[], INT )
+;
+CREATE OR REPLACE FUNCTION hivemind_app.find_votes_for_posts
+(
+  in _POST_IDS INT[],
+  in _LIMIT INT
+)
+RETURNS TABLE
+(
+  post_id INT,
+  id BIGINT,
+  voter VARCHAR(16),
+  author VARCHAR(16),
+  permlink VARCHAR(255),
+  weight NUMERIC,
+  rshares BIGINT,
+  percent INT,
+  last_update TIMESTAMP,
+  num_changes INT,
+  reputation BIGINT
+)
+LANGUAGE 'sql'
+STABLE
+AS
+$function$
+--- Votes of many posts at once, for every post the same as find_votes would return.
+    SELECT
+        p.post_id,
+        v.id::BIGINT,
+        v.voter::VARCHAR(16),
+        v.author::VARCHAR(16),
+        v.permlink::VARCHAR(255),
+        v.weight::NUMERIC,
+        v.rshares::BIGINT,
+        v.percent::INT,
+        v.last_update::TIMESTAMP,
+        v.num_changes::INT,
+        v.reputation::BIGINT
+    FROM
+        ( SELECT DISTINCT unnest( _POST_IDS ) ) AS p( post_id )
+    CROSS JOIN LATERAL
+    (
+        SELECT
+            vv.id,
+            vv.voter_id,
+            vv.voter,
+            vv.author,
+            vv.permlink,
+            vv.weight,
+            vv.rshares,
+            vv.percent,
+            vv.last_update,
+            vv.num_changes,
+            vv.reputation
+        FROM
+            hivemind_app.hive_votes_view vv
+        WHERE
+            vv.post_id = p.post_id
+        ORDER BY
+            vv.voter_id
+        LIMIT _LIMIT
+    ) v
+    ORDER BY
+        p.post_id, v.voter_id
+$function$;
+
 DROP FUNCTION IF EXISTS hivemind_app.list_votes_by_voter_comment( character varying, character varying, character varying, int )
 ;
 CREATE OR REPLACE FUNCTION hivemind_app.list_votes_by_voter_comment
@@ -32,3 +32,32 @@ BEGIN
 END
 $function$
 ;
+
+DROP FUNCTION IF EXISTS hivemind_app.delete_reblog_feed_caches(JSONB)
+;
+
+CREATE OR REPLACE FUNCTION hivemind_app.delete_reblog_feed_caches(
+  in _operations JSONB)
+RETURNS TABLE (op_idx INTEGER, status INTEGER)
+LANGUAGE plpgsql
+AS
+$function$
+--- Processes array of reblog deletions (objects with author, permlink and account) one by one in order of the array,
+--- as delete_reblog_feed_cache would do for each of them. Returns status of every deletion with its index in the array.
+DECLARE
+  __op JSONB;
+  __idx INTEGER;
+BEGIN
+  FOR __op, __idx IN SELECT ops.value, (ops.ordinality - 1)::INTEGER FROM jsonb_array_elements(_operations) WITH ORDINALITY AS ops ORDER BY ops.ordinality
+  LOOP
+    op_idx = __idx;
+    status = hivemind_app.delete_reblog_feed_cache(
+      (__op ->> 'author')::VARCHAR,
+      (__op ->> 'permlink')::VARCHAR,
+      (__op ->> 'account')::VARCHAR
+    );
+    RETURN NEXT;
+  END LOOP;
+END
+$function$
+;
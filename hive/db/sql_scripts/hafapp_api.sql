@@ -7,12 +7,21 @@ CREATE TYPE hivemind_app.hive_api_operation AS (
     body VARCHAR
 );
 
-CREATE OR REPLACE FUNCTION hivemind_app.enum_operations4hivemind(in _first_block INT, in _last_block INT)
+-- the old overload without filters is dropped too, otherwise it is left in upgraded databases
+DROP FUNCTION IF EXISTS hivemind_app.enum_operations4hivemind(INT, INT);
+DROP FUNCTION IF EXISTS hivemind_app.enum_operations4hivemind(INT, INT, INT[], TEXT[]);
+CREATE OR REPLACE FUNCTION hivemind_app.enum_operations4hivemind(
+  in _first_block INT,
+  in _last_block INT,
+  in _operation_types INT[],
+  in _custom_json_ids TEXT[]
+)
 RETURNS SETOF hivemind_app.hive_api_operation
 AS
 $function$
 BEGIN
-  /** Hivemind requires only following kinds of virtual operations:
+  /** Only operations of given types are returned (the ones handled by hivemind indexers), among them
+  custom_json_operation (18) only with one of given ids. Hivemind requires only following kinds of virtual operations:
   author_reward_operation                 = 51
   comment_reward_operation                = 53
   effective_comment_vote_operation        = 72
@@ -25,8 +34,9 @@ BEGIN
     SELECT ho.id, ho.block_num, ho.op_type_id, ho.op_type_id >= 50 AS is_virtual, ho.body::VARCHAR
     FROM hive.hivemind_app_operations_view ho
     WHERE ho.block_num BETWEEN _first_block AND _last_block
-          AND (ho.op_type_id < 50
-               OR ho.op_type_id in (51, 53, 61, 72, 73)
+          AND ho.op_type_id = ANY(_operation_types)
+          AND (ho.op_type_id <> 18
+               OR (ho.body::jsonb -> 'value' ->> 'id') = ANY(_custom_json_ids)
               )
     ORDER BY ho.block_num, ho.id
 ;
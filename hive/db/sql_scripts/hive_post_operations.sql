@@ -291,6 +291,42 @@ END
 $function$
 ;
 
+DROP FUNCTION IF EXISTS hivemind_app.process_hive_post_operations;
+CREATE OR REPLACE FUNCTION hivemind_app.process_hive_post_operations(
+    in _operations JSONB,
+    in _community_support_start_block hivemind_app.hive_posts.block_num%TYPE)
+    RETURNS TABLE (op_idx INTEGER, is_new_post boolean, id hivemind_app.hive_posts.id%TYPE, author_id hivemind_app.hive_posts.author_id%TYPE, permlink_id hivemind_app.hive_posts.permlink_id%TYPE,
+                   post_category hivemind_app.hive_category_data.category%TYPE, parent_id hivemind_app.hive_posts.parent_id%TYPE, community_id hivemind_app.hive_posts.community_id%TYPE,
+                   is_valid hivemind_app.hive_posts.is_valid%TYPE, is_muted hivemind_app.hive_posts.is_muted%TYPE, depth hivemind_app.hive_posts.depth%TYPE)
+    LANGUAGE plpgsql
+AS
+$function$
+--- Processes array of comment operations (objects with author, permlink, parent_author, parent_permlink, date, block_num
+--- and tags) one by one in order of the array, as process_hive_post_operation would do for each of them. Every returned
+--- row carries index of its operation in the array, operations which failed to be processed have no rows.
+DECLARE
+    __op JSONB;
+    __idx INTEGER;
+BEGIN
+    FOR __op, __idx IN SELECT ops.value, (ops.ordinality - 1)::INTEGER FROM jsonb_array_elements(_operations) WITH ORDINALITY AS ops ORDER BY ops.ordinality
+    LOOP
+        RETURN QUERY
+            SELECT __idx, r.is_new_post, r.id, r.author_id, r.permlink_id, r.post_category, r.parent_id, r.community_id, r.is_valid, r.is_muted, r.depth
+            FROM hivemind_app.process_hive_post_operation(
+                (__op ->> 'author')::VARCHAR,
+                (__op ->> 'permlink')::VARCHAR,
+                (__op ->> 'parent_author')::VARCHAR,
+                (__op ->> 'parent_permlink')::VARCHAR,
+                (__op ->> 'date')::TIMESTAMP,
+                _community_support_start_block,
+                (__op ->> 'block_num')::INTEGER,
+                ARRAY(SELECT jsonb_array_elements_text(__op -> 'tags'))::VARCHAR[]
+            ) r;
+    END LOOP;
+END
+$function$
+;
+
 DROP FUNCTION IF EXISTS hivemind_app.delete_hive_post(character varying,character varying,character varying, integer, timestamp)
 ;
 CREATE OR REPLACE FUNCTION hivemind_app.delete_hive_post(
@@ -338,3 +374,29 @@ BEGIN
 END
 $function$
 ;
+
+DROP FUNCTION IF EXISTS hivemind_app.delete_hive_posts(JSONB)
+;
+CREATE OR REPLACE FUNCTION hivemind_app.delete_hive_posts(
+  in _operations JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+AS
+$function$
+--- Processes array of delete_comment operations (objects with author, permlink, block_num and date) one by one
+--- in order of the array, as delete_hive_post would do for each of them.
+DECLARE
+  __op JSONB;
+BEGIN
+  FOR __op IN SELECT ops.value FROM jsonb_array_elements(_operations) WITH ORDINALITY AS ops ORDER BY ops.ordinality
+  LOOP
+    PERFORM hivemind_app.delete_hive_post(
+      (__op ->> 'author')::VARCHAR,
+      (__op ->> 'permlink')::VARCHAR,
+      (__op ->> 'block_num')::INTEGER,
+      (__op ->> 'date')::TIMESTAMP
+    );
+  END LOOP;
+END
+$function$
+;
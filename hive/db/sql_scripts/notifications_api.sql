@@ -177,19 +177,37 @@ AS
 $function$
 DECLARE
   __limit_block hive.hivemind_app_blocks_view.num%TYPE = hivemind_app.block_before_head( '90 days' );
+  __first_block INT;
+  __last_block INT;
 BEGIN
+  -- NULL block range rebuilds the whole cache, otherwise notifications of given blocks are appended
   IF _first_block_num IS NULL THEN
     TRUNCATE TABLE hivemind_app.hive_notification_cache;
       ALTER SEQUENCE hivemind_app.hive_notification_cache_id_seq RESTART WITH 1;
+    __first_block = __limit_block + 1;
+    __last_block = (SELECT hs.last_imported_block_num FROM hivemind_app.hive_state hs LIMIT 1);
   ELSE
-    DELETE FROM hivemind_app.hive_notification_cache nc WHERE _prune_old AND nc.block_num <= __limit_block;
+    __first_block = GREATEST(_first_block_num, __limit_block + 1);
+    __last_block = _last_block_num;
+    -- rows of blocks appended before are replaced, so range can be processed again (e.g. when interrupted sync is resumed)
+    DELETE FROM hivemind_app.hive_notification_cache nc WHERE nc.block_num BETWEEN __first_block AND __last_block;
   END IF;
 
+  IF _prune_old THEN
+    PERFORM hivemind_app.retire_block_partitions('hive_notification_cache', __limit_block, False);
+  END IF;
+
+  IF __first_block > __last_block THEN
+    RETURN;
+  END IF;
+
+  PERFORM hivemind_app.create_block_partitions('hive_notification_cache', __first_block, __last_block);
+
   INSERT INTO hivemind_app.hive_notification_cache
   (block_num, type_id, created_at, src, dst, dst_post_id, post_id, score, payload, community, community_title)
   SELECT nv.block_num, nv.type_id, nv.created_at, nv.src, nv.dst, nv.dst_post_id, nv.post_id, nv.score, nv.payload, nv.community, nv.community_title
   FROM hivemind_app.hive_raw_notifications_view nv
-  WHERE nv.block_num > __limit_block AND (_first_block_num IS NULL OR nv.block_num BETWEEN _first_block_num AND _last_block_num)
+  WHERE nv.block_num BETWEEN __first_block AND __last_block
   ORDER BY nv.block_num, nv.type_id, nv.created_at, nv.src, nv.dst, nv.dst_post_id, nv.post_id
   ;
 END
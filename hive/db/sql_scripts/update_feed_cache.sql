@@ -12,6 +12,8 @@ BEGIN
     FROM
       hivemind_app.hive_posts hp
     WHERE hp.depth = 0 AND hp.counter_deleted = 0 AND ((_from_block_num IS NULL AND _to_block_num IS NULL) OR (hp.block_num BETWEEN _from_block_num AND _to_block_num))
+      -- when table is partitioned, its primary key includes block_num, so edited post (with new block_num) would not conflict
+      AND NOT EXISTS (SELECT NULL FROM hivemind_app.hive_feed_cache hfc WHERE hfc.account_id = hp.author_id AND hfc.post_id = hp.id)
     ON CONFLICT DO NOTHING;
 
     INSERT INTO
@@ -20,7 +22,8 @@ BEGIN
       hr.blogger_id, hr.post_id, hr.created_at, hr.block_num
     FROM
       hivemind_app.hive_reblogs hr
-    WHERE (_from_block_num IS NULL AND _to_block_num IS NULL) OR (hr.block_num BETWEEN _from_block_num AND _to_block_num)
+    WHERE ((_from_block_num IS NULL AND _to_block_num IS NULL) OR (hr.block_num BETWEEN _from_block_num AND _to_block_num))
+      AND NOT EXISTS (SELECT NULL FROM hivemind_app.hive_feed_cache hfc WHERE hfc.account_id = hr.blogger_id AND hfc.post_id = hr.post_id)
     ON CONFLICT DO NOTHING;
 END
 $BODY$;
@@ -0,0 +1,74 @@
+--- All updates of tables done in live sync after blocks are processed, in one call.
+--- Steps executed separately (given in _steps, when run in parallel after blocks are committed) are recorded in
+--- hive_finalization_steps as live_<step> in the same statement, so after restart only missing ones are executed
+--- (hive_posts_children_count and account_reputations add deltas and cannot be applied twice).
+
+DROP FUNCTION IF EXISTS hivemind_app.update_live_blocks;
+CREATE OR REPLACE FUNCTION hivemind_app.update_live_blocks(
+  in _first_block INT,
+  in _last_block INT,
+  in _is_hour_action BOOLEAN,
+  in _steps TEXT[] DEFAULT NULL -- subset of steps to execute, in given order, NULL means all of them
+)
+RETURNS TABLE(step TEXT, elapsed_time DOUBLE PRECISION)
+LANGUAGE plpgsql
+VOLATILE
+AS
+$function$
+DECLARE
+  __start TIMESTAMP WITH TIME ZONE;
+  __block INT;
+BEGIN
+  FOREACH step IN ARRAY COALESCE(_steps, ARRAY[
+    'posts_rshares',
+    'hive_posts_children_count',
+    'hive_posts_root_id',
+    'hive_posts_api_helper',
+    'feed_cache',
+    'hive_posts_mentions',
+    'notification_cache',
+    'follow_count',
+    'account_reputations',
+    'last_completed_block'
+  ]) LOOP
+    __start = clock_timestamp();
+    CASE step
+      WHEN 'posts_rshares' THEN
+        PERFORM hivemind_app.update_posts_rshares(_first_block, _last_block);
+      WHEN 'hive_posts_children_count' THEN
+        PERFORM hivemind_app.update_hive_posts_children_count(_first_block, _last_block);
+      WHEN 'hive_posts_root_id' THEN
+        PERFORM hivemind_app.update_hive_posts_root_id(_first_block, _last_block);
+      WHEN 'hive_posts_api_helper' THEN
+        PERFORM hivemind_app.update_hive_posts_api_helper(_first_block, _last_block);
+      WHEN 'feed_cache' THEN
+        PERFORM hivemind_app.update_feed_cache(_first_block, _last_block);
+      WHEN 'hive_posts_mentions' THEN
+        PERFORM hivemind_app.update_hive_posts_mentions(_first_block, _last_block);
+      WHEN 'notification_cache' THEN
+        PERFORM hivemind_app.update_notification_cache(_first_block, _last_block, _is_hour_action);
+      WHEN 'follow_count' THEN
+        PERFORM hivemind_app.update_follow_count(_first_block, _last_block);
+      WHEN 'account_reputations' THEN
+        -- calculated block by block, range version of the function processes all accounts
+        FOR __block IN _first_block .. _last_block LOOP
+          PERFORM hivemind_app.update_account_reputations(__block, __block, False);
+        END LOOP;
+      WHEN 'last_completed_block' THEN
+        PERFORM hivemind_app.update_last_completed_block(_last_block);
+        DELETE FROM hivemind_app.hive_finalization_steps fs WHERE fs.step LIKE 'live\_%';
+      ELSE
+        RAISE EXCEPTION 'Unknown live blocks update step: %', step;
+    END CASE;
+    IF _steps IS NOT NULL AND step != 'last_completed_block' THEN
+      INSERT INTO hivemind_app.hive_finalization_steps (step, first_block_num, last_block_num)
+      VALUES ('live_' || step, _first_block, _last_block)
+      ON CONFLICT ON CONSTRAINT hive_finalization_steps_pkey
+      DO UPDATE SET first_block_num = EXCLUDED.first_block_num, last_block_num = EXCLUDED.last_block_num;
+    END IF;
+    elapsed_time = EXTRACT(EPOCH FROM clock_timestamp() - __start);
+    RETURN NEXT;
+  END LOOP;
+END
+$function$
+;
@@ -43,5 +43,75 @@ CREATE TABLE IF NOT EXISTS hivemind_app.hive_post_tags (
 CREATE UNIQUE INDEX IF NOT EXISTS hive_post_tags_tag_id_post_id_idx
     ON hivemind_app.hive_post_tags USING btree (tag_id, post_id DESC);
 
+--- Notification cache is partitioned by block_num, so expired notifications are removed by dropping partitions.
+--- Rows of existing cache are moved to partitions of size given by hivemind_app.block_partition_size().
+DO
+$$
+DECLARE
+  __size INT = 201600;
+  __start INT;
+BEGIN
+IF EXISTS (SELECT NULL FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+           WHERE n.nspname = 'hivemind_app' AND c.relname = 'hive_notification_cache' AND c.relkind = 'r') THEN
+  RAISE NOTICE 'Performing hive_notification_cache partitioning';
+
+  ALTER TABLE hivemind_app.hive_notification_cache NO INHERIT hive.hivemind_app;
+  ALTER TABLE hivemind_app.hive_notification_cache RENAME TO hive_notification_cache_unpartitioned;
+  ALTER INDEX hivemind_app.hive_notification_cache_pkey RENAME TO hive_notification_cache_unpartitioned_pkey;
+  DROP INDEX IF EXISTS hivemind_app.hive_notification_cache_block_num_idx;
+  DROP INDEX IF EXISTS hivemind_app.hive_notification_cache_dst_score_idx;
+
+  CREATE TABLE hivemind_app.hive_notification_cache
+  (
+    hive_rowid BIGINT NOT NULL DEFAULT nextval('hive.hivemind_app_hive_rowid_seq'::regclass),
+    id BIGINT NOT NULL,
+    block_num INT NOT NULL,
+    type_id INT NOT NULL,
+    dst INT,
+    src INT,
+    dst_post_id INT,
+    post_id INT,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    score INT NOT NULL,
+    community_title VARCHAR(32),
+    community VARCHAR(16),
+    payload VARCHAR,
+    CONSTRAINT hive_notification_cache_pkey PRIMARY KEY (id, block_num)
+  ) PARTITION BY RANGE (block_num);
+
+  ALTER SEQUENCE hivemind_app.hive_notification_cache_id_seq OWNED BY hivemind_app.hive_notification_cache.id;
+  ALTER TABLE hivemind_app.hive_notification_cache ALTER COLUMN id SET DEFAULT nextval('hivemind_app.hive_notification_cache_id_seq'::regclass);
+
+  CREATE INDEX hive_notification_cache_block_num_idx ON hivemind_app.hive_notification_cache (block_num);
+  CREATE INDEX hive_notification_cache_dst_score_idx ON hivemind_app.hive_notification_cache (dst, score) WHERE dst IS NOT NULL;
+
+  FOR __start IN SELECT DISTINCT nc.block_num / __size * __size FROM hivemind_app.hive_notification_cache_unpartitioned nc LOOP
+    EXECUTE format('CREATE TABLE hivemind_app.%I PARTITION OF hivemind_app.hive_notification_cache FOR VALUES FROM (%s) TO (%s)',
+                   'hive_notification_cache_' || __start, __start, __start + __size);
+  END LOOP;
+
+  INSERT INTO hivemind_app.hive_notification_cache
+  (hive_rowid, id, block_num, type_id, dst, src, dst_post_id, post_id, created_at, score, community_title, community, payload)
+  SELECT nc.hive_rowid, nc.id, nc.block_num, nc.type_id, nc.dst, nc.src, nc.dst_post_id, nc.post_id, nc.created_at, nc.score, nc.community_title, nc.community, nc.payload
+  FROM hivemind_app.hive_notification_cache_unpartitioned nc;
+
+  DROP TABLE hivemind_app.hive_notification_cache_unpartitioned;
+ELSE
+  RAISE NOTICE 'hive_notification_cache partitioning skipped';
+END IF;
+END
+$$
+;
+
+--- Steps of finalization after massive sync done for a block range, so interrupted finalization is resumed.
+CREATE TABLE IF NOT EXISTS hivemind_app.hive_finalization_steps (
+    --- Column must be explicitly declared to satisfy further ALTER TABLE needed to INHERIT hive.hivemind_app table.
+    hive_rowid BIGINT NOT NULL DEFAULT nextval('hive.hivemind_app_hive_rowid_seq'::regclass),
+
+    step VARCHAR(64) NOT NULL
+  , first_block_num INT NOT NULL
+  , last_block_num INT NOT NULL
+  , CONSTRAINT hive_finalization_steps_pkey PRIMARY KEY (step)
+);
 
 RESET ROLE;
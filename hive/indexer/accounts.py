@@ -4,6 +4,7 @@ import logging
 
 from hive.conf import SCHEMA_NAME
 from hive.db.adapter import Db
+from hive.db.bulk_loader import BulkLoader, StagingTable
 from hive.indexer.db_adapter_holder import DbAdapterHolder
 from hive.utils.account import get_profile_str
 from hive.utils.normalize import escape_characters
@@ -12,6 +13,16 @@ log = logging.getLogger(__name__)
 
 DB = Db.instance()
 
+ACCOUNTS_STAGING = StagingTable(
+    'hive_accounts_staging',
+    [
+        ('allow_change_posting', 'BOOLEAN'),
+        ('posting_json_metadata', 'TEXT'),
+        ('json_metadata', 'TEXT'),
+        ('name', 'VARCHAR'),
+    ],
+)
+
 
 class Accounts(DbAdapterHolder):
     """Manages account id map, dirty queue, and `hive_accounts` table."""
@@ -150,14 +161,29 @@ class Accounts(DbAdapterHolder):
 
         return True
 
+    @classmethod
+    def swap_buffers(cls):
+        """Detach collected metadata updates, so they can be flushed while new ones are being collected"""
+        frozen = cls._updates_data
+        cls._updates_data = {}
+        return frozen
+
     @classmethod
     def flush(cls):
         """Flush json_metadatafrom cache to database"""
 
         cls.inside_flush = True
+        n = cls.flush_buffers(cls.swap_buffers())
+        cls.inside_flush = False
+
+        return n
+
+    @classmethod
+    def flush_buffers(cls, frozen):
+        """Flush metadata updates detached with swap_buffers to database"""
         n = 0
 
-        if cls._updates_data:
+        if frozen:
             cls.beginTx()
 
             sql = f"""
@@ -178,40 +204,17 @@ class Accounts(DbAdapterHolder):
                         posting_json_metadata,
                         json_metadata,
                         name
-                      FROM
-                      (
-                      VALUES
-                        -- allow_change_posting, posting_json_metadata, json_metadata, name
-                        {{}}
-                      )T( allow_change_posting, posting_json_metadata, json_metadata, name )
+                      FROM {{}} AS T( allow_change_posting, posting_json_metadata, json_metadata, name )
                     )T2
                     WHERE ha.name = T2.name
                 """
 
-            values = []
-            values_limit = 1000
-
-            for name, data in cls._updates_data.items():
-                values.append(
-                    f"({data['allow_change_posting']}, {cls.get_json_data(data['posting_json_metadata'])}, {cls.get_json_data(data['json_metadata'])}, '{name}')"
-                )
-
-                if len(values) >= values_limit:
-                    values_str = ','.join(values)
-                    actual_query = sql.format(values_str)
-                    cls.db.query_prepared(actual_query)
-                    values.clear()
+            rows = [
+                (data['allow_change_posting'], data['posting_json_metadata'], data['json_metadata'], name)
+                for name, data in frozen.items()
+            ]
+            n = BulkLoader.write(cls.db, ACCOUNTS_STAGING, rows, sql)
 
-            if len(values) > 0:
-                values_str = ','.join(values)
-                actual_query = sql.format(values_str)
-                cls.db.query_prepared(actual_query)
-                values.clear()
-
-            n = len(cls._updates_data)
-            cls._updates_data.clear()
             cls.commitTx()
 
-        cls.inside_flush = False
-
         return n
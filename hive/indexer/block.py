@@ -80,6 +80,10 @@ class OperationType(Enum):
         return None
 
 
+# ids of custom_json operations processed by hivemind, all others are ignored
+CUSTOM_JSON_IDS = ('follow', 'reblog', 'community', 'notify')
+
+
 class Block(ABC):
     """Represents one block of the chain"""
 
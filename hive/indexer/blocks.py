@@ -4,19 +4,23 @@ import concurrent
 from concurrent.futures import ThreadPoolExecutor
 import logging
 from pathlib import Path
-from time import perf_counter
+import queue
 from typing import Tuple
 
 from hive.conf import Conf, SCHEMA_NAME
 from hive.db.adapter import Db
+from hive.db.connection_pool import ConnectionPool
 from hive.indexer.accounts import Accounts
 from hive.indexer.block import Block, Operation, OperationType, Transaction, VirtualOperationType
 from hive.indexer.custom_op import CustomOp
+from hive.indexer.deferred_writes import DeferredWrites
+from hive.indexer.flush_pipeline import FlushPipeline
 from hive.indexer.follow import Follow
 from hive.indexer.hive_db.block import BlockHiveDb
 from hive.indexer.notify import Notify
 from hive.indexer.payments import Payments
 from hive.indexer.post_data_cache import PostDataCache
+from hive.indexer.post_ids_cache import PostIdsCache
 from hive.indexer.posts import Posts
 from hive.indexer.reblog import Reblog
 from hive.indexer.reputations import Reputations
@@ -26,6 +30,7 @@ from hive.server.common.payout_stats import PayoutStats
 from hive.utils.communities_rank import update_communities_posts_and_rank
 from hive.utils.stats import FlushStatusManager as FSM
 from hive.utils.stats import OPStatusManager as OPSM
+from hive.utils.task_graph import TaskGraph
 from hive.utils.timer import time_it
 
 log = logging.getLogger(__name__)
@@ -47,7 +52,9 @@ class Blocks:
     _head_block_date = None
     _current_block_date = None
     _last_safe_cashout_block = 0
+    _last_processed_block = 0
     _is_initial_sync = False
+    _live_parallel_steps = 1
 
     _concurrent_flush = [
         ('Posts', Posts.flush, Posts),
@@ -60,6 +67,23 @@ class Blocks:
         ('Accounts', Accounts.flush, Accounts),
     ]
 
+    # indexers which data has to be flushed before post it concerns is deleted
+    _post_delete_dependencies = [Votes, Reblog, Posts]
+
+    # steps of `update_live_blocks` with steps they have to run after when run in parallel: ones updating the same
+    # rows are chained, notifications are scored with rshares of posts and reputations from before the update
+    _live_steps = [
+        ('posts_rshares', []),
+        ('hive_posts_children_count', ['posts_rshares']),
+        ('hive_posts_root_id', ['hive_posts_children_count']),
+        ('hive_posts_api_helper', ['hive_posts_root_id']),
+        ('feed_cache', []),
+        ('hive_posts_mentions', []),
+        ('notification_cache', ['hive_posts_root_id', 'hive_posts_mentions']),
+        ('follow_count', []),
+        ('account_reputations', ['notification_cache', 'follow_count']),
+    ]
+
     def __init__(self):
         head_date = self.head_date()
         if head_date == '':
@@ -72,6 +96,10 @@ class Blocks:
     @classmethod
     def setup(cls, conf: Conf):
         cls._conf = conf
+        FlushPipeline.setup(max_generations=conf.get('pipelined_flush_generations'))
+        PostIdsCache.setup(size=conf.get('post_ids_cache_size'))
+        DeferredWrites.setup(enabled=conf.get('batch_op_writes'))
+        cls._live_parallel_steps = conf.get('live_parallel_steps')
 
     @staticmethod
     def setup_own_db_access(shared_db_adapter: Db) -> None:
@@ -172,6 +200,41 @@ class Blocks:
 
         assert completed_threads == len(cls._concurrent_flush)
 
+    @classmethod
+    def flush_data_in_background(cls) -> None:
+        FlushPipeline.submit((description, c) for (description, f, c) in cls._concurrent_flush)
+
+    @classmethod
+    def wait_for_background_flush(cls, blocks) -> None:
+        """Make room for data of next batch of blocks; called before its transaction is started."""
+        FlushPipeline.wait_for_capacity()
+
+        # post deletion (along with its reblogs) has to see votes, reblogs and payouts of previous batches, reblog
+        # deletion has to see the reblog; waiting for lanes inside of the transaction could lock both sides forever
+        for block in blocks:
+            for transaction in block.get_next_transaction():
+                for operation in transaction.get_next_operation():
+                    op_type = operation.get_type()
+                    if op_type == OperationType.DELETE_COMMENT:
+                        op = operation.get_body()
+                        if FlushPipeline.is_post_pending(cls._post_delete_dependencies, op['author'], op['permlink']):
+                            log.info("[PROCESS MULTI] Waiting for background flush before deleting post")
+                            FlushPipeline.drain()
+                            return
+                    elif op_type == OperationType.CUSTOM_JSON:
+                        key = Reblog.deleted_reblog_key(operation.get_body())
+                        if key is not None and FlushPipeline.is_pending(Reblog, lambda frozen: key in frozen):
+                            log.info("[PROCESS MULTI] Waiting for background flush before deleting reblog")
+                            FlushPipeline.drain()
+                            return
+
+    @staticmethod
+    def finish_background_flush() -> None:
+        if DB.is_trx_active():
+            # transaction of broken batch could hold locks needed by background flushes
+            DB.query("ROLLBACK")
+        FlushPipeline.close()
+
     @classmethod
     def flush_data_in_1_thread(cls) -> None:
         for description, f, c in cls._concurrent_flush:
@@ -192,6 +255,11 @@ class Blocks:
                     first_block = block.get_num()
                 last_num = cls._process(block)
                 last_date = block.get_date()
+
+            # writes collected during massive sync have to reach the database with rest of the batch
+            start = OPSM.start()
+            count = DeferredWrites.apply()
+            OPSM.op_stats('deferred_writes', OPSM.stop(start), count)
         except Exception as e:
             log.error("exception encountered block %d", last_num + 1)
             raise e
@@ -206,31 +274,61 @@ class Blocks:
         return first_block, last_num
 
     @classmethod
-    def process_multi(cls, blocks, is_massive_sync: bool) -> None:
-        """Batch-process blocks; wrapped in a transaction."""
+    def process_multi(cls, blocks, is_massive_sync: bool, advance_context: bool = False) -> None:
+        """Batch-process blocks; wrapped in a transaction.
+
+        With `advance_context` (live sync of several blocks with detached context) current block of HAF
+        context is set to the last processed one in the same transaction.
+        """
 
         time_start = OPSM.start()
 
+        if blocks and blocks[0].get_num() <= cls._last_processed_block:
+            # blocks were reverted (fork), so posts created in them might not exist anymore
+            log.info("[PROCESS MULTI] Clearing post ids cache after blocks were reverted")
+            PostIdsCache.clear()
+
         if is_massive_sync:
+            if FlushPipeline.is_enabled():
+                cls.wait_for_background_flush(blocks)
             DB.query("START TRANSACTION")
             #update last_active_at directly since we don't advance current_block_num in massive_sync (until whole indexer gets re-write)
             DB.query_no_return(f"SELECT hive.app_update_last_active_at('hivemind_app');");
 
         first_block, last_num = cls.process_blocks(blocks)
+        cls._last_processed_block = last_num
+
+        # steps run on other connections see only committed data of blocks, which count as not completed until they
+        # finish (on restart steps which did not finish are executed by `finish_interrupted_live_blocks`); API readers
+        # do not wait for that, so in the meantime they may see blocks with tables updated only partially
+        update_after_commit = not is_massive_sync and first_block > -1 and cls._live_parallel_steps > 1
 
         if not is_massive_sync:
             log.info("[PROCESS MULTI] Flushing data in 1 thread")
             cls.flush_data_in_1_thread()
-            if first_block > -1:
+            if first_block > -1 and not update_after_commit:
                 log.info("[PROCESS MULTI] Tables updating in live synchronization")
-                cls.on_live_blocks_processed(first_block)
-                cls._periodic_actions(blocks[0])
+                cls.on_live_blocks_processed(first_block, last_num)
+                for block in blocks:
+                    cls._periodic_actions(block)
+            if advance_context:
+                DB.query_no_return(f"SELECT hive.app_set_current_block_num('{SCHEMA_NAME}', {last_num})")
 
         DB.query("COMMIT")
 
+        if update_after_commit:
+            log.info(f"[PROCESS MULTI] Tables updating in live synchronization on {cls._live_parallel_steps} connections")
+            cls.on_live_blocks_processed(first_block, last_num, parallel_steps=cls._live_parallel_steps)
+            for block in blocks:
+                cls._periodic_actions(block)
+
         if is_massive_sync:
-            log.info("[PROCESS MULTI] Flushing data in N threads")
-            cls.flush_data_in_n_threads()
+            if FlushPipeline.is_enabled():
+                log.info("[PROCESS MULTI] Flushing data in background")
+                cls.flush_data_in_background()
+            else:
+                log.info("[PROCESS MULTI] Flushing data in N threads")
+                cls.flush_data_in_n_threads()
 
         log.info(f"[PROCESS MULTI] {len(blocks)} blocks in {OPSM.stop(time_start) :.4f}s")
 
@@ -420,31 +518,72 @@ class Blocks:
 
         return num
 
-    @staticmethod
+    @classmethod
     @time_it
-    def on_live_blocks_processed(block_number: int) -> None:
+    def on_live_blocks_processed(cls, first_block: int, last_block: int, parallel_steps: int = 1) -> None:
         """Is invoked when processing of block range is done and received
         informations from hived are already stored in db
+
+        With `parallel_steps` greater than 1 independent steps are executed at the same time, each in own
+        transaction on one of that many connections.
         """
-        is_hour_action = block_number % 1200 == 0
-
-        queries = [
-            f"SELECT {SCHEMA_NAME}.update_posts_rshares({block_number}, {block_number})",
-            f"SELECT {SCHEMA_NAME}.update_hive_posts_children_count({block_number}, {block_number})",
-            f"SELECT {SCHEMA_NAME}.update_hive_posts_root_id({block_number},{block_number})",
-            f"SELECT {SCHEMA_NAME}.update_hive_posts_api_helper({block_number},{block_number})",
-            f"SELECT {SCHEMA_NAME}.update_feed_cache({block_number}, {block_number})",
-            f"SELECT {SCHEMA_NAME}.update_hive_posts_mentions({block_number}, {block_number})",
-            f"SELECT {SCHEMA_NAME}.update_notification_cache({block_number}, {block_number}, {is_hour_action})",
-            f"SELECT {SCHEMA_NAME}.update_follow_count({block_number}, {block_number})",
-            f"SELECT {SCHEMA_NAME}.update_account_reputations({block_number}, {block_number}, False)",
-            f"SELECT {SCHEMA_NAME}.update_last_completed_block({block_number})",
-        ]
-
-        for query in queries:
-            time_start = perf_counter()
-            DB.query_no_return(query)
-            log.info("%s executed in: %.4f s", query, perf_counter() - time_start)
+        is_hour_action = any(block_number % 1200 == 0 for block_number in range(first_block, last_block + 1))
+
+        if parallel_steps <= 1:
+            cls._update_live_blocks(DB, first_block, last_block, is_hour_action)
+            return
+
+        connections = queue.Queue()
+        for number in range(parallel_steps):
+            connections.put(ConnectionPool.lease(DB, f'live_update_{number}'))
+
+        def run_step(step):
+            db = connections.get()
+            try:
+                cls._update_live_blocks(db, first_block, last_block, is_hour_action, [step])
+            finally:
+                connections.put(db)
+
+        steps = TaskGraph()
+        for step, after in cls._live_steps:
+            steps.add(step, run_step, [step], after=after)
+        steps.add('last_completed_block', run_step, ['last_completed_block'], after=steps.names())
+
+        try:
+            steps.run(parallel_steps)
+        finally:
+            while not connections.empty():
+                ConnectionPool.release(connections.get())
+
+    @classmethod
+    def finish_interrupted_live_blocks(cls) -> None:
+        """Executes steps of `update_live_blocks` which did not finish for blocks whose tables were updated in parallel
+        when live sync was interrupted; finished steps are skipped, since some of them cannot be applied twice."""
+        sql = f"SELECT step, first_block_num, last_block_num FROM {SCHEMA_NAME}.hive_finalization_steps WHERE step LIKE 'live\\_%'"
+        rows = DB.query_all(sql)
+        if not rows:
+            return
+
+        first_block, last_block = rows[0]['first_block_num'], rows[0]['last_block_num']
+        if first_block != cls.last_completed() + 1:
+            log.warning(f"Discarding finished live steps of blocks <{first_block}:{last_block}> which are already completed")
+            DB.query_no_return(f"DELETE FROM {SCHEMA_NAME}.hive_finalization_steps WHERE step LIKE 'live\\_%'")
+            return
+
+        done = {row['step'][len('live_') :] for row in rows}
+        steps = [step for step, _ in cls._live_steps if step not in done] + ['last_completed_block']
+        log.info(f"Finishing tables updates of blocks <{first_block}:{last_block}> interrupted in live sync, steps: {steps}")
+        is_hour_action = any(block_number % 1200 == 0 for block_number in range(first_block, last_block + 1))
+        cls._update_live_blocks(DB, first_block, last_block, is_hour_action, steps)
+
+    @staticmethod
+    def _update_live_blocks(db: Db, first_block: int, last_block: int, is_hour_action: bool, steps: list = None) -> None:
+        sql = f"SELECT * FROM {SCHEMA_NAME}.update_live_blocks(:first_block, :last_block, :is_hour_action, :steps)"
+        rows = db.query_all(
+            sql, first_block=first_block, last_block=last_block, is_hour_action=is_hour_action, steps=steps
+        )
+        for step, elapsed_time in rows:
+            log.info("%s of blocks <%d:%d> executed in: %.4f s", step, first_block, last_block, elapsed_time)
 
     @staticmethod
     def is_consistency() -> bool:
@@ -10,7 +10,9 @@ import ujson as json
 
 from hive.conf import SCHEMA_NAME
 from hive.db.adapter import Db
+from hive.db.prepared_sql import PreparedSql
 from hive.indexer.accounts import Accounts
+from hive.indexer.deferred_writes import DeferredWrites
 from hive.indexer.notify import Notify
 from hive.server.common.helpers import check_community
 
@@ -18,6 +20,47 @@ log = logging.getLogger(__name__)
 
 DB = Db.instance()
 
+# queries run while processing community ops are prepared once per connection
+COMMUNITY_ID_SQL = PreparedSql('community_id', f"SELECT id FROM {SCHEMA_NAME}.hive_communities WHERE name = :name")
+COMMUNITY_NAME_SQL = PreparedSql('community_name', f"SELECT name FROM {SCHEMA_NAME}.hive_communities WHERE id = :id")
+USER_ROLE_SQL = PreparedSql(
+    'community_user_role',
+    f"""SELECT role_id FROM {SCHEMA_NAME}.hive_roles
+        WHERE community_id = :community_id
+          AND account_id = :account_id
+        LIMIT 1""",
+)
+POST_BY_PERMLINK_SQL = PreparedSql(
+    'community_post_by_permlink',
+    f"""
+      SELECT hp.id, community_id
+      FROM {SCHEMA_NAME}.live_posts_comments_view hp
+      JOIN {SCHEMA_NAME}.hive_permlink_data hpd ON hp.permlink_id=hpd.id
+      WHERE author_id=:_author AND hpd.permlink=:_permlink
+    """,
+)
+SUBSCRIBED_SQL = PreparedSql(
+    'community_subscribed',
+    f"""SELECT 1 FROM {SCHEMA_NAME}.hive_subscriptions
+        WHERE community_id = :community_id
+          AND account_id = :account_id""",
+)
+POST_MUTED_SQL = PreparedSql('community_post_muted', f"SELECT is_muted FROM {SCHEMA_NAME}.hive_posts WHERE id = :id")
+PARENT_MUTED_SQL = PreparedSql(
+    'community_parent_muted',
+    f"""SELECT is_muted FROM {SCHEMA_NAME}.hive_posts
+        WHERE id = (SELECT parent_id FROM {SCHEMA_NAME}.hive_posts WHERE id = :id)""",
+)
+POST_PINNED_SQL = PreparedSql('community_post_pinned', f"SELECT is_pinned FROM {SCHEMA_NAME}.hive_posts WHERE id = :id")
+FLAGGED_SQL = PreparedSql(
+    'community_flagged',
+    f"""SELECT 1 FROM {SCHEMA_NAME}.hive_notifs
+        WHERE community_id = :community_id
+          AND post_id = :post_id
+          AND type_id = :type_id
+          AND src_id = :src_id""",
+)
+
 
 class Role(IntEnum):
     """Labels for `role_id` field."""
@@ -170,8 +213,7 @@ class Community:
         assert name, 'name is empty'
         if name in cls._ids:
             return cls._ids[name]
-        sql = f"SELECT id FROM {SCHEMA_NAME}.hive_communities WHERE name = :name"
-        cid = DB.query_one(sql, name=name)
+        cid = DB.query_one(COMMUNITY_ID_SQL, name=name)
         if cid:
             cls._ids[name] = cid
             cls._names[cid] = name
@@ -181,8 +223,7 @@ class Community:
     def _get_name(cls, cid):
         if cid in cls._names:
             return cls._names[cid]
-        sql = f"SELECT name FROM {SCHEMA_NAME}.hive_communities WHERE id = :id"
-        name = DB.query_one(sql, id=cid)
+        name = DB.query_one(COMMUNITY_NAME_SQL, id=cid)
         if cid:
             cls._ids[name] = cid
             cls._names[cid] = name
@@ -205,10 +246,7 @@ class Community:
 
         return (
             DB.query_one(
-                f"""SELECT role_id FROM {SCHEMA_NAME}.hive_roles
-                                    WHERE community_id = :community_id
-                                      AND account_id = :account_id
-                                    LIMIT 1""",
+                USER_ROLE_SQL,
                 community_id=community_id,
                 account_id=account_id,
             )
@@ -318,7 +356,7 @@ class CommunityOp:
         return self.valid
 
     def process(self):
-        """Applies a validated operation."""
+        """Applies a validated operation; its writes might be deferred (see `DeferredWrites`)."""
         assert self.valid, 'cannot apply invalid op'
 
         action = self.action
@@ -340,32 +378,32 @@ class CommunityOp:
         # Community-level commands
         if action == 'updateProps':
             bind = ', '.join([k + " = :" + k for k in list(self.props.keys())])
-            DB.query(
+            self._write(
                 f"UPDATE {SCHEMA_NAME}.hive_communities SET {bind} WHERE id = :id", id=self.community_id, **self.props
             )
             self._notify('set_props', payload=json.dumps(read_key_dict(self.op, 'props')))
 
         elif action == 'subscribe':
-            DB.query(
+            self._write(
                 f"""INSERT INTO {SCHEMA_NAME}.hive_subscriptions
                                (account_id, community_id, created_at, block_num)
                         VALUES (:actor_id, :community_id, :date, :block_num)""",
                 **params,
             )
-            DB.query(
+            self._write(
                 f"""UPDATE {SCHEMA_NAME}.hive_communities
                            SET subscribers = subscribers + 1
                          WHERE id = :community_id""",
                 **params,
             )
         elif action == 'unsubscribe':
-            DB.query(
+            self._write(
                 f"""DELETE FROM {SCHEMA_NAME}.hive_subscriptions
                          WHERE account_id = :actor_id
                            AND community_id = :community_id""",
                 **params,
             )
-            DB.query(
+            self._write(
                 f"""UPDATE {SCHEMA_NAME}.hive_communities
                            SET subscribers = subscribers - 1
                          WHERE id = :community_id""",
@@ -374,7 +412,7 @@ class CommunityOp:
 
         # Account-level actions
         elif action == 'setRole':
-            DB.query(
+            self._write(
                 f"""INSERT INTO {SCHEMA_NAME}.hive_roles
                                (account_id, community_id, role_id, created_at)
                         VALUES (:account_id, :community_id, :role_id, :date)
@@ -384,7 +422,7 @@ class CommunityOp:
             )
             self._notify('set_role', payload=Role(self.role_id).name)
         elif action == 'setUserTitle':
-            DB.query(
+            self._write(
                 f"""INSERT INTO {SCHEMA_NAME}.hive_roles
                                (account_id, community_id, title, created_at)
                         VALUES (:account_id, :community_id, :title, :date)
@@ -396,7 +434,7 @@ class CommunityOp:
 
         # Post-level actions
         elif action == 'mutePost':
-            DB.query(
+            self._write(
                 f"""UPDATE {SCHEMA_NAME}.hive_posts SET is_muted = '1'
                          WHERE id = :post_id""",
                 **params,
@@ -404,7 +442,7 @@ class CommunityOp:
             self._notify('mute_post', payload=self.notes)
 
         elif action == 'unmutePost':
-            DB.query(
+            self._write(
                 f"""UPDATE {SCHEMA_NAME}.hive_posts SET is_muted = '0'
                          WHERE id = :post_id""",
                 **params,
@@ -412,14 +450,14 @@ class CommunityOp:
             self._notify('unmute_post', payload=self.notes)
 
         elif action == 'pinPost':
-            DB.query(
+            self._write(
                 f"""UPDATE {SCHEMA_NAME}.hive_posts SET is_pinned = '1'
                          WHERE id = :post_id""",
                 **params,
             )
             self._notify('pin_post', payload=self.notes)
         elif action == 'unpinPost':
-            DB.query(
+            self._write(
                 f"""UPDATE {SCHEMA_NAME}.hive_posts SET is_pinned = '0'
                          WHERE id = :post_id""",
                 **params,
@@ -430,6 +468,15 @@ class CommunityOp:
 
         return True
 
+    @staticmethod
+    def _write(sql, **params):
+        DeferredWrites.add(CommunityOp._apply_writes, (sql, params))
+
+    @staticmethod
+    def _apply_writes(writes):
+        for sql, params in writes:
+            DB.query(sql, **params)
+
     def _notify(self, op, **kwargs):
         dst_id = None
         score = 35
@@ -498,13 +545,7 @@ class CommunityOp:
         _permlink = read_key_str(self.op, 'permlink', 256)
         assert _permlink, 'must name a permlink'
 
-        sql = f"""
-          SELECT hp.id, community_id
-          FROM {SCHEMA_NAME}.live_posts_comments_view hp
-          JOIN {SCHEMA_NAME}.hive_permlink_data hpd ON hp.permlink_id=hpd.id
-          WHERE author_id=:_author AND hpd.permlink=:_permlink
-        """
-        result = DB.query_row(sql, _author=self.account_id, _permlink=_permlink)
+        result = DB.query_row(POST_BY_PERMLINK_SQL, _author=self.account_id, _permlink=_permlink)
         assert result, f'post does not exists {self.account}/{_permlink}'
         result = dict(result)
 
@@ -611,39 +652,27 @@ class CommunityOp:
 
     def _subscribed(self, account_id):
         """Check an account's subscription status."""
-        sql = f"""SELECT 1 FROM {SCHEMA_NAME}.hive_subscriptions
-                  WHERE community_id = :community_id
-                    AND account_id = :account_id"""
-        return bool(DB.query_one(sql, community_id=self.community_id, account_id=account_id))
+        return bool(DB.query_one(SUBSCRIBED_SQL, community_id=self.community_id, account_id=account_id))
 
     def _muted(self):
         """Check post's muted status."""
-        sql = f"SELECT is_muted FROM {SCHEMA_NAME}.hive_posts WHERE id = :id"
-        return bool(DB.query_one(sql, id=self.post_id))
+        return bool(DB.query_one(POST_MUTED_SQL, id=self.post_id))
 
     def _parent_muted(self):
         """Check parent post's muted status."""
-        parent_id = f"SELECT parent_id FROM {SCHEMA_NAME}.hive_posts WHERE id = :id"
-        sql = f"SELECT is_muted FROM {SCHEMA_NAME}.hive_posts WHERE id = ({parent_id})"
-        return bool(DB.query_one(sql, id=self.post_id))
+        return bool(DB.query_one(PARENT_MUTED_SQL, id=self.post_id))
 
     def _pinned(self):
         """Check post's pinned status."""
-        sql = f"SELECT is_pinned FROM {SCHEMA_NAME}.hive_posts WHERE id = :id"
-        return bool(DB.query_one(sql, id=self.post_id))
+        return bool(DB.query_one(POST_PINNED_SQL, id=self.post_id))
 
     def _flagged(self):
         """Check user's flag status."""
         from hive.indexer.notify import NotifyType
 
-        sql = f"""SELECT 1 FROM {SCHEMA_NAME}.hive_notifs
-                  WHERE community_id = :community_id
-                    AND post_id = :post_id
-                    AND type_id = :type_id
-                    AND src_id = :src_id"""
         return bool(
             DB.query_one(
-                sql,
+                FLAGGED_SQL,
                 community_id=self.community_id,
                 post_id=self.post_id,
                 type_id=NotifyType['flag_post'],
@@ -5,7 +5,9 @@ import logging
 from funcy.seqs import first, second
 
 from hive.db.adapter import Db
+from hive.indexer.block import CUSTOM_JSON_IDS
 from hive.indexer.community import Community, process_json_community_op
+from hive.indexer.deferred_writes import DeferredWrites
 from hive.indexer.follow import Follow
 from hive.indexer.notify import Notify
 from hive.indexer.reblog import Reblog
@@ -37,7 +39,7 @@ class CustomOp:
 
     @classmethod
     def process_op(cls, op, block_num, block_date):
-        opName = str(op['id']) + ('-ignored' if op['id'] not in ['follow', 'community', 'notify', 'reblog'] else '')
+        opName = str(op['id']) + ('-ignored' if op['id'] not in CUSTOM_JSON_IDS else '')
 
         account = _get_auth(op)
         if not account:
@@ -55,6 +57,8 @@ class CustomOp:
             cls._process_legacy(account, op_json, block_date, block_num)
         elif op['id'] == 'community':
             if block_num > Community.start_block:
+                # validation of community operations reads state which might be changed by writes still waiting
+                DeferredWrites.apply()
                 op_json = load_json_key(op, 'json')
                 process_json_community_op(account, op_json, block_date, block_num)
         elif op['id'] == 'notify':
@@ -1,5 +1,7 @@
 import logging
 
+from hive.db.connection_pool import ConnectionPool
+
 log = logging.getLogger(__name__)
 
 
@@ -25,12 +27,12 @@ class DbAdapterHolder(object):
         if DbLiveContextHolder.is_live_context():
             cls.db = sharedDb
         else:
-            cls.db = sharedDb.clone(name)
+            cls.db = ConnectionPool.lease(sharedDb, name)
 
     @classmethod
     def close_own_db_access(cls):
         if cls.db is not None:
-            cls.db.close()
+            ConnectionPool.release(cls.db)
             cls.db = None
 
     @classmethod
@@ -0,0 +1,54 @@
+"""Ordered buffer of writes which block operations would otherwise perform one by one."""
+
+from itertools import groupby
+import logging
+from typing import Callable, List, Tuple
+
+from hive.db.db_state import DbState
+
+log = logging.getLogger(__name__)
+
+
+class DeferredWrites:
+    """Collects writes of operations in order of operations and applies them together.
+
+    Every write is a pair of `apply` function and an item passed to it. When writes are applied,
+    consecutive writes with the same `apply` are passed to it as one list, so each run of similar
+    operations costs a single query, while order of different kinds of writes is preserved.
+    Writes are applied on shared database connection, in transaction of processed blocks. Anything
+    that reads state changed by collected writes has to call `apply` first. Writes are collected
+    only during massive sync, live sync performs them one by one.
+    """
+
+    _enabled = False
+    _writes: List[Tuple[Callable[[List], None], object]] = []
+
+    @classmethod
+    def setup(cls, enabled: bool) -> None:
+        cls._enabled = enabled
+        cls._writes = []
+        if enabled:
+            log.info(
+                "Writes of comment, comment_options, delete_comment, transfer, reblog, notify and community operations are batched"
+            )
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls._enabled
+
+    @classmethod
+    def add(cls, apply: Callable[[List], None], item) -> None:
+        """Schedule `apply([item])`; performed immediately when writes are not collected"""
+        if cls._enabled and DbState.is_massive_sync():
+            cls._writes.append((apply, item))
+        else:
+            apply([item])
+
+    @classmethod
+    def apply(cls) -> int:
+        """Apply all collected writes in order; returns number of writes"""
+        writes = cls._writes
+        cls._writes = []
+        for apply, run in groupby(writes, key=lambda write: write[0]):
+            apply([item for _, item in run])
+        return len(writes)
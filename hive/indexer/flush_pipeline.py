@@ -0,0 +1,138 @@
+"""Background flushing of indexer data collected for consecutive batches of blocks."""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from typing import Callable, Deque, Dict, Iterable, List, Tuple
+
+from hive.utils.stats import FlushStatusManager as FSM
+from hive.utils.stats import WaitingStatusManager as WSM
+
+log = logging.getLogger(__name__)
+
+
+def _timed_flush(indexer, frozen):
+    start_time = FSM.start()
+    result = indexer.flush_buffers(frozen)
+    elapsed_time = FSM.stop(start_time)
+    return result, elapsed_time
+
+
+class PendingFlush:
+    """Flush of data detached from single indexer after a batch of blocks."""
+
+    def __init__(self, description: str, indexer, frozen, future):
+        self.description = description
+        self.indexer = indexer
+        self.frozen = frozen
+        self.future = future
+
+
+class FlushPipeline:
+    """Flushes data of indexers in background, while next batch of blocks is being processed.
+
+    After each batch, buffers of all indexers are swapped out (`swap_buffers`) and such frozen
+    generation is flushed (`flush_buffers`) on a lane - single thread dedicated to the indexer,
+    so generations of the same indexer always reach the database in order. Number of generations
+    still being flushed while next batch is processed is limited by `max_generations`, which caps
+    memory used for frozen data.
+    """
+
+    _max_generations = 0
+    _lanes: Dict[type, ThreadPoolExecutor] = {}
+    _generations: Deque[List[PendingFlush]] = deque()
+
+    @classmethod
+    def setup(cls, max_generations: int) -> None:
+        cls._max_generations = max_generations
+        if cls.is_enabled():
+            log.info(f"Flushing of up to {max_generations} batches of blocks is performed in background")
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls._max_generations > 0
+
+    @classmethod
+    def submit(cls, flushes: Iterable[Tuple[str, type]]) -> None:
+        """Detach data collected by given indexers and schedule its flush."""
+        generation = []
+        for description, indexer in flushes:
+            lane = cls._lanes.get(indexer)
+            if lane is None:
+                lane = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'flush_{description}')
+                cls._lanes[indexer] = lane
+
+            frozen = indexer.swap_buffers()
+            future = lane.submit(_timed_flush, indexer, frozen)
+            generation.append(PendingFlush(description, indexer, frozen, future))
+        cls._generations.append(generation)
+
+    @classmethod
+    def wait_for_capacity(cls) -> None:
+        """Wait until at most `max_generations` are still being flushed. Must not be called inside of
+        a transaction, since background flushes might need to lock rows changed in it."""
+        if len(cls._generations) > cls._max_generations:
+            wait_time = WSM.start()
+            while len(cls._generations) > cls._max_generations:
+                cls._complete_oldest()
+            WSM.wait_stat('block_consumer_flush', WSM.stop(wait_time))
+
+    @classmethod
+    def drain(cls) -> None:
+        """Wait until all detached data is flushed."""
+        if cls._generations:
+            wait_time = WSM.start()
+            while cls._generations:
+                cls._complete_oldest()
+            WSM.wait_stat('block_consumer_flush', WSM.stop(wait_time))
+
+    @classmethod
+    def close(cls) -> None:
+        """Flush all detached data and stop lanes."""
+        try:
+            cls.drain()
+        finally:
+            cls._generations.clear()
+            for lane in cls._lanes.values():
+                lane.shutdown()
+            cls._lanes.clear()
+
+    @classmethod
+    def pending_buffers(cls, indexer) -> List:
+        """Data detached from given indexer that might not be flushed yet, newest first."""
+        return [
+            pending.frozen
+            for generation in reversed(cls._generations)
+            for pending in generation
+            if pending.indexer is indexer
+        ]
+
+    @classmethod
+    def is_post_pending(cls, indexers: Iterable[type], author: str, permlink: str) -> bool:
+        """Check if data detached from any of given indexers concerns given post."""
+        return any(
+            pending.indexer.is_post_pending(pending.frozen, author, permlink)
+            for generation in cls._generations
+            for pending in generation
+            if pending.indexer in indexers
+        )
+
+    @classmethod
+    def is_pending(cls, indexer, predicate: Callable) -> bool:
+        """Check if any data detached from given indexer, for which `predicate` holds, might not be flushed yet."""
+        return any(predicate(frozen) for frozen in cls.pending_buffers(indexer))
+
+    @classmethod
+    def _complete_oldest(cls) -> None:
+        generation = cls._generations[0]
+        for pending in generation:
+            try:
+                (n, elapsed_time) = pending.future.result()
+                assert n is not None
+                assert not pending.indexer.sync_tx_active()
+
+                FSM.flush_stat(pending.description, elapsed_time, n)
+            except Exception as exc:
+                log.error(f'{pending.description!r} generated an exception: {exc}')
+                raise exc
+        cls._generations.popleft()
@@ -6,12 +6,27 @@ import logging
 from funcy.seqs import first
 
 from hive.conf import SCHEMA_NAME
+from hive.db.bulk_loader import BulkLoader, StagingTable
 from hive.indexer.accounts import Accounts
 from hive.indexer.db_adapter_holder import DbAdapterHolder
-from hive.utils.normalize import escape_characters
 
 log = logging.getLogger(__name__)
 
+FOLLOWS_STAGING = StagingTable(
+    'hive_follows_staging',
+    [
+        ('id', 'INT'),
+        ('follower', 'VARCHAR'),
+        ('following', 'VARCHAR'),
+        ('created_at', 'TIMESTAMP'),
+        ('state', 'SMALLINT'),
+        ('blacklisted', 'BOOLEAN'),
+        ('follow_blacklists', 'BOOLEAN'),
+        ('follow_muted', 'BOOLEAN'),
+        ('block_num', 'INT'),
+    ],
+)
+
 
 class Action(enum.IntEnum):
     Nothing = 0  # cancel existing Blog/Ignore
@@ -100,10 +115,10 @@ class Follow(DbAdapterHolder):
                 idx=cls.idx,
                 follower=follower,
                 following=following,
-                state=new_state if new_state is not None else 'NULL',
-                blacklisted=new_blacklisted if new_blacklisted is not None else 'NULL',
-                follow_blacklists=new_follow_blacklists if new_follow_blacklists is not None else 'NULL',
-                follow_muted=new_follow_muted if new_follow_muted is not None else 'NULL',
+                state=new_state,
+                blacklisted=new_blacklisted,
+                follow_blacklists=new_follow_blacklists,
+                follow_muted=new_follow_muted,
                 at=at,
                 block_num=block_num,
             )
@@ -193,7 +208,7 @@ class Follow(DbAdapterHolder):
                 # lists (since that user is already choosing his own lists)
                 cls._follow_single(
                     follower,
-                    escape_characters('null'),
+                    'null',
                     op['at'],
                     op['block_num'],
                     None,
@@ -278,23 +293,36 @@ class Follow(DbAdapterHolder):
             return None
 
         return dict(
-            follower=escape_characters(op['follower']),
-            following=[escape_characters(following) for following in op['following']],
+            follower=op['follower'],
+            following=op['following'],
             state=state,
             at=date,
         )
 
+    @classmethod
+    def swap_buffers(cls):
+        """Detach collected follow data, so it can be flushed while new data is being collected"""
+        frozen = (cls.follow_items_to_flush, cls.list_resets_to_flush)
+        cls.follow_items_to_flush = dict()
+        cls.list_resets_to_flush = []
+        cls.idx = 0
+        return frozen
+
     @classmethod
     def flush(cls):
+        return cls.flush_buffers(cls.swap_buffers())
+
+    @classmethod
+    def flush_buffers(cls, frozen):
+        """Flush follow data detached with swap_buffers to database"""
+        follow_items_to_flush, list_resets_to_flush = frozen
         n = 0
-        if cls.follow_items_to_flush or cls.list_resets_to_flush:
+        if follow_items_to_flush or list_resets_to_flush:
             cls.beginTx()
 
-            for reset_list in cls.list_resets_to_flush:
-                sql = f"SELECT {SCHEMA_NAME}.{reset_list['reset_call']}({reset_list['follower']}::VARCHAR, {reset_list['block_num']}::INT)"
-                cls.db.query_no_return(sql)
-
-            cls.list_resets_to_flush.clear()
+            for reset_list in list_resets_to_flush:
+                sql = f"SELECT {SCHEMA_NAME}.{reset_list['reset_call']}((:follower)::VARCHAR, (:block_num)::INT)"
+                cls.db.query_no_return(sql, follower=reset_list['follower'], block_num=reset_list['block_num'])
 
             sql = f"""
                 INSERT INTO {SCHEMA_NAME}.hive_follows as hf (follower, following, created_at, state, blacklisted, follow_blacklists, follow_muted, block_num)
@@ -319,11 +347,7 @@ class Follow(DbAdapterHolder):
                         t.follow_blacklists,
                         t.follow_muted,
                         t.block_num
-                    FROM
-                        (
-                            VALUES
-                            {{}}
-                        ) as T (id, follower, following, created_at, state, blacklisted, follow_blacklists, follow_muted, block_num)
+                    FROM {{}} as T (id, follower, following, created_at, state, blacklisted, follow_blacklists, follow_muted, block_num)
                     INNER JOIN {SCHEMA_NAME}.hive_accounts ha_flr ON ha_flr.name = T.follower
                     INNER JOIN {SCHEMA_NAME}.hive_accounts ha_flg ON ha_flg.name = T.following
                 ) AS ds(id, follower_id, following_id, created_at, state, blacklisted, follow_blacklists, follow_muted, block_num)
@@ -338,29 +362,21 @@ class Follow(DbAdapterHolder):
                         block_num = EXCLUDED.block_num
                 WHERE hf.following = EXCLUDED.following AND hf.follower = EXCLUDED.follower
                 """
-            values = []
-            limit = 1000
-            count = 0
-
-            for _, follow_item in cls.follow_items_to_flush.items():
-                values.append(
-                    f"({follow_item['idx']}, {follow_item['follower']}, {follow_item['following']}, '{follow_item['at']}'::timestamp, {follow_item['state']}::smallint, {follow_item['blacklisted']}::boolean, {follow_item['follow_blacklists']}::boolean, {follow_item['follow_muted']}::boolean, {follow_item['block_num']})"
+            rows = [
+                (
+                    follow_item['idx'],
+                    follow_item['follower'],
+                    follow_item['following'],
+                    follow_item['at'],
+                    follow_item['state'],
+                    follow_item['blacklisted'],
+                    follow_item['follow_blacklists'],
+                    follow_item['follow_muted'],
+                    follow_item['block_num'],
                 )
-                count = count + 1
-                if count >= limit:
-                    query = str(sql).format(",".join(values))
-                    cls.db.query_prepared(query)
-                    values.clear()
-                    count = 0
-                n += 1
-
-            if len(values) > 0:
-                query = str(sql).format(",".join(values))
-                cls.db.query_prepared(query)
-                values.clear()
-
-            cls.follow_items_to_flush.clear()
+                for follow_item in follow_items_to_flush.values()
+            ]
+            n = BulkLoader.write(cls.db, FOLLOWS_STAGING, rows, sql)
 
             cls.commitTx()
-            cls.idx = 0
         return n
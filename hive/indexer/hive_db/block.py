@@ -1,64 +1,91 @@
 import logging
 
+import orjson
 import ujson as json
 
 from hive.indexer.block import Block, Operation, OperationType, Transaction, VirtualOperationType
 
 log = logging.getLogger(__name__)
 
+# Fields read by indexers from the most frequent operations, with their types. Bodies of such operations
+# are reduced to these fields only, everything else is dropped right after parsing.
+TYPED_FIELDS = {
+    OperationType.VOTE: (
+        ('voter', str),
+        ('author', str),
+        ('permlink', str),
+        ('weight', int),
+    ),
+    VirtualOperationType.EFFECTIVE_COMMENT_VOTE: (
+        ('voter', str),
+        ('author', str),
+        ('permlink', str),
+        ('weight', int),
+        ('rshares', int),
+        ('total_vote_weight', int),
+        ('pending_payout', dict),
+    ),
+}
+
+
+def parse_body(operation_type, operation_body: str) -> dict:
+    """Parse value of operation body; for types from TYPED_FIELDS only their fields are extracted."""
+    try:
+        value = orjson.loads(operation_body)['value']
+    except orjson.JSONDecodeError:
+        # orjson is stricter than ujson (f.e. about lone surrogates), so such bodies are parsed the old way
+        value = json.loads(operation_body)['value']
+
+    fields = TYPED_FIELDS.get(operation_type)
+    if fields is None:
+        return value
+    return {name: field_type(value[name]) for name, field_type in fields}
+
 
 class VirtualOperationHiveDb(Operation):
     def __init__(self, operation_type, operation_body):
         self._operation_type = operation_type
         self._operation_body = operation_body
+        self._body = None
 
     def get_type(self):
         return self._operation_type
 
     def get_body(self):
-        body = json.loads(str(self._operation_body))
-        return body['value']
+        """Body is parsed on first call only, later calls return the same dict."""
+        if self._body is None:
+            self._body = parse_body(self._operation_type, self._operation_body)
+            self._operation_body = None
+        return self._body
 
 
 class OperationHiveDb(Operation):
     def __init__(self, operation_type, operation_body):
         self._operation_type = operation_type
         self._operation_body = operation_body
+        self._body = None
 
     def get_type(self):
         return self._operation_type
 
     def get_body(self):
-        body = json.loads(self._operation_body)
-        return body['value']
+        """Body is parsed on first call only, later calls return the same dict."""
+        if self._body is None:
+            self._body = parse_body(self._operation_type, self._operation_body)
+            self._operation_body = None
+        return self._body
 
 
 class TransactionHiveDb(Transaction):
-    def __init__(self, block_num, operations, firts_operation_idx, operation_id_to_enum):
+    def __init__(self, block_num, operations):
         self._block_num = block_num
         self._operations = operations
-        self._first_operation_idx = firts_operation_idx
-        self._operation_id_to_enum = operation_id_to_enum
 
     def get_id(self):
         return 0  # it is a fake transactions which returns all operations
 
     def get_next_operation(self):
-        if self._first_operation_idx is None:
-            return None
-
-        for op_idx in range(self._first_operation_idx, len(self._operations)):
-            assert self._operations[op_idx]['block_num'] >= self._block_num
-
-            if self._operations[op_idx]['block_num'] > self._block_num:
-                break
-
-            operation_type = self._operation_id_to_enum(self._operations[op_idx]['operation_type_id'])
-            if type(operation_type) != OperationType:
-                continue
-
-            operation = OperationHiveDb(operation_type, self._operations[op_idx]['body'])
-            yield operation
+        yield from self._operations
 
 
 class BlockHiveDb(Block):
@@ -69,35 +96,22 @@ class BlockHiveDb(Block):
         hash,
         previous_block_hash,
         operations,
-        first_operation_idx,
-        opertion_id_to_enum,
+        virtual_operations,
     ):
+        """operations, virtual_operations - OperationHiveDb and VirtualOperationHiveDb objects of the block only"""
 
         self._num = num
         self._date = date
         self._hash = hash.hex()
         self._prev_hash = previous_block_hash.hex()
         self._operations = operations
-        self._first_operation_idx = first_operation_idx
-        self._operation_id_to_enum = opertion_id_to_enum
+        self._virtual_operations = virtual_operations
 
     def get_num(self):
         return self._num
 
     def get_next_vop(self):
-        if self._first_operation_idx is None:
-            return None
-
-        for virtual_op_idx in range(self._first_operation_idx, len(self._operations)):
-            if self._operations[virtual_op_idx]['block_num'] > self.get_num():
-                break
-
-            operation_type = self._operation_id_to_enum(self._operations[virtual_op_idx]['operation_type_id'])
-            if type(operation_type) != VirtualOperationType:
-                continue
-
-            virtual_op = VirtualOperationHiveDb(operation_type, self._operations[virtual_op_idx]['body'])
-            yield virtual_op
+        yield from self._virtual_operations
 
     def get_date(self):
         return self._date
@@ -109,9 +123,7 @@ class BlockHiveDb(Block):
         return self._prev_hash
 
     def get_next_transaction(self):
-        if self._first_operation_idx is None:
+        if not self._operations:
             return None
-        trans = TransactionHiveDb(
-            self.get_num(), self._operations, self._first_operation_idx, self._operation_id_to_enum
-        )
+        trans = TransactionHiveDb(self.get_num(), self._operations)
         yield trans
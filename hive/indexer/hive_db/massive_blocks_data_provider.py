@@ -1,62 +1,176 @@
 from concurrent.futures import ThreadPoolExecutor
 import logging
 import queue
-from typing import Final, List, Optional
+import threading
+from time import perf_counter as perf
+from typing import Dict, Final, List, Optional, Tuple
 
 from sqlalchemy import text
 
 from hive.conf import Conf
 from hive.db.adapter import Db
-from hive.indexer.block import BlocksProviderBase, OperationType, VirtualOperationType
-from hive.indexer.hive_db.block import BlockHiveDb
+from hive.db.connection_pool import ConnectionPool
+from hive.indexer.block import CUSTOM_JSON_IDS, BlocksProviderBase, OperationType, VirtualOperationType
+from hive.indexer.hive_db.block import BlockHiveDb, OperationHiveDb, VirtualOperationHiveDb
 from hive.signals import can_continue_thread, set_exception_thrown
 from hive.utils.stats import WaitingStatusManager as WSM
 
 log = logging.getLogger(__name__)
 
-OPERATIONS_QUERY: Final[str] = "SELECT * FROM hivemind_app.enum_operations4hivemind(:first, :last)"
+OPERATIONS_QUERY: Final[str] = (
+    "SELECT * FROM hivemind_app.enum_operations4hivemind(:first, :last, :operation_types, :custom_json_ids)"
+)
+# only operations handled by indexers are requested, so there is no need to filter them out on the client side
+OPERATIONS_QUERY_PARAMS: Final[dict] = {
+    'operation_types': [op.value for op in OperationType] + [vop.value for vop in VirtualOperationType],
+    'custom_json_ids': list(CUSTOM_JSON_IDS),
+}
 BLOCKS_QUERY: Final[str] = "SELECT * FROM hivemind_app.enum_blocks4hivemind(:first, :last)"
 
 
+class FetchTuner:
+    """Adapts size of requested block ranges and capacity of data queues to observed waiting times.
+
+    Range size is doubled when the consumer starves while queries return faster than
+    `TARGET_QUERY_TIME` (per query overhead dominates), and halved when fetchers wait for their
+    turn in reordering longer than their query took (ranges too coarse to spread between them).
+    Queue capacity is doubled when the consumer starves after producers were blocked on full queue.
+    """
+
+    TARGET_QUERY_TIME: Final[float] = 1.0
+    MAX_BLOCKS_PER_QUERY: Final[int] = 1000
+    MAX_QUEUE_SIZE_FACTOR: Final[int] = 4
+
+    def __init__(self, blocks_per_query: int):
+        self._lock = threading.Lock()
+        self._min_blocks_per_query = blocks_per_query
+        self._blocks_per_query = blocks_per_query
+        self._last_query_time = 0.0
+        self._blocked_queues = set()
+        self._queue_base_sizes = {}
+
+    def blocks_per_query(self) -> int:
+        return self._blocks_per_query
+
+    def _resize_range(self, blocks_per_query: int) -> None:
+        blocks_per_query = max(self._min_blocks_per_query, min(blocks_per_query, self.MAX_BLOCKS_PER_QUERY))
+        if blocks_per_query != self._blocks_per_query:
+            log.info(f"Number of blocks fetched per query changed: {self._blocks_per_query} -> {blocks_per_query}")
+            self._blocks_per_query = blocks_per_query
+
+    def on_query(self, query_time: float, turn_wait_time: float) -> None:
+        with self._lock:
+            self._last_query_time = query_time
+            if turn_wait_time > query_time:
+                self._resize_range(self._blocks_per_query // 2)
+
+    def on_producer_blocked(self, data_queue: queue.Queue) -> None:
+        with self._lock:
+            self._blocked_queues.add(data_queue)
+
+    def on_consumer_wait(self, wait_time: float) -> None:
+        with self._lock:
+            if self._last_query_time < self.TARGET_QUERY_TIME:
+                self._resize_range(self._blocks_per_query * 2)
+
+            for data_queue in self._blocked_queues:
+                base_size = self._queue_base_sizes.setdefault(data_queue, data_queue.maxsize)
+                new_size = min(data_queue.maxsize * 2, base_size * self.MAX_QUEUE_SIZE_FACTOR)
+                if new_size != data_queue.maxsize:
+                    log.info(f"Capacity of data queue changed: {data_queue.maxsize} -> {new_size}")
+                    with data_queue.mutex:
+                        data_queue.maxsize = new_size
+                        data_queue.not_full.notify_all()
+            self._blocked_queues.clear()
+
+
 class BlocksDataFromDbProvider:
-    """Starts threads which takes operations for a range of blocks"""
+    """Starts threads which takes operations for a range of blocks
+
+    Every worker uses own database connection and takes next range of blocks from shared cursor.
+    Fetched ranges are passed to the queue strictly in order of blocks, as `(first, last, rows)`.
+    """
 
     def __init__(
         self,
         sql_query: str,
-        db: Db,
-        blocks_per_request: int,
+        dbs: List[Db],
+        tuner: FetchTuner,
         strict: bool,
         external_thread_pool: Optional[ThreadPoolExecutor] = None,
+        sql_params: Optional[dict] = None,
     ):
         """
+        dbs - one database connection per worker
         external_thread_pool - thread pool controlled outside the class
+        sql_params - parameters bound to the query in addition to range of blocks
         """
 
-        assert blocks_per_request >= 1
+        assert dbs
 
         self._lbound = None
         self._ubound = None
-        self._db = db
-        self._thread_pool = external_thread_pool if external_thread_pool else ThreadPoolExecutor(1)
-        self._blocks_per_request = blocks_per_request
+        self._dbs = dbs
+        self._thread_pool = external_thread_pool if external_thread_pool else ThreadPoolExecutor(len(dbs))
+        self._tuner = tuner
         self._sql_query = sql_query
+        self._sql_params = sql_params or {}
         self._strict = strict
 
+        self._cursor_lock = threading.Lock()
+        self._next_block = None
+        self._next_sequence = 0
+        self._turn = threading.Condition()
+        self._sequence_to_put = 0
+
     def update_sync_block_range(self, lbound: int, ubound: int) -> None:
         self._lbound = lbound
         self._ubound = ubound
+        self._next_block = lbound
+        self._next_sequence = 0
+        self._sequence_to_put = 0
+
+    def number_of_workers(self) -> int:
+        return len(self._dbs)
+
+    def _take_range(self) -> Optional[Tuple[int, int, int]]:
+        with self._cursor_lock:
+            if self._next_block > self._ubound:
+                return None
+            first = self._next_block
+            last = min(first + self._tuner.blocks_per_query() - 1, self._ubound)
+            sequence = self._next_sequence
+            self._next_block = last + 1
+            self._next_sequence += 1
+            return sequence, first, last
+
+    def _wait_for_turn(self, sequence: int) -> bool:
+        with self._turn:
+            while self._sequence_to_put != sequence:
+                if not can_continue_thread():
+                    return False
+                self._turn.wait(1)
+        return True
+
+    def _pass_turn(self) -> None:
+        with self._turn:
+            self._sequence_to_put += 1
+            self._turn.notify_all()
 
-    def thread_body_get_data(self, queue_for_data):
+    def thread_body_get_data(self, queue_for_data, worker: int = 0):
         try:
-            for block in range(self._lbound, self._ubound + 1, self._blocks_per_request):
-                if not can_continue_thread():
+            db = self._dbs[worker]
+            while can_continue_thread():
+                block_range = self._take_range()
+                if block_range is None:
                     break
-                last = min([block + self._blocks_per_request - 1, self._ubound])
+                sequence, first, last = block_range
 
-                stmt = text(self._sql_query).bindparams(first=block, last=last)
+                stmt = text(self._sql_query).bindparams(first=first, last=last, **self._sql_params)
 
-                data_rows = self._db.query_all(stmt, is_prepared=True)
+                query_start = perf()
+                data_rows = db.query_all(stmt, is_prepared=True)
+                query_time = perf() - query_start
 
                 if not data_rows:
                     msg = f'DATA ROWS ARE EMPTY! query: {stmt.compile(compile_kwargs={"literal_binds": True})}'
@@ -66,42 +180,67 @@ class BlocksDataFromDbProvider:
                     else:
                         log.warning(msg)
 
-                while can_continue_thread():
-                    try:
-                        queue_for_data.put(data_rows, True, 1)
-                        break
-                    except queue.Full:
-                        continue
+                # reordering: ranges are passed in order they were taken from the cursor
+                turn_start = perf()
+                if not self._wait_for_turn(sequence):
+                    break
+                self._tuner.on_query(query_time, perf() - turn_start)
+
+                try:
+                    while can_continue_thread():
+                        try:
+                            queue_for_data.put((first, last, data_rows), True, 1)
+                            break
+                        except queue.Full:
+                            self._tuner.on_producer_blocked(queue_for_data)
+                            continue
+                finally:
+                    self._pass_turn()
         except:
             set_exception_thrown()
             raise
 
     def start(self, queue_for_data):
-        future = self._thread_pool.submit(self.thread_body_get_data, queue_for_data)
-        return future
+        return [
+            self._thread_pool.submit(self.thread_body_get_data, queue_for_data, worker)
+            for worker in range(self.number_of_workers())
+        ]
 
 
 class MassiveBlocksDataProviderHiveDb(BlocksProviderBase):
     _vop_types_dictionary = {}
     _op_types_dictionary = {}
 
+    # consumer waiting shorter than that is not considered as starving
+    CONSUMER_WAIT_THRESHOLD: Final[float] = 0.1
+
     class Databases:
-        def __init__(self, db_root: Db, shared: bool = False):
+        def __init__(self, db_root: Db, shared: bool = False, number_of_operations_fetchers: int = 1):
+            assert number_of_operations_fetchers >= 1
+
             self._db_root = db_root
-            self._db_operations = db_root.clone('MassiveBlocksProvider_OperationsData') if not shared else None
-            self._db_blocks_data = db_root.clone('MassiveBlocksProvider_BlocksData') if not shared else None
+            self._dbs_operations = (
+                [
+                    ConnectionPool.lease(db_root, 'MassiveBlocksProvider_OperationsData' + (f'_{idx}' if idx else ''))
+                    for idx in range(number_of_operations_fetchers)
+                ]
+                if not shared
+                else []
+            )
+            self._db_blocks_data = ConnectionPool.lease(db_root, 'MassiveBlocksProvider_BlocksData') if not shared else None
 
             assert self._db_root
 
         def close_cloned_databases(self):
-            self._db_operations.close()
-            self._db_blocks_data.close()
+            for db in self._dbs_operations:
+                ConnectionPool.release(db)
+            ConnectionPool.release(self._db_blocks_data)
 
         def get_root(self):
             return self._db_root
 
         def get_operations(self):
-            return self._db_operations or self._db_root
+            return self._dbs_operations or [self._db_root]
 
         def get_blocks_data(self):
             return self._db_blocks_data or self._db_root
@@ -120,29 +259,33 @@ class MassiveBlocksDataProviderHiveDb(BlocksProviderBase):
         self._lbound = None
         self._ubound = None
 
-        self._blocks_per_query = conf.get('max_batch')
+        self._operations_tuner = FetchTuner(blocks_per_query=conf.get('max_batch'))
+        self._blocks_data_tuner = FetchTuner(blocks_per_query=conf.get('max_batch'))
         self._blocks_queue = queue.Queue(maxsize=self._blocks_queue_size)
         self._operations_queue = queue.Queue(maxsize=self._operations_queue_size)
         self._blocks_data_queue = queue.Queue(maxsize=self._blocks_data_queue_size)
 
         self._thread_pool = (
-            external_thread_pool if external_thread_pool else MassiveBlocksDataProviderHiveDb.create_thread_pool()
+            external_thread_pool
+            if external_thread_pool
+            else MassiveBlocksDataProviderHiveDb.create_thread_pool(len(databases.get_operations()))
         )
 
         self._operations_provider = BlocksDataFromDbProvider(
             sql_query=OPERATIONS_QUERY,
-            db=databases.get_operations(),
-            blocks_per_request=self._blocks_per_query,
+            dbs=databases.get_operations(),
+            tuner=self._operations_tuner,
             strict = False,
             external_thread_pool=self._thread_pool,
+            sql_params=OPERATIONS_QUERY_PARAMS,
         )
 
         # Because HAF returns range of available blocks, it is impossible
         # to get empty results for asking for blocks
         self._blocks_data_provider = BlocksDataFromDbProvider(
             sql_query=BLOCKS_QUERY,
-            db=databases.get_blocks_data(),
-            blocks_per_request=self._blocks_per_query,
+            dbs=[databases.get_blocks_data()],
+            tuner=self._blocks_data_tuner,
             strict = True,
             external_thread_pool=self._thread_pool,
         )
@@ -188,55 +331,60 @@ class MassiveBlocksDataProviderHiveDb(BlocksProviderBase):
             return MassiveBlocksDataProviderHiveDb._op_types_dictionary[id_]
 
     @staticmethod
-    def _operation_id_to_enum(id_: int):
-        vop = MassiveBlocksDataProviderHiveDb._id_to_virtual_type(id_)
-        if vop:
-            return vop
-        return MassiveBlocksDataProviderHiveDb._id_to_operation_type(id_)
+    def _partition_operations(operations) -> Dict[int, Tuple[List[OperationHiveDb], List[VirtualOperationHiveDb]]]:
+        """Split rows of operations (ordered by blocks) into lists of operations and virtual operations of each block"""
+        partitions = {}
+        block_num = None
+        for operation in operations:
+            if operation['block_num'] != block_num:
+                block_num = operation['block_num']
+                block_operations, block_virtual_operations = partitions.setdefault(block_num, ([], []))
+
+            if operation['is_virtual']:
+                operation_type = MassiveBlocksDataProviderHiveDb._id_to_virtual_type(operation['operation_type_id'])
+                assert operation_type, f"Not requested virtual operation type: {operation['operation_type_id']}"
+                block_virtual_operations.append(VirtualOperationHiveDb(operation_type, operation['body']))
+            else:
+                operation_type = MassiveBlocksDataProviderHiveDb._id_to_operation_type(operation['operation_type_id'])
+                assert operation_type, f"Not requested operation type: {operation['operation_type_id']}"
+                block_operations.append(OperationHiveDb(operation_type, operation['body']))
+        return partitions
 
     def _thread_get_block(self):
         try:
+            # ranges of operations and blocks data may differ in size, but both come in order of blocks
+            operations_last = self._lbound - 1
+            operations = {}
             while can_continue_thread():
                 blocks_data = self._get_from_queue(self._blocks_data_queue, 1)  # batches of blocks  (lists)
-                operations = self._get_from_queue(self._operations_queue, 1)
 
                 if not can_continue_thread():
                     break
 
                 assert len(blocks_data) == 1, "Always one element should be returned"
-                assert len(operations) == 1, "Always one element should be returned"
 
-                operations = operations[0]
+                _, _, blocks_data = blocks_data[0]
 
-                block_operation_idx = 0
-                for block_data in blocks_data[0]:
+                for block_data in blocks_data:
+                    while operations_last < block_data['num']:
+                        next_operations = self._get_from_queue(self._operations_queue, 1)
+                        if not can_continue_thread():
+                            return
+                        assert len(next_operations) == 1, "Always one element should be returned"
+
+                        _, operations_last, operations = next_operations[0]
+                        operations = self._partition_operations(operations)
+
+                    block_operations, block_virtual_operations = operations.pop(block_data['num'], ([], []))
                     new_block = BlockHiveDb(
                         block_data['num'],
                         block_data['date'],
                         block_data['hash'],
                         block_data['prev'],
-                        None,
-                        None,
-                        MassiveBlocksDataProviderHiveDb._operation_id_to_enum,
+                        block_operations,
+                        block_virtual_operations,
                     )
 
-                    for idx in range(block_operation_idx, len(operations)):
-                        # find first the blocks' operation in the list
-                        if operations[idx]['block_num'] == block_data['num']:
-                            new_block = BlockHiveDb(
-                                block_data['num'],
-                                block_data['date'],
-                                block_data['hash'],
-                                block_data['prev'],
-                                operations,
-                                idx,
-                                MassiveBlocksDataProviderHiveDb._operation_id_to_enum,
-                            )
-                            block_operation_idx = idx
-                            break
-                        if operations[block_operation_idx]['block_num'] > block_data['num']:
-                            break
-
                     while can_continue_thread():
                         try:
                             self._blocks_queue.put(new_block, True, 1)
@@ -250,21 +398,23 @@ class MassiveBlocksDataProviderHiveDb(BlocksProviderBase):
             raise
 
     @staticmethod
-    def create_thread_pool() -> ThreadPoolExecutor:
+    def create_thread_pool(number_of_operations_fetchers: int = 1) -> ThreadPoolExecutor:
         """Creates initialzied thread pool with number of threads required by the provider.
         You can pass the thread pool to provider during its creation to controll its lifetime
         outside the provider"""
 
-        return ThreadPoolExecutor(max_workers=MassiveBlocksDataProviderHiveDb.get_number_of_threads())
+        return ThreadPoolExecutor(
+            max_workers=MassiveBlocksDataProviderHiveDb.get_number_of_threads(number_of_operations_fetchers)
+        )
 
     @staticmethod
-    def get_number_of_threads() -> int:
-        return 3  # block data + operations + collect thread
+    def get_number_of_threads(number_of_operations_fetchers: int = 1) -> int:
+        return number_of_operations_fetchers + 2  # operations fetchers + block data + collect thread
 
     def start(self):
         return [
-            self._operations_provider.start(queue_for_data=self._operations_queue),
-            self._blocks_data_provider.start(queue_for_data=self._blocks_data_queue),
+            *self._operations_provider.start(queue_for_data=self._operations_queue),
+            *self._blocks_data_provider.start(queue_for_data=self._blocks_data_queue),
             self._thread_pool.submit(self._thread_get_block),
         ]  # futures
 
@@ -288,6 +438,10 @@ class MassiveBlocksDataProviderHiveDb(BlocksProviderBase):
         if not self._blocks_queue.empty() or can_continue_thread():
             blocks = self._get_from_queue(self._blocks_queue, number_of_blocks)
 
-        WSM.wait_stat('block_consumer_block', WSM.stop(wait_blocks_time))
+        wait_time = WSM.stop(wait_blocks_time)
+        WSM.wait_stat('block_consumer_block', wait_time)
+        if wait_time > self.CONSUMER_WAIT_THRESHOLD:
+            self._operations_tuner.on_consumer_wait(wait_time)
+            self._blocks_data_tuner.on_consumer_wait(wait_time)
 
         return blocks
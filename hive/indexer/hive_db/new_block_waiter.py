@@ -0,0 +1,53 @@
+"""Waiting for HAF to make next block available to the application context."""
+
+import logging
+import select
+from time import perf_counter as perf
+from typing import Optional
+
+from hive.db.adapter import Db
+
+log = logging.getLogger(__name__)
+
+
+class NewBlockWaiter:
+    """Sleeps between queries for next block, which otherwise run in a busy loop while there is no new block.
+
+    Wait ends on notification sent to `channel` (when given; HAF database has to send it, f.e. from a trigger
+    run when new block is committed) or once a delay passes, whichever comes first. The delay starts at
+    `MIN_DELAY` and doubles with each wait, up to `max_delay`; it goes back to minimum when a block comes.
+    """
+
+    MIN_DELAY = 0.05
+
+    def __init__(self, db: Db, channel: Optional[str], max_delay: float):
+        self._max_delay = max(self.MIN_DELAY, max_delay)
+        self._delay = self.MIN_DELAY
+        self._connection = None
+        if channel:
+            self._connection = db.engine().raw_connection()
+            self._connection.connection.set_session(autocommit=True)
+            with self._connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{channel}"')
+            log.info(f"Waiting for new blocks on notification channel: {channel}")
+
+    def wait(self) -> float:
+        """Returns time waited."""
+        start = perf()
+        if self._connection is None:
+            select.select([], [], [], self._delay)
+        else:
+            dbapi_connection = self._connection.connection
+            if not dbapi_connection.notifies and select.select([dbapi_connection], [], [], self._delay)[0]:
+                dbapi_connection.poll()
+            dbapi_connection.notifies.clear()
+        self._delay = min(self._delay * 2, self._max_delay)
+        return perf() - start
+
+    def reset(self) -> None:
+        self._delay = self.MIN_DELAY
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
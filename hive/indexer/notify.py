@@ -3,8 +3,9 @@ import logging
 
 from hive.conf import SCHEMA_NAME
 from hive.db.adapter import Db
+from hive.db.bulk_loader import BulkLoader, StagingTable
 from hive.indexer.db_adapter_holder import DbAdapterHolder
-from hive.utils.normalize import escape_characters
+from hive.indexer.deferred_writes import DeferredWrites
 from hive.server.common.notify_type import NotifyType
 
 # pylint: disable=too-many-lines,line-too-long
@@ -12,6 +13,29 @@ from hive.server.common.notify_type import NotifyType
 log = logging.getLogger(__name__)
 DB = Db.instance()
 
+NOTIFS_STAGING = StagingTable(
+    'hive_notifs_staging',
+    [
+        ('block_num', 'INT'),
+        ('type_id', 'SMALLINT'),
+        ('score', 'SMALLINT'),
+        ('created_at', 'TIMESTAMP'),
+        ('src_id', 'INT'),
+        ('dst_id', 'INT'),
+        ('post_id', 'INT'),
+        ('community_id', 'INT'),
+        ('payload', 'TEXT'),
+    ],
+)
+
+LASTREAD_STAGING = StagingTable(
+    'hive_lastread_staging',
+    [
+        ('name', 'VARCHAR'),
+        ('date', 'TIMESTAMP'),
+    ],
+)
+
 class Notify(DbAdapterHolder):
     """Handles writing notifications/messages."""
 
@@ -61,58 +85,64 @@ class Notify(DbAdapterHolder):
     @classmethod
     def set_lastread(cls, account, date):
         """Update `lastread` column for a named account."""
-        sql = f"UPDATE {SCHEMA_NAME}.hive_accounts SET lastread_at = :date WHERE name = :name"
-        DB.query(sql, date=date, name=account)
+        DeferredWrites.add(cls._apply_lastread, (account, date))
 
-    def to_db_values(self):
+    @classmethod
+    def _apply_lastread(cls, items):
+        """Update `lastread` columns; only the last date of each account is written."""
+        dates = {}
+        for account, date in items:
+            dates[account] = date
+        sql = f"""
+            UPDATE {SCHEMA_NAME}.hive_accounts ha SET lastread_at = data_source.date
+            FROM ( SELECT * FROM {{}} AS T(name, date) ) AS data_source
+            WHERE ha.name = data_source.name
+        """
+        BulkLoader.write(DB, LASTREAD_STAGING, list(dates.items()), sql)
+
+    def to_db_row(self):
         """Generate a db row."""
-        return "( {}, {}, {}, '{}'::timestamp, {}, {}, {}, {}, {} )".format(
+        return (
             self.block_num,
             self.enum.value,
             self.score,
-            self.when if self.when else "NULL",
-            self.src_id if self.src_id else "NULL",
-            self.dst_id if self.dst_id else "NULL",
-            self.post_id if self.post_id else "NULL",
-            self.community_id if self.community_id else "NULL",
-            escape_characters(str(self.payload)) if self.payload else "NULL",
+            self.when,
+            self.src_id or None,
+            self.dst_id or None,
+            self.post_id or None,
+            self.community_id or None,
+            str(self.payload) if self.payload else None,
         )
 
+    @classmethod
+    def swap_buffers(cls):
+        """Detach buffered notifs, so they can be stored while new ones are being collected"""
+        frozen = Notify._notifies
+        Notify._notifies = []
+        return frozen
+
     @classmethod
     def flush(cls):
         """Store buffered notifs"""
+        return cls.flush_buffers(cls.swap_buffers())
 
-        def execute_query(sql, values):
-            values_str = ','.join(values)
-            actual_query = sql.format(values_str)
-            cls.db.query_prepared(actual_query)
-            values.clear()
+    @classmethod
+    def flush_buffers(cls, frozen):
+        """Store notifs detached with swap_buffers"""
 
         n = 0
-        if Notify._notifies:
+        if frozen:
             cls.beginTx()
 
             sql = f"""INSERT INTO {SCHEMA_NAME}.hive_notifs (block_num, type_id, score, created_at, src_id,
                                               dst_id, post_id, community_id,
                                               payload)
-                          VALUES
-                          -- block_num, type_id, score, created_at, src_id, dst_id, post_id, community_id, payload
-                          {{}}"""
-
-            values = []
-            values_limit = 1000
-
-            for notify in Notify._notifies:
-                values.append(f"{notify.to_db_values()}")
-
-                if len(values) >= values_limit:
-                    execute_query(sql, values)
+                          SELECT block_num, type_id, score, created_at, src_id, dst_id, post_id, community_id, payload
+                          FROM {{}} AS T(block_num, type_id, score, created_at, src_id, dst_id, post_id, community_id, payload)"""
 
-            if len(values) > 0:
-                execute_query(sql, values)
+            rows = [notify.to_db_row() for notify in frozen]
+            n = BulkLoader.write(cls.db, NOTIFS_STAGING, rows, sql)
 
-            n = len(Notify._notifies)
-            Notify._notifies.clear()
             cls.commitTx()
 
         return n
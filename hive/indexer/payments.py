@@ -4,13 +4,32 @@ import logging
 
 from hive.conf import SCHEMA_NAME
 from hive.db.adapter import Db
+from hive.db.bulk_loader import BulkLoader, StagingTable
 from hive.indexer.accounts import Accounts
+from hive.indexer.deferred_writes import DeferredWrites
+from hive.indexer.post_ids_cache import PostIdsCache
 from hive.utils.normalize import parse_amount
 
 log = logging.getLogger(__name__)
 
 DB = Db.instance()
 
+PAYMENTS_STAGING = StagingTable(
+    'hive_payments_staging',
+    [
+        ('order_id', 'INT'),
+        ('post_id', 'INT'),
+        ('author_id', 'INT'),
+        ('permlink', 'VARCHAR'),
+        ('block_num', 'INT'),
+        ('tx_idx', 'SMALLINT'),
+        ('from_account', 'INT'),
+        ('to_account', 'INT'),
+        ('amount', 'NUMERIC'),
+        ('token', 'VARCHAR'),
+    ],
+)
+
 
 class Payments:
     """Handles payments to update post promotion values."""
@@ -24,45 +43,67 @@ class Payments:
         if not result:
             return
 
-        record, author_id, permlink = result
+        DeferredWrites.add(cls._apply_payments, result)
 
-        # add payment record and return post id
+    @classmethod
+    def _apply_payments(cls, payments):
+        """Add payment records and promote paid posts."""
+        rows = []
+        for order_id, (record, author_id, permlink) in enumerate(payments):
+            # promoted post might be created by comment operation processed just before, so ids are looked for now
+            ids = PostIdsCache.get(author_id, permlink)
+            rows.append(
+                (
+                    order_id,
+                    ids[0] if ids else None,
+                    None if ids else author_id,
+                    None if ids else permlink,
+                    record['block_num'],
+                    record['tx_idx'],
+                    record['from_account'],
+                    record['to_account'],
+                    record['amount'],
+                    record['token'],
+                )
+            )
+
+        # posts found in PostIdsCache are taken by id, others are found by author and permlink; every payment
+        # promotes single post, even if more (deleted) posts had the same author and permlink
         sql = f"""
-INSERT INTO {SCHEMA_NAME}.hive_payments(block_num, tx_idx, post_id, from_account, to_account, amount, token) SELECT
-  bn, tx, hp.id, fa, ta, am, tkn
-FROM
-( 
-  SELECT bn, tx, hpd.id, auth_id, fa, ta, am, tkn
-  FROM (VALUES (:_block_num, :_tx_idx, :_permlink, :_author_id , :_from_account , :_to_account , :_amount, :_token)) 
-  AS v(bn, tx, perm, auth_id, fa, ta, am, tkn) 
-  JOIN {SCHEMA_NAME}.hive_permlink_data hpd
-  ON v.perm = hpd.permlink
-) as vv(bn, tx, hpd_id, auth_id, fa, ta, am, tkn )
-JOIN {SCHEMA_NAME}.hive_posts hp
-ON hp.author_id=vv.auth_id AND hp.permlink_id=vv.hpd_id
-RETURNING post_id
+WITH payments AS MATERIALIZED (
+  SELECT * FROM {{}} AS T(order_id, post_id, author_id, permlink, block_num, tx_idx, from_account, to_account, amount, token)
+),
+matched AS MATERIALIZED (
+  SELECT t.order_id, hp.id AS post_id, hp.counter_deleted, t.block_num, t.tx_idx, t.from_account, t.to_account, t.amount, t.token
+  FROM payments t
+  JOIN {SCHEMA_NAME}.hive_posts hp ON hp.id = t.post_id
+  WHERE t.post_id IS NOT NULL
+  UNION ALL
+  SELECT t.order_id, hp.id AS post_id, hp.counter_deleted, t.block_num, t.tx_idx, t.from_account, t.to_account, t.amount, t.token
+  FROM payments t
+  JOIN {SCHEMA_NAME}.hive_permlink_data hpd ON hpd.permlink = t.permlink
+  JOIN {SCHEMA_NAME}.hive_posts hp ON hp.author_id = t.author_id AND hp.permlink_id = hpd.id
+  WHERE t.post_id IS NULL
+),
+inserted AS (
+  INSERT INTO {SCHEMA_NAME}.hive_payments(block_num, tx_idx, post_id, from_account, to_account, amount, token)
+  SELECT m.block_num, m.tx_idx, m.post_id, m.from_account, m.to_account, m.amount, m.token
+  FROM matched m
+  ORDER BY m.order_id
+)
+UPDATE {SCHEMA_NAME}.hive_posts hp SET promoted = hp.promoted + promotions.amount
+FROM (
+  SELECT promoted.post_id, SUM(promoted.amount) AS amount
+  FROM (
+    SELECT DISTINCT ON (m.order_id) m.post_id, m.amount
+    FROM matched m
+    ORDER BY m.order_id, m.counter_deleted
+  ) promoted
+  GROUP BY promoted.post_id
+) promotions
+WHERE hp.id = promotions.post_id AND promotions.amount <> 0
 """
-
-        post_id = DB.query_one(
-            sql,
-            _block_num=record['block_num'],
-            _tx_idx=record['tx_idx'],
-            _permlink=permlink,
-            _author_id=author_id,
-            _from_account=record['from_account'],
-            _to_account=record['to_account'],
-            _amount=record['amount'],
-            _token=record['token'],
-        )
-
-        amount = record['amount']
-        if not isinstance(amount, float):
-            amount = float(amount)
-
-        if amount != 0.0 and post_id is not None:
-            # update post record
-            sql = f"UPDATE {SCHEMA_NAME}.hive_posts SET promoted = promoted + :val WHERE id = :id"
-            DB.query(sql, val=amount, id=post_id)
+        BulkLoader.write(DB, PAYMENTS_STAGING, rows, sql)
 
     @classmethod
     def _validated(cls, op, tx_idx, num, date):
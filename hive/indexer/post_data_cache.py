@@ -1,10 +1,25 @@
 import logging
 
 from hive.conf import SCHEMA_NAME
+from hive.db.adapter import Db
+from hive.db.bulk_loader import BulkLoader, StagingTable
 from hive.indexer.db_adapter_holder import DbAdapterHolder
-from hive.utils.normalize import escape_characters
+from hive.indexer.flush_pipeline import FlushPipeline
 
 log = logging.getLogger(__name__)
+DB = Db.instance()
+
+POST_DATA_STAGING = StagingTable(
+    'hive_post_data_staging',
+    [
+        ('id', 'INT'),
+        ('title', 'VARCHAR'),
+        ('preview', 'VARCHAR'),
+        ('img_url', 'VARCHAR'),
+        ('body', 'TEXT'),
+        ('json', 'TEXT'),
+    ],
+)
 
 
 class PostDataCache(DbAdapterHolder):
@@ -32,48 +47,59 @@ class PostDataCache(DbAdapterHolder):
     @classmethod
     def get_post_body(cls, pid):
         """Returns body of given post from collected cache or from underlying DB storage."""
-        try:
-            post_data = cls._data[pid]
-        except KeyError:
-            sql = f"""
-                  SELECT hpd.body FROM {SCHEMA_NAME}.hive_post_data hpd WHERE hpd.id = :post_id;
-                  """
-            row = cls.db.query_row(sql, post_id=pid)
-            post_data = dict(row)
-        return post_data['body']
+        if pid in cls._data:
+            return cls._data[pid]['body']
+
+        # data detached for flush still being performed in background is not in the database yet
+        for frozen in FlushPipeline.pending_buffers(cls):
+            if pid in frozen:
+                return frozen[pid]['body']
+
+        # own connection might be in use by background flush, so shared one is used
+        sql = f"""
+              SELECT hpd.body FROM {SCHEMA_NAME}.hive_post_data hpd WHERE hpd.id = :post_id;
+              """
+        row = DB.query_row(sql, post_id=pid)
+        return dict(row)['body']
+
+    @classmethod
+    def swap_buffers(cls):
+        """Detach cached data, so it can be flushed while new data is being collected"""
+        frozen = cls._data
+        cls._data = {}
+        return frozen
 
     @classmethod
     def flush(cls, print_query=False):
         """Flush data from cache to db"""
-        if cls._data:
-            values_insert = []
-            values_update = []
-            for k, data in cls._data.items():
-                title = 'NULL' if data['title'] is None else f"{escape_characters(data['title'])}"
-                body = 'NULL' if data['body'] is None else f"{escape_characters(data['body'])}"
-                preview = 'NULL' if data['body'] is None else f"{escape_characters(data['body'][0:1024])}"
-                json = 'NULL' if data['json'] is None else f"{escape_characters(data['json'])}"
-                img_url = 'NULL' if data['img_url'] is None else f"{escape_characters(data['img_url'])}"
-                value = f"({k},{title},{preview},{img_url},{body},{json})"
+        return cls.flush_buffers(cls.swap_buffers(), print_query)
+
+    @classmethod
+    def flush_buffers(cls, frozen, print_query=False):
+        """Flush data detached with swap_buffers to db"""
+        if frozen:
+            rows_insert = []
+            rows_update = []
+            for k, data in frozen.items():
+                preview = None if data['body'] is None else data['body'][0:1024]
+                row = (k, data['title'], preview, data['img_url'], data['body'], data['json'])
                 if data['is_new_post']:
-                    values_insert.append(value)
+                    rows_insert.append(row)
                 else:
-                    values_update.append(value)
+                    rows_update.append(row)
 
             cls.beginTx()
-            if len(values_insert) > 0:
+            if len(rows_insert) > 0:
                 sql = f"""
                     INSERT INTO
                         {SCHEMA_NAME}.hive_post_data (id, title, preview, img_url, body, json)
-                    VALUES
+                    SELECT id, title, preview, img_url, body, json
+                    FROM {{}} AS T(id, title, preview, img_url, body, json)
                 """
-                sql += ','.join(values_insert)
-                if print_query:
-                    log.info(f"Executing query:\n{sql}")
-                cls.db.query_prepared(sql)
-                values_insert.clear()
+                BulkLoader.write(cls.db, POST_DATA_STAGING, rows_insert, sql, print_query)
+                rows_insert.clear()
 
-            if len(values_update) > 0:
+            if len(rows_update) > 0:
                 sql = f"""
                     UPDATE {SCHEMA_NAME}.hive_post_data AS hpd SET
                         title = COALESCE( data_source.title, hpd.title ),
@@ -82,22 +108,13 @@ class PostDataCache(DbAdapterHolder):
                         body = COALESCE( data_source.body, hpd.body ),
                         json = COALESCE( data_source.json, hpd.json )
                     FROM
-                    ( SELECT * FROM
-                    ( VALUES
-                """
-                sql += ','.join(values_update)
-                sql += """
-                    ) AS T(id, title, preview, img_url, body, json)
+                    ( SELECT * FROM {{}} AS T(id, title, preview, img_url, body, json)
                     ) AS data_source
                     WHERE hpd.id = data_source.id
                 """
-                if print_query:
-                    log.info(f"Executing query:\n{sql}")
-                cls.db.query_prepared(sql)
-                values_update.clear()
+                BulkLoader.write(cls.db, POST_DATA_STAGING, rows_update, sql, print_query)
+                rows_update.clear()
 
             cls.commitTx()
 
-        n = len(cls._data.keys())
-        cls._data.clear()
-        return n
+        return len(frozen)
@@ -0,0 +1,98 @@
+"""In-process cache of ids of active posts, used to avoid resolving author/permlink in flush queries."""
+
+from collections import OrderedDict
+import logging
+from typing import Optional, Tuple
+
+from hive.indexer.accounts import Accounts
+from hive.utils.stats import BroadcastObject
+
+log = logging.getLogger(__name__)
+
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+
+
+class PostIdsCache:
+    """LRU cache of (author_id, permlink) -> (post_id, permlink_id, counter_deleted) for posts that are not deleted.
+
+    It is filled with results of `process_hive_post_operation` and entries are removed when post is deleted,
+    so all cached posts have `counter_deleted = 0`. Values are packed into single int to keep entries small.
+    Cache is used only by the thread which processes blocks.
+    """
+
+    # default size for about 400MB of memory
+    CACHE_SIZE = 2000000
+
+    _size = CACHE_SIZE
+    _entries = OrderedDict()
+    _hits = 0
+    _miss = 0
+
+    @classmethod
+    def setup(cls, size: int) -> None:
+        cls._size = size
+        cls._entries = OrderedDict()
+        log.info(f"Up to {size} ids of posts are cached")
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls._size > 0
+
+    @classmethod
+    def put(cls, author_id: int, permlink: str, post_id: int, permlink_id: int, counter_deleted: int = 0) -> None:
+        """Remember ids of post created or edited by comment operation"""
+        if not cls.is_enabled():
+            return
+        key = (author_id, permlink)
+        cls._entries[key] = post_id | permlink_id << ID_BITS | counter_deleted << 2 * ID_BITS
+        cls._entries.move_to_end(key)
+        if len(cls._entries) > cls._size:
+            cls._entries.popitem(last=False)
+
+    @classmethod
+    def get(cls, author_id: Optional[int], permlink: str) -> Optional[Tuple[int, int, int]]:
+        """Returns (post_id, permlink_id, counter_deleted) of given post or None when it is not cached"""
+        key = (author_id, permlink)
+        packed = cls._entries.get(key)
+        if packed is None:
+            cls._miss += 1
+            return None
+        cls._hits += 1
+        cls._entries.move_to_end(key)
+        return packed & ID_MASK, packed >> ID_BITS & ID_MASK, packed >> 2 * ID_BITS
+
+    @classmethod
+    def get_by_name(cls, author: str, permlink: str) -> Optional[Tuple[int, int, int]]:
+        return cls.get(Accounts.get_id_noexept(author), permlink)
+
+    @classmethod
+    def get_post_id(cls, author: str, permlink: str) -> Optional[int]:
+        """Returns id of given post or None when it is not cached"""
+        ids = cls.get_by_name(author, permlink)
+        return ids[0] if ids else None
+
+    @classmethod
+    def invalidate(cls, author: str, permlink: str) -> None:
+        """Forget post which was deleted"""
+        cls._entries.pop((Accounts.get_id_noexept(author), permlink), None)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._entries.clear()
+
+    @classmethod
+    def broadcast(cls):
+        return [
+            BroadcastObject('post_ids_cache_hits', cls._hits, 'b'),
+            BroadcastObject('post_ids_cache_misses', cls._miss, 'b'),
+            BroadcastObject('post_ids_cache_entries', len(cls._entries), 'b'),
+        ]
+
+    @classmethod
+    def log_stats(cls) -> None:
+        total = cls._hits + cls._miss
+        ratio = 100.0 * cls._hits / total if total else 0.0
+        log.info(
+            f"Post ids cache: {len(cls._entries)} entries, {cls._hits} hits, {cls._miss} misses ({ratio:.2f}% hit ratio)"
+        )
@@ -7,28 +7,71 @@ from ujson import dumps, loads
 
 from hive.conf import SCHEMA_NAME
 from hive.db.adapter import Db
+from hive.db.bulk_loader import BulkLoader, StagingTable
+from hive.db.prepared_sql import PreparedSql
 from hive.db.db_state import DbState
 from hive.indexer.block import VirtualOperationType
 from hive.indexer.community import Community
 from hive.indexer.db_adapter_holder import DbAdapterHolder
+from hive.indexer.deferred_writes import DeferredWrites
 from hive.indexer.notify import Notify
 from hive.indexer.post_data_cache import PostDataCache
+from hive.indexer.post_ids_cache import PostIdsCache
 from hive.indexer.votes import Votes
-from hive.utils.misc import chunks
-from hive.utils.normalize import escape_characters, legacy_amount, safe_img_url, sbd_amount
+from hive.utils.normalize import legacy_amount, safe_img_url, sbd_amount
 
 log = logging.getLogger(__name__)
 DB = Db.instance()
 
+# single comment operation (the usual case in live sync) is processed with prepared statement
+PROCESS_POST_OPERATION_SQL = PreparedSql(
+    'process_hive_post_operation',
+    f"""
+    SELECT is_new_post, id, author_id, permlink_id, post_category, parent_id, community_id, is_valid, is_muted, depth
+    FROM {SCHEMA_NAME}.process_hive_post_operation((:author)::varchar, (:permlink)::varchar, (:parent_author)::varchar, (:parent_permlink)::varchar, (:date)::timestamp, (:community_support_start_block)::integer, (:block_num)::integer, (:tags)::VARCHAR[]);
+    """,
+)
+
+COMMENT_PAYOUT_STAGING = StagingTable(
+    'hive_comment_payout_staging',
+    [
+        ('post_id', 'INT'),
+        ('author', 'VARCHAR'),
+        ('permlink', 'VARCHAR'),
+        ('total_payout_value', 'VARCHAR'),
+        ('curator_payout_value', 'VARCHAR'),
+        ('author_rewards', 'BIGINT'),
+        ('author_rewards_hive', 'BIGINT'),
+        ('author_rewards_hbd', 'BIGINT'),
+        ('author_rewards_vests', 'BIGINT'),
+        ('payout', 'NUMERIC'),
+        ('pending_payout', 'NUMERIC'),
+        ('payout_at', 'TIMESTAMP'),
+        ('last_payout_at', 'TIMESTAMP'),
+        ('cashout_time', 'TIMESTAMP'),
+        ('is_paidout', 'BOOLEAN'),
+        ('total_vote_weight', 'NUMERIC'),
+    ],
+)
+
+COMMENT_OPTIONS_STAGING = StagingTable(
+    'hive_comment_options_staging',
+    [
+        ('post_id', 'INT'),
+        ('author', 'VARCHAR'),
+        ('permlink', 'VARCHAR'),
+        ('max_accepted_payout', 'VARCHAR'),
+        ('percent_hbd', 'INT'),
+        ('allow_votes', 'BOOLEAN'),
+        ('allow_curation_rewards', 'BOOLEAN'),
+        ('beneficiaries', 'TEXT'),
+    ],
+)
+
 
 class Posts(DbAdapterHolder):
     """Handles critical/core post ops and data."""
 
-    # LRU cache for (author-permlink -> id) lookup (~400mb per 1M entries)
-    CACHE_SIZE = 2000000
-    _hits = 0
-    _miss = 0
-
     comment_payout_ops = {}
     _comment_payout_ops = []
 
@@ -67,27 +110,55 @@ class Posts(DbAdapterHolder):
                 if tag and isinstance(tag, str):
                     tags.append(tag)  # No escaping needed due to used sqlalchemy formatting features
 
-        sql = f"""
-            SELECT is_new_post, id, author_id, permlink_id, post_category, parent_id, community_id, is_valid, is_muted, depth
-            FROM {SCHEMA_NAME}.process_hive_post_operation((:author)::varchar, (:permlink)::varchar, (:parent_author)::varchar, (:parent_permlink)::varchar, (:date)::timestamp, (:community_support_start_block)::integer, (:block_num)::integer, (:tags)::VARCHAR[]);
-            """
-
-        row = DB.query_row(
-            sql,
-            author=op['author'],
-            permlink=op['permlink'],
-            parent_author=op['parent_author'],
-            parent_permlink=op['parent_permlink'],
-            date=block_date,
-            community_support_start_block=Community.start_block,
-            block_num=op['block_num'],
-            tags=tags,
-        )
+        DeferredWrites.add(cls._apply_comment_ops, (op, block_date, md, tags))
+
+    @classmethod
+    def _apply_comment_ops(cls, pending):
+        """Process comment operations; more of them are processed together in one query."""
+        if len(pending) == 1:
+            op, block_date, md, tags = pending[0]
+            row = DB.query_row(
+                PROCESS_POST_OPERATION_SQL,
+                author=op['author'],
+                permlink=op['permlink'],
+                parent_author=op['parent_author'],
+                parent_permlink=op['parent_permlink'],
+                date=block_date,
+                community_support_start_block=Community.start_block,
+                block_num=op['block_num'],
+                tags=tags,
+            )
+            results = {0: dict(row)} if row else {}
+        else:
+            sql = f"""
+                SELECT op_idx, is_new_post, id, author_id, permlink_id, post_category, parent_id, community_id, is_valid, is_muted, depth
+                FROM {SCHEMA_NAME}.process_hive_post_operations((:operations)::jsonb, (:community_support_start_block)::integer);
+                """
+            operations = [
+                dict(
+                    author=op['author'],
+                    permlink=op['permlink'],
+                    parent_author=op['parent_author'],
+                    parent_permlink=op['parent_permlink'],
+                    date=str(block_date),
+                    block_num=op['block_num'],
+                    tags=tags,
+                )
+                for op, block_date, _, tags in pending
+            ]
+            rows = DB.query_all(sql, operations=dumps(operations), community_support_start_block=Community.start_block)
+            results = {row['op_idx']: dict(row) for row in rows}
+
+        for idx, (op, block_date, md, _) in enumerate(pending):
+            result = results.get(idx)
+            if result is None:
+                log.error(f"Failed to process comment_op: {op}")
+                continue
+            cls._process_comment_op_result(op, block_date, md, result)
 
-        if not row:
-            log.error(f"Failed to process comment_op: {op}")
-            return
-        result = dict(row)
+    @classmethod
+    def _process_comment_op_result(cls, op, block_date, md, result):
+        PostIdsCache.put(result['author_id'], op['permlink'], result['id'], result['permlink_id'])
 
         error = cls._verify_post_against_community(op, result['community_id'], result['is_valid'])
 
@@ -135,6 +206,7 @@ class Posts(DbAdapterHolder):
 
     @classmethod
     def flush_into_db(cls):
+        # posts found in PostIdsCache are updated by id, others are found by author and permlink
         sql = f"""
               UPDATE {SCHEMA_NAME}.hive_posts AS ihp SET
                   total_payout_value    = COALESCE( data_source.total_payout_value,                     ihp.total_payout_value ),
@@ -152,26 +224,8 @@ class Posts(DbAdapterHolder):
                   total_vote_weight     = COALESCE( CAST( data_source.total_vote_weight as NUMERIC ),   ihp.total_vote_weight )
               FROM
               (
-              SELECT  ha_a.id as author_id, hpd_p.id as permlink_id,
-                      t.total_payout_value,
-                      t.curator_payout_value,
-                      t.author_rewards,
-                      t.author_rewards_hive,
-                      t.author_rewards_hbd,
-                      t.author_rewards_vests,
-                      t.payout,
-                      t.pending_payout,
-                      t.payout_at,
-                      t.last_payout_at,
-                      t.cashout_time,
-                      t.is_paidout,
-                      t.total_vote_weight
-              from
-              (
-              VALUES
-                --- put all constant values here
-                {{}}
-              ) AS T(author, permlink,
+              WITH payouts AS MATERIALIZED (
+                  SELECT * FROM {{}} AS T(post_id, author, permlink,
                       total_payout_value,
                       curator_payout_value,
                       author_rewards,
@@ -185,31 +239,37 @@ class Posts(DbAdapterHolder):
                       cashout_time,
                       is_paidout,
                       total_vote_weight)
+              )
+              SELECT  t.post_id, t.total_payout_value, t.curator_payout_value, t.author_rewards, t.author_rewards_hive,
+                      t.author_rewards_hbd, t.author_rewards_vests, t.payout, t.pending_payout, t.payout_at, t.last_payout_at,
+                      t.cashout_time, t.is_paidout, t.total_vote_weight
+              FROM payouts t
+              WHERE t.post_id IS NOT NULL
+              UNION ALL
+              SELECT  hp.id as post_id, t.total_payout_value, t.curator_payout_value, t.author_rewards, t.author_rewards_hive,
+                      t.author_rewards_hbd, t.author_rewards_vests, t.payout, t.pending_payout, t.payout_at, t.last_payout_at,
+                      t.cashout_time, t.is_paidout, t.total_vote_weight
+              FROM payouts t
               INNER JOIN {SCHEMA_NAME}.hive_accounts ha_a ON ha_a.name = t.author
               INNER JOIN {SCHEMA_NAME}.hive_permlink_data hpd_p ON hpd_p.permlink = t.permlink
+              INNER JOIN {SCHEMA_NAME}.hive_posts hp ON hp.author_id = ha_a.id AND hp.permlink_id = hpd_p.id
+              WHERE t.post_id IS NULL
               ) as data_source
-              WHERE ihp.permlink_id = data_source.permlink_id and ihp.author_id = data_source.author_id
+              WHERE ihp.id = data_source.post_id
         """
 
-        for chunk in chunks(cls._comment_payout_ops, 1000):
-            cls.beginTx()
-
-            values_str = ','.join(chunk)
-            actual_query = sql.format(values_str)
-            cls.db.query_prepared(actual_query)
-
-            cls.commitTx()
+        cls.beginTx()
+        n = BulkLoader.write(cls.db, COMMENT_PAYOUT_STAGING, cls._comment_payout_ops, sql)
+        cls.commitTx()
 
-        n = len(cls._comment_payout_ops)
         cls._comment_payout_ops.clear()
         return n
 
     @classmethod
-    def comment_payout_op(cls):
-        values_limit = 1000
-
-        """ Process comment payment operations """
-        for k, v in cls.comment_payout_ops.items():
+    def comment_payout_op(cls, comment_payout_ops, post_ids=None):
+        """Process comment payment operations; post_ids - ids of posts found in PostIdsCache"""
+        post_ids = post_ids or {}
+        for k, v in comment_payout_ops.items():
             author = None
             permlink = None
 
@@ -289,29 +349,29 @@ class Posts(DbAdapterHolder):
                 pending_payout = sbd_amount(value['pending_payout'])
                 total_vote_weight = value['total_vote_weight']
 
+            post_id = post_ids.get(k)
             cls._comment_payout_ops.append(
-                "('{}', {}, {}, {}, {}, {}, {}, {}, {}, {}, {}, {}, {}, {}, {})".format(
-                    author,
-                    escape_characters(permlink),
-                    "NULL" if (total_payout_value is None) else ("'{}'".format(legacy_amount(total_payout_value))),
-                    "NULL" if (curator_payout_value is None) else ("'{}'".format(legacy_amount(curator_payout_value))),
+                (
+                    post_id,
+                    None if post_id else author,
+                    None if post_id else permlink,
+                    None if total_payout_value is None else legacy_amount(total_payout_value),
+                    None if curator_payout_value is None else legacy_amount(curator_payout_value),
                     author_rewards,
-                    "NULL" if (author_rewards_hive is None) else author_rewards_hive,
-                    "NULL" if (author_rewards_hbd is None) else author_rewards_hbd,
-                    "NULL" if (author_rewards_vests is None) else author_rewards_vests,
-                    "NULL" if (payout is None) else payout,
-                    "NULL" if (pending_payout is None) else pending_payout,
-                    "NULL" if (payout_at is None) else (f"'{payout_at}'::timestamp"),
-                    "NULL" if (last_payout_at is None) else (f"'{last_payout_at}'::timestamp"),
-                    "NULL" if (cashout_time is None) else (f"'{cashout_time}'::timestamp"),
-                    "NULL" if (is_paidout is None) else is_paidout,
-                    "NULL" if (total_vote_weight is None) else total_vote_weight,
+                    author_rewards_hive,
+                    author_rewards_hbd,
+                    author_rewards_vests,
+                    payout,
+                    pending_payout,
+                    payout_at,
+                    last_payout_at,
+                    cashout_time,
+                    is_paidout,
+                    total_vote_weight,
                 )
             )
 
-        n = len(cls.comment_payout_ops)
-        cls.comment_payout_ops.clear()
-        return n
+        return len(comment_payout_ops)
 
     @classmethod
     def update_child_count(cls, child_id, op='+'):
@@ -354,40 +414,72 @@ class Posts(DbAdapterHolder):
         for ex in extensions:
             if 'type' in ex and ex['type'] == 'comment_payout_beneficiaries' and 'beneficiaries' in ex['value']:
                 beneficiaries = ex['value']['beneficiaries']
+        options = (max_accepted_payout, percent_hbd, allow_votes, allow_curation_rewards, dumps(beneficiaries))
+        DeferredWrites.add(cls._apply_comment_options, (op['author'], op['permlink'], options))
+
+    @classmethod
+    def _apply_comment_options(cls, items):
+        """Update options of posts; only the last options of each post are written."""
+        options = {}
+        for author, permlink, values in items:
+            key = (author, permlink)
+            options.pop(key, None)
+            options[key] = values
+
+        rows = []
+        for (author, permlink), values in options.items():
+            # post might be created by comment operation processed just before, so ids are looked for now
+            post_id = PostIdsCache.get_post_id(author, permlink)
+            rows.append((post_id, None if post_id else author, None if post_id else permlink, *values))
+
+        # posts found in PostIdsCache are updated by id, others are found by author and permlink
         sql = f"""
-            UPDATE
-                {SCHEMA_NAME}.hive_posts hp
-            SET
-                max_accepted_payout = :max_accepted_payout,
-                percent_hbd = :percent_hbd,
-                allow_votes = :allow_votes,
-                allow_curation_rewards = :allow_curation_rewards,
-                beneficiaries = :beneficiaries
-            WHERE
-            hp.author_id = (SELECT id FROM {SCHEMA_NAME}.hive_accounts WHERE name = :author) AND
-            hp.permlink_id = (SELECT id FROM {SCHEMA_NAME}.hive_permlink_data WHERE permlink = :permlink)
+              UPDATE {SCHEMA_NAME}.hive_posts AS hp SET
+                  max_accepted_payout = data_source.max_accepted_payout,
+                  percent_hbd = data_source.percent_hbd,
+                  allow_votes = data_source.allow_votes,
+                  allow_curation_rewards = data_source.allow_curation_rewards,
+                  beneficiaries = data_source.beneficiaries::json
+              FROM
+              (
+              WITH options AS MATERIALIZED (
+                  SELECT * FROM {{}} AS T(post_id, author, permlink,
+                      max_accepted_payout, percent_hbd, allow_votes, allow_curation_rewards, beneficiaries)
+              )
+              SELECT t.post_id, t.max_accepted_payout, t.percent_hbd, t.allow_votes, t.allow_curation_rewards, t.beneficiaries
+              FROM options t
+              WHERE t.post_id IS NOT NULL
+              UNION ALL
+              SELECT hpo.id as post_id, t.max_accepted_payout, t.percent_hbd, t.allow_votes, t.allow_curation_rewards, t.beneficiaries
+              FROM options t
+              INNER JOIN {SCHEMA_NAME}.hive_accounts ha_a ON ha_a.name = t.author
+              INNER JOIN {SCHEMA_NAME}.hive_permlink_data hpd_p ON hpd_p.permlink = t.permlink
+              INNER JOIN {SCHEMA_NAME}.hive_posts hpo ON hpo.author_id = ha_a.id AND hpo.permlink_id = hpd_p.id
+              WHERE t.post_id IS NULL AND hpo.counter_deleted = 0
+              ) as data_source
+              WHERE hp.id = data_source.post_id
         """
-        DB.query(
-            sql,
-            author=op['author'],
-            permlink=op['permlink'],
-            max_accepted_payout=max_accepted_payout,
-            percent_hbd=percent_hbd,
-            allow_votes=allow_votes,
-            allow_curation_rewards=allow_curation_rewards,
-            beneficiaries=dumps(beneficiaries),
-        )
+        BulkLoader.write(DB, COMMENT_OPTIONS_STAGING, rows, sql)
 
     @classmethod
     def delete(cls, op, block_date):
         """Marks a post record as being deleted."""
-        sql = f"SELECT {SCHEMA_NAME}.delete_hive_post((:author)::varchar, (:permlink)::varchar, (:block_num)::int, (:date)::timestamp);"
-        DB.query_no_return(
-            sql, author=op['author'], permlink=op['permlink'], block_num=op['block_num'], date=block_date
-        )
+        # votes and reblogs looked for after delete must not get id of deleted post
+        PostIdsCache.invalidate(op['author'], op['permlink'])
         # all votes for that post that are still not pushed to DB have to be removed, since the same author/permlink
         # is now free to be taken by new post and we don't want those votes to match new post
         Votes.drop_votes_of_deleted_comment(op)
+        DeferredWrites.add(cls._apply_deletes, (op['author'], op['permlink'], op['block_num'], str(block_date)))
+
+    @classmethod
+    def _apply_deletes(cls, items):
+        """Mark posts as deleted, in order of delete operations."""
+        for author, permlink, _, _ in items:
+            # post might have been cached by comment operation processed just before
+            PostIdsCache.invalidate(author, permlink)
+        operations = [dict(author=author, permlink=permlink, block_num=num, date=date) for author, permlink, num, date in items]
+        sql = f"SELECT {SCHEMA_NAME}.delete_hive_posts((:operations)::jsonb);"
+        DB.query_no_return(sql, operations=dumps(operations))
 
     @classmethod
     def _verify_post_against_community(cls, op, community_id, is_valid):
@@ -425,6 +517,30 @@ class Posts(DbAdapterHolder):
 
         return new_body
 
+    @classmethod
+    def swap_buffers(cls):
+        """Detach collected payout operations, so they can be flushed while new ones are being collected"""
+        frozen = cls.comment_payout_ops
+        cls.comment_payout_ops = {}
+        # ids are resolved here, since the cache can be used only by the thread which processes blocks
+        post_ids = {}
+        for key in frozen:
+            post_id = PostIdsCache.get_post_id(*key.split('/'))
+            if post_id:
+                post_ids[key] = post_id
+        return frozen, post_ids
+
+    @classmethod
+    def is_post_pending(cls, frozen, author, permlink):
+        """Check if detached payout operations concern given post"""
+        return f"{author}/{permlink}" in frozen[0]
+
     @classmethod
     def flush(cls):
-        return cls.comment_payout_op() + cls.flush_into_db()
+        return cls.flush_buffers(cls.swap_buffers())
+
+    @classmethod
+    def flush_buffers(cls, frozen):
+        """Flush payout operations detached with swap_buffers to database"""
+        comment_payout_ops, post_ids = frozen
+        return cls.comment_payout_op(comment_payout_ops, post_ids) + cls.flush_into_db()
@@ -1,16 +1,35 @@
 """ Class for reblog operations """
 
 import logging
+from typing import Optional
+
+from ujson import dumps
 
 from hive.conf import SCHEMA_NAME
 from hive.db.adapter import Db
+from hive.db.bulk_loader import BulkLoader, StagingTable
 from hive.indexer.accounts import Accounts
 from hive.indexer.db_adapter_holder import DbAdapterHolder
-from hive.utils.normalize import escape_characters
+from hive.indexer.deferred_writes import DeferredWrites
+from hive.indexer.post_ids_cache import PostIdsCache
+from hive.utils.normalize import load_json_key
 
 log = logging.getLogger(__name__)
 DB = Db.instance()
 
+REBLOGS_STAGING = StagingTable(
+    'hive_reblogs_staging',
+    [
+        ('post_id', 'INT'),
+        ('blogger_id', 'INT'),
+        ('blogger', 'VARCHAR'),
+        ('author', 'VARCHAR'),
+        ('permlink', 'VARCHAR'),
+        ('block_date', 'TIMESTAMP'),
+        ('block_num', 'INT'),
+    ],
+)
+
 
 class Reblog(DbAdapterHolder):
     """Class for reblog operations"""
@@ -55,69 +74,110 @@ class Reblog(DbAdapterHolder):
                 del cls.reblog_items_to_flush[key]
             cls.delete(op['author'], op['permlink'], op['account'])
         else:
-            cls.reblog_items_to_flush[key] = {'op': op}
+            cls.reblog_items_to_flush[key] = {
+                'op': op,
+                'post_id': PostIdsCache.get_post_id(op['author'], op['permlink']),
+                'blogger_id': Accounts.get_id_noexept(op['account']),
+            }
 
     @classmethod
     def delete(cls, author, permlink, account):
         """Remove a reblog from hive_reblogs + feed from hive_feed_cache."""
-        sql = f"SELECT {SCHEMA_NAME}.delete_reblog_feed_cache( (:author)::VARCHAR, (:permlink)::VARCHAR, (:account)::VARCHAR );"
-        status = DB.query_col(sql, author=author, permlink=permlink, account=account)
-        assert status is not None
-        if status == 0:
-            log.debug("reblog: post not found: %s/%s", author, permlink)
+        # reblog detached from previous batch reached the database before the batch started, see `deleted_reblog_key`
+        DeferredWrites.add(cls._apply_deletes, (author, permlink, account))
+
+    @staticmethod
+    def deleted_reblog_key(op) -> Optional[str]:
+        """Key of reblog which given custom_json operation removes, checked before its batch of blocks is processed."""
+        if op['id'] not in ('follow', 'reblog') or 'delete' not in (op['json'] or ''):
+            return None
+        op_json = load_json_key(op, 'json')
+        if op['id'] == 'reblog' and isinstance(op_json, dict):
+            op_json = ['reblog', op_json]  # legacy compat, harmless for later blocks which only get drained needlessly
+        if not isinstance(op_json, list) or len(op_json) != 2 or op_json[0] != 'reblog':
+            return None
+        data = op_json[1]
+        if not isinstance(data, dict) or data.get('delete') != 'delete':
+            return None
+        return f"{data.get('author')}/{data.get('permlink')}/{data.get('account')}"
+
+    @classmethod
+    def _apply_deletes(cls, items):
+        """Remove reblogs, in order of reblog operations."""
+        operations = [dict(author=author, permlink=permlink, account=account) for author, permlink, account in items]
+        sql = f"SELECT op_idx, status FROM {SCHEMA_NAME}.delete_reblog_feed_caches((:operations)::jsonb);"
+        for op_idx, status in DB.query_all(sql, operations=dumps(operations)):
+            assert status is not None
+            if status == 0:
+                log.debug("reblog: post not found: %s/%s", *items[op_idx][:2])
+
+    @classmethod
+    def swap_buffers(cls):
+        """Detach collected reblogs, so they can be flushed while new ones are being collected"""
+        frozen = cls.reblog_items_to_flush
+        cls.reblog_items_to_flush = {}
+        return frozen
+
+    @classmethod
+    def is_post_pending(cls, frozen, author, permlink):
+        """Check if detached reblogs contain reblogs of given post"""
+        return any(item['op']['author'] == author and item['op']['permlink'] == permlink for item in frozen.values())
 
     @classmethod
     def flush(cls):
         """Flush collected data to database"""
-        sql_prefix = f"""
+        return cls.flush_buffers(cls.swap_buffers())
+
+    @classmethod
+    def flush_buffers(cls, frozen):
+        """Flush reblogs detached with swap_buffers to database"""
+        # reblogs of posts found in PostIdsCache are inserted by ids, others are resolved by names
+        sql = f"""
+            WITH reblogs AS MATERIALIZED (
+                SELECT * FROM {{}} AS T(post_id, blogger_id, blogger, author, permlink, block_date, block_num)
+            )
             INSERT INTO {SCHEMA_NAME}.hive_reblogs (blogger_id, post_id, created_at, block_num)
             SELECT 
                 data_source.blogger_id, data_source.post_id, data_source.created_at, data_source.block_num
             FROM
             (
+                SELECT 
+                    t.blogger_id, hp.id as post_id, t.block_date as created_at, t.block_num 
+                FROM reblogs t
+                    INNER JOIN {SCHEMA_NAME}.hive_posts hp ON hp.id = t.post_id AND hp.counter_deleted = 0
+                WHERE t.post_id IS NOT NULL
+                UNION ALL
                 SELECT 
                     ha_b.id as blogger_id, hp.id as post_id, t.block_date as created_at, t.block_num 
-                FROM
-                    (VALUES
-                        {{}}
-                    ) AS T(blogger, author, permlink, block_date, block_num)
+                FROM reblogs t
                     INNER JOIN {SCHEMA_NAME}.hive_accounts ha ON ha.name = t.author
                     INNER JOIN {SCHEMA_NAME}.hive_accounts ha_b ON ha_b.name = t.blogger
                     INNER JOIN {SCHEMA_NAME}.hive_permlink_data hpd ON hpd.permlink = t.permlink
                     INNER JOIN {SCHEMA_NAME}.hive_posts hp ON hp.author_id = ha.id AND hp.permlink_id = hpd.id AND hp.counter_deleted = 0
+                WHERE t.post_id IS NULL
             ) AS data_source (blogger_id, post_id, created_at, block_num)
             ON CONFLICT ON CONSTRAINT hive_reblogs_ux1 DO NOTHING
         """
 
-        item_count = len(cls.reblog_items_to_flush)
+        item_count = len(frozen)
         if item_count > 0:
-            values = []
-            limit = 1000
-            count = 0
             cls.beginTx()
-            for k, v in cls.reblog_items_to_flush.items():
-                reblog_item = v['op']
-                if count < limit:
-                    values.append(
-                        f"({escape_characters(reblog_item['account'])}, {escape_characters(reblog_item['author'])}, {escape_characters(reblog_item['permlink'])}, '{reblog_item['block_date']}'::timestamp, {reblog_item['block_num']})"
+            rows = []
+            for reblog_item in frozen.values():
+                op = reblog_item['op']
+                by_ids = reblog_item['post_id'] is not None and reblog_item['blogger_id'] is not None
+                rows.append(
+                    (
+                        reblog_item['post_id'] if by_ids else None,
+                        reblog_item['blogger_id'] if by_ids else None,
+                        None if by_ids else op['account'],
+                        None if by_ids else op['author'],
+                        None if by_ids else op['permlink'],
+                        op['block_date'],
+                        op['block_num'],
                     )
-                    count = count + 1
-                else:
-                    values_str = ",".join(values)
-                    query = sql_prefix.format(values_str, values_str)
-                    cls.db.query_prepared(query)
-                    values.clear()
-                    values.append(
-                        f"({escape_characters(reblog_item['account'])}, {escape_characters(reblog_item['author'])}, {escape_characters(reblog_item['permlink'])}, '{reblog_item['block_date']}'::timestamp, {reblog_item['block_num']})"
-                    )
-                    count = 1
-
-            if len(values) > 0:
-                values_str = ",".join(values)
-                query = sql_prefix.format(values_str, values_str)
-                cls.db.query_prepared(query)
-                values.clear()
+                )
+            BulkLoader.write(cls.db, REBLOGS_STAGING, rows, sql)
             cls.commitTx()
-            cls.reblog_items_to_flush.clear()
 
         return item_count
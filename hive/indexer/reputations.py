@@ -1,15 +1,182 @@
 """ Reputation update support """
 
+from array import array
 import logging
+from typing import List, Tuple
 
 from hive.conf import SCHEMA_NAME
+from hive.db.bulk_loader import BulkLoader, StagingTable
+from hive.indexer.accounts import Accounts
 from hive.indexer.db_adapter_holder import DbAdapterHolder
-from hive.utils.normalize import escape_characters
 
 log = logging.getLogger(__name__)
 
 CACHED_ITEMS_LIMIT = 200
 
+REPUTATION_DATA_STAGING = StagingTable(
+    'hive_reputation_data_staging',
+    [
+        ('author', 'VARCHAR'),
+        ('voter', 'VARCHAR'),
+        ('permlink', 'VARCHAR'),
+        ('rshares', 'BIGINT'),
+        ('block_num', 'INT'),
+    ],
+)
+
+ACCOUNT_REPUTATIONS_STAGING = StagingTable(
+    'hive_account_reputations_staging',
+    [
+        ('id', 'INT'),
+        ('reputation', 'BIGINT'),
+        ('is_implicit', 'BOOLEAN'),
+    ],
+)
+
+# votes can't be changed once post is paid out, so rshares of older votes are not needed to correct reputation;
+# previous rshares are kept in two generations of that many blocks (30 days, as in `update_account_reputations`)
+PREV_RSHARES_GENERATION_BLOCKS = 30 * 24 * 1200
+
+
+class ReputationEngine:
+    """Account reputations calculated in memory from effective votes during massive sync.
+
+    Follows `calculate_account_reputations`: reputations and implicit flags are kept in arrays indexed by
+    account id and rshares of previous vote of the voter on the same post in a hash, so changed reputations
+    are written once, without going through `hive_reputation_data` again.
+    """
+
+    _running = False
+    _first_block = 0
+    _reputations = array('q')
+    _implicit = bytearray()
+    _changed = set()
+    _prev_rshares = {}
+    _old_prev_rshares = {}
+    _generation_start = 0
+    _skipped = 0
+    check = False
+
+    @classmethod
+    def start(cls, db, first_block: int, check: bool = False) -> None:
+        """Loads reputations of accounts and rshares of votes still kept in `hive_reputation_data`."""
+        cls._reputations = array('q')
+        cls._implicit = bytearray()
+        for row in db.query_all(f"SELECT id, reputation, is_implicit FROM {SCHEMA_NAME}.hive_accounts ORDER BY id"):
+            cls._ensure(row['id'])
+            cls._reputations[row['id']] = row['reputation']
+            cls._implicit[row['id']] = row['is_implicit']
+
+        sql = f"""
+            SELECT DISTINCT ON (author_id, voter_id, permlink) author_id, voter_id, permlink, rshares
+            FROM {SCHEMA_NAME}.hive_reputation_data
+            ORDER BY author_id, voter_id, permlink, id DESC
+        """
+        cls._prev_rshares = {(row[0], row[1], row[2]): row[3] for row in db.query_all(sql)}
+        cls._old_prev_rshares = {}
+        cls._generation_start = first_block
+        cls._changed = set()
+        cls._skipped = 0
+        cls._first_block = first_block
+        cls.check = check
+        cls._running = True
+        log.info(
+            f"Reputation engine started at block {first_block} with {len(cls._reputations)} accounts "
+            f"and {len(cls._prev_rshares)} previous votes"
+        )
+
+    @classmethod
+    def stop(cls) -> None:
+        """Stop calculating reputations and release memory of the engine."""
+        cls._running = False
+        cls._reputations = array('q')
+        cls._implicit = bytearray()
+        cls._changed = set()
+        cls._prev_rshares = {}
+        cls._old_prev_rshares = {}
+
+    @classmethod
+    def is_running(cls) -> bool:
+        """Check if engine calculates reputations of processed votes."""
+        return cls._running
+
+    @classmethod
+    def covers(cls, first_block: int) -> bool:
+        """Check if engine processed all votes since given block."""
+        return cls._running and cls._first_block <= first_block
+
+    @classmethod
+    def _ensure(cls, account_id: int) -> None:
+        missing = account_id + 1 - len(cls._reputations)
+        if missing > 0:
+            cls._reputations.extend([0] * missing)
+            cls._implicit.extend(b'\x01' * missing)
+
+    @classmethod
+    def process_vote(cls, block_num: int, author: str, voter: str, permlink: str, rshares: int) -> None:
+        """Apply effective vote to reputation of its author."""
+        author_id = Accounts.get_id_noexept(author)
+        voter_id = Accounts.get_id_noexept(voter)
+        if author_id is None or voter_id is None:
+            cls._skipped += 1
+            return
+
+        if block_num - cls._generation_start >= PREV_RSHARES_GENERATION_BLOCKS:
+            cls._old_prev_rshares = cls._prev_rshares
+            cls._prev_rshares = {}
+            cls._generation_start = block_num
+
+        key = (author_id, voter_id, permlink)
+        prev_rshares = cls._prev_rshares.get(key)
+        if prev_rshares is None:
+            prev_rshares = cls._old_prev_rshares.get(key, 0)
+        cls._prev_rshares[key] = rshares
+
+        cls._ensure(max(author_id, voter_id))
+        reputations = cls._reputations
+        implicit = cls._implicit
+
+        if reputations[voter_id] < 0:
+            return
+
+        author_rep = reputations[author_id]
+        prev_rep_delta = prev_rshares >> 6
+        if not implicit[author_id] and (
+            prev_rshares > 0
+            or (prev_rshares < 0 and not implicit[voter_id] and reputations[voter_id] > author_rep - prev_rep_delta)
+        ):
+            author_rep -= prev_rep_delta
+            reputations[author_id] = author_rep
+            implicit[author_id] = author_rep == 0
+            cls._changed.add(author_id)
+
+        # voter's reputation is read again, since it changed above when voting on own post
+        if rshares > 0 or (rshares < 0 and not implicit[voter_id] and reputations[voter_id] > author_rep):
+            reputations[author_id] = author_rep + (rshares >> 6)
+            implicit[author_id] = False
+            cls._changed.add(author_id)
+
+    @classmethod
+    def changed_reputations(cls) -> List[Tuple[int, int, bool]]:
+        """Reputations of accounts changed by processed votes, as (id, reputation, is_implicit)."""
+        return [
+            (account_id, cls._reputations[account_id], bool(cls._implicit[account_id]))
+            for account_id in sorted(cls._changed)
+        ]
+
+    @classmethod
+    def write_changed(cls, db) -> int:
+        """Writes changed reputations to `hive_accounts`; returns number of accounts written."""
+        if cls._skipped:
+            log.warning(f"Reputation engine skipped {cls._skipped} votes of unknown accounts")
+        sql = f"""
+            UPDATE {SCHEMA_NAME}.hive_accounts ha
+            SET reputation = t.reputation, is_implicit = t.is_implicit
+            FROM {{}} AS t(id, reputation, is_implicit)
+            WHERE ha.id = t.id AND (ha.reputation != t.reputation OR ha.is_implicit != t.is_implicit)
+        """
+        return BulkLoader.write(db, ACCOUNT_REPUTATIONS_STAGING, cls.changed_reputations(), sql)
+
 
 class Reputations(DbAdapterHolder):
     _values = []
@@ -17,12 +184,38 @@ class Reputations(DbAdapterHolder):
 
     @classmethod
     def process_vote(self, block_num, effective_vote_op):
-        tuple = f"('{effective_vote_op['author']}', '{effective_vote_op['voter']}', {escape_characters(effective_vote_op['permlink'])}, {effective_vote_op['rshares']}, {block_num})"
-        self._values.append(tuple)
+        if ReputationEngine.is_running():
+            ReputationEngine.process_vote(
+                block_num,
+                effective_vote_op['author'],
+                effective_vote_op['voter'],
+                effective_vote_op['permlink'],
+                effective_vote_op['rshares'],
+            )
+        self._values.append(
+            (
+                effective_vote_op['author'],
+                effective_vote_op['voter'],
+                effective_vote_op['permlink'],
+                effective_vote_op['rshares'],
+                block_num,
+            )
+        )
+
+    @classmethod
+    def swap_buffers(self):
+        """Detach collected votes, so they can be flushed while new ones are being collected"""
+        frozen = self._values
+        self._values = []
+        return frozen
 
     @classmethod
     def flush(self):
-        if not self._values:
+        return self.flush_buffers(self.swap_buffers())
+
+    @classmethod
+    def flush_buffers(self, frozen):
+        if not frozen:
             log.info(f"Written total reputation data records: {self._total_values}")
             return 0
 
@@ -33,35 +226,13 @@ class Reputations(DbAdapterHolder):
               SELECT (SELECT ha_v.id FROM {SCHEMA_NAME}.hive_accounts ha_v WHERE ha_v.name = t.voter) as voter_id,
                      (SELECT ha.id FROM {SCHEMA_NAME}.hive_accounts ha WHERE ha.name = t.author) as author_id,
                      t.permlink as permlink, t.rshares, t.block_num
-              FROM
-              (
-              VALUES
-                -- author, voter, permlink, rshares, block_num
-                {{}}
-              ) AS T(author, voter, permlink, rshares, block_num)
+              FROM {{}} AS T(author, voter, permlink, rshares, block_num)
               """
 
         self.beginTx()
-
-        begin = 0
-        end = 0
-        value_limit = 1000
-        size = len(self._values)
-        while begin < size:
-            end = begin + value_limit
-            if end > size:
-                end = size
-
-            param = ",".join(self._values[begin:end])
-            query = sql.format(param)
-            self.db.query_no_return(query)
-            begin = end
-
+        n = BulkLoader.write(self.db, REPUTATION_DATA_STAGING, frozen, sql)
         self.commitTx()
 
-        n = len(self._values)
-        self._values.clear()
-
         self._total_values = self._total_values + n
 
         log.info(f"Written total reputation data records: {self._total_values}")
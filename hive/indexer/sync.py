@@ -9,7 +9,9 @@ from typing import Iterable, Tuple
 
 from hive.conf import Conf, SCHEMA_NAME
 from hive.db.adapter import Db
-from hive.db.db_state import DbState
+from hive.db.bulk_loader import BulkLoader
+from hive.db.connection_pool import ConnectionPool, IDLE_NAME
+from hive.db.db_state import DbState, parse_partition_retention
 from hive.indexer.accounts import Accounts
 from hive.indexer.block import BlocksProviderBase
 from hive.indexer.blocks import Blocks
@@ -17,6 +19,9 @@ from hive.indexer.community import Community
 from hive.indexer.db_adapter_holder import DbLiveContextHolder
 from hive.indexer.hive_db.haf_functions import context_attach, context_detach
 from hive.indexer.hive_db.massive_blocks_data_provider import MassiveBlocksDataProviderHiveDb
+from hive.indexer.hive_db.new_block_waiter import NewBlockWaiter
+from hive.indexer.post_ids_cache import PostIdsCache
+from hive.indexer.reputations import ReputationEngine
 from hive.server.common.payout_stats import PayoutStats
 from hive.signals import (
     can_continue_thread,
@@ -50,6 +55,7 @@ class SyncHiveDb:
         self._lbound = None
         self._ubound = None
         self._databases = None
+        self._new_block_waiter = None
 
     def __enter__(self):
         if self._enter_sync:
@@ -58,9 +64,18 @@ class SyncHiveDb:
         set_custom_signal_handlers()
 
         Blocks.setup(conf=self._conf)
+        BulkLoader.setup(use_copy=self._conf.get('flush_with_copy'))
+        ConnectionPool.setup(self._db, max_idle=self._conf.get('db_pool_size'))
 
         Community.start_block = self._conf.get("community_start_block")
-        DbState.initialize(self._enter_sync, self._upgrade_schema)
+        DbState.initialize(
+            self._enter_sync,
+            self._upgrade_schema,
+            partitioned_tables=self._conf.get('partitioned_tables'),
+            partition_retention=parse_partition_retention(self._conf.get('partition_retention')),
+            retired_partitions=self._conf.get('retired_partitions'),
+            maintenance_memory=self._conf.get('maintenance_memory'),
+        )
 
         self._show_info(self._db)
 
@@ -89,6 +104,11 @@ class SyncHiveDb:
         if self._databases:
             self._databases.close()
 
+        if self._new_block_waiter:
+            self._new_block_waiter.close()
+
+        ConnectionPool.close()
+
     def build_database_schema(self) -> None:
         # whole code building it is already placed inside __enter__ handler, here was added only explicit messaging
         log.info("Attempting to build Hivemind database schema if needed")
@@ -100,6 +120,9 @@ class SyncHiveDb:
 
         log.info(f"Using HAF database as block data provider, pointed by url: '{self._conf.get('database_url')}'")
 
+        # tables of blocks committed in live sync could be still updated in parallel when it was broken
+        Blocks.finish_interrupted_live_blocks()
+
         if not Blocks.is_consistency():
             # here we are sure that massive sync was broken, because in live sync
             # only fully processed blocks are committed, and broken live is always consistent
@@ -113,13 +136,15 @@ class SyncHiveDb:
                 DbState._after_massive_sync(current_imported_block=Blocks.last_imported())
                 assert Blocks.is_consistency()
 
+        self._new_block_waiter = NewBlockWaiter(
+            self._db, self._conf.get('live_wait_channel'), self._conf.get('live_wait_max_interval')
+        )
+
         while True:
             if not can_continue_thread():
                 restore_default_signal_handlers()
                 return
 
-            active_connections_before = self._get_active_db_connections()
-
             last_imported_block = Blocks.last_imported()
             log.info(f"Last imported block is: {last_imported_block}")
 
@@ -136,8 +161,13 @@ class SyncHiveDb:
 
             if not (self._lbound and self._ubound):
                 self._db.query("COMMIT")
+                # no new block yet, wait for one (or for a notification about it) instead of querying in a busy loop
+                WSM.wait_stat('live_sync_new_block', self._new_block_waiter.wait())
                 continue
 
+            self._new_block_waiter.reset()
+            active_connections_before = self._get_active_db_connections()
+
             log.info(f"target_head_block: {self._ubound}")
             log.info(f"test_max_block: {self._last_block_to_process}")
 
@@ -150,16 +180,22 @@ class SyncHiveDb:
                 context_detach(db=self._db)
                 self._db.query("COMMIT")  # in massive we re not operating in same transaction as app_next_block query
 
+                DbState.prepare_partitions(self._lbound, self._ubound)
+
                 DbLiveContextHolder.set_live_context(False)
                 Blocks.setup_own_db_access(shared_db_adapter=self._db)
                 self._massive_blocks_data_provider = MassiveBlocksDataProviderHiveDb(
                     conf=self._conf,
-                    databases=MassiveBlocksDataProviderHiveDb.Databases(db_root=self._db),
+                    databases=MassiveBlocksDataProviderHiveDb.Databases(
+                        db_root=self._db, number_of_operations_fetchers=self._conf.get('operations_fetchers')
+                    ),
                 )
 
                 self._massive_blocks_data_provider.update_sync_block_range(self._lbound, self._ubound)
 
                 DbState.before_massive_sync(self._lbound, self._ubound)
+                if self._conf.get('in_memory_reputations'):
+                    ReputationEngine.start(self._db, self._lbound, check=self._conf.get('check_reputations'))
 
                 log.info(f"[MASSIVE] Attempting to process block range: <{self._lbound}:{self._ubound}>")
                 self._catchup_irreversible_block(is_massive_sync=True)
@@ -190,6 +226,14 @@ class SyncHiveDb:
                         f"[SINGLE] Switched to single block processing mode after: {secs_to_str(perf() - start_time)}"
                     )
 
+                # when behind by a few blocks, up to `live_batch_size` of them are processed in one transaction
+                last_block = min(self._ubound, self._lbound + max(1, self._conf.get('live_batch_size')) - 1)
+                is_batch = last_block > self._lbound
+                if is_batch:
+                    # HAF moves current block of the context past processed ones only while it is detached
+                    context_detach(db=self._db)
+
+                DbState.prepare_partitions(self._lbound, last_block)
                 DbLiveContextHolder.set_live_context(True)
                 Blocks.setup_own_db_access(shared_db_adapter=self._db)
                 self._massive_blocks_data_provider = MassiveBlocksDataProviderHiveDb(
@@ -197,18 +241,41 @@ class SyncHiveDb:
                     databases=MassiveBlocksDataProviderHiveDb.Databases(db_root=self._db, shared=True),
                 )
 
-                self._massive_blocks_data_provider.update_sync_block_range(self._lbound, self._lbound)
+                self._massive_blocks_data_provider.update_sync_block_range(self._lbound, last_block)
 
-                log.info(f"[SINGLE] Attempting to process first block in range: <{self._lbound}:{self._ubound}>")
+                log.info(f"[SINGLE] Attempting to process blocks <{self._lbound}:{last_block}> of range: <{self._lbound}:{self._ubound}>")
+                batch_start = perf()
                 self._massive_blocks_data_provider.start_without_threading()
-                blocks = self._massive_blocks_data_provider.get(number_of_blocks=1)
+                blocks = self._massive_blocks_data_provider.get(number_of_blocks=last_block - self._lbound + 1)
                 if not can_continue_thread():
                     self._db.query_no_return("ROLLBACK")
                 else:
-                    Blocks.process_multi(blocks, is_massive_sync=False)
+                    Blocks.process_multi(blocks, is_massive_sync=False, advance_context=is_batch)
+                    self._broadcast_live_stats(len(blocks), perf() - batch_start)
+                    WSM.log_current("Waiting times")
+                WSM.next_blocks()
+
+                if is_batch:
+                    context_attach(db=self._db)
+
+                # connections of steps run in parallel may still be closing
+                self._wait_for_connections_closed(active_connections_before)
 
-                active_connections_after_live = self._get_active_db_connections()
-                self._assert_connections_closed(active_connections_before, active_connections_after_live)
+    @staticmethod
+    def _broadcast_live_stats(number_of_blocks: int, processing_time: float) -> None:
+        if not number_of_blocks:
+            return
+        log.info(
+            f"[SINGLE] {number_of_blocks} blocks processed in {processing_time:.4f}s, "
+            f"{processing_time / number_of_blocks:.4f}s per block"
+        )
+        PC.broadcast(
+            [
+                BroadcastObject('live_sync_batch_size', number_of_blocks, 'blocks'),
+                BroadcastObject('live_sync_block_time', processing_time / number_of_blocks, 's'),
+                BroadcastObject('live_sync_blocks_per_second', number_of_blocks / processing_time if processing_time else 0, 'b'),
+            ]
+        )
 
     def _query_for_app_next_block(self) -> Tuple[int, int]:
         log.info("Querying for next block for app context...")
@@ -285,6 +352,7 @@ class SyncHiveDb:
             wtm = WSM.log_global("Total waiting times")
             ftm = FSM.log_global("Total flush times")
             otm = OPSM.log_global("All operations present in the processed blocks")
+            PostIdsCache.log_stats()
             ttm = ftm + otm + wtm
             log.info("Elapsed time: %.4fs. Calculated elapsed time: %.4fs. Difference: %.4fs", stop, ttm, stop - ttm)
             if rate:
@@ -344,14 +412,21 @@ class SyncHiveDb:
 
                 lbound = to
                 PC.broadcast(BroadcastObject('sync_current_block', lbound, 'blocks'))
+                PC.broadcast(PostIdsCache.broadcast())
 
                 num = num + 1
 
                 if not can_continue_thread():
                     break
+
+            Blocks.finish_background_flush()
         except Exception:
             log.exception("Exception caught during processing blocks...")
             set_exception_thrown()
+            try:
+                Blocks.finish_background_flush()
+            except Exception:
+                log.exception("Exception caught during background flush...")
             print_summary()
             raise
 
@@ -378,8 +453,9 @@ class SyncHiveDb:
                 raise block_data_provider_exception
 
     def _get_active_db_connections(self):
-        sql = "SELECT application_name FROM pg_stat_activity WHERE application_name LIKE 'hivemind_%';"
-        active_connections = self._db.query_all(sql)
+        # idle connections kept in the pool are not in use
+        sql = "SELECT application_name FROM pg_stat_activity WHERE application_name LIKE 'hivemind_%' AND application_name <> :idle_name;"
+        active_connections = self._db.query_all(sql, idle_name=f'hivemind_{IDLE_NAME}')
         return active_connections
 
     @staticmethod
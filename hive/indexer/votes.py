@@ -4,11 +4,32 @@ import collections
 import logging
 
 from hive.conf import SCHEMA_NAME
+from hive.db.bulk_loader import BulkLoader, StagingTable
+from hive.indexer.accounts import Accounts
 from hive.indexer.db_adapter_holder import DbAdapterHolder
-from hive.utils.normalize import escape_characters
+from hive.indexer.post_ids_cache import PostIdsCache
 
 log = logging.getLogger(__name__)
 
+VOTES_STAGING = StagingTable(
+    'hive_votes_staging',
+    [
+        ('order_id', 'INT'),
+        ('post_id', 'INT'),
+        ('voter_id', 'INT'),
+        ('voter', 'VARCHAR'),
+        ('author', 'VARCHAR'),
+        ('permlink', 'VARCHAR'),
+        ('weight', 'NUMERIC'),
+        ('rshares', 'BIGINT'),
+        ('vote_percent', 'INT'),
+        ('last_update', 'TIMESTAMP'),
+        ('num_changes', 'INT'),
+        ('block_num', 'INT'),
+        ('is_effective', 'BOOLEAN'),
+    ],
+)
+
 
 class Votes(DbAdapterHolder):
     """Class for managing posts votes"""
@@ -44,9 +65,11 @@ class Votes(DbAdapterHolder):
                 cls._votes_per_post[post_key] = []
             cls._votes_per_post[post_key].append(voter)
             cls._votes_data[key] = dict(
+                post_id=PostIdsCache.get_post_id(author, permlink),
+                voter_id=Accounts.get_id_noexept(voter),
                 voter=voter,
                 author=author,
-                permlink=escape_characters(permlink),
+                permlink=permlink,
                 vote_percent=weight,
                 weight=0,
                 rshares=0,
@@ -90,9 +113,11 @@ class Votes(DbAdapterHolder):
                 cls._votes_per_post[post_key] = []
             cls._votes_per_post[post_key].append(vop['voter'])
             cls._votes_data[key] = dict(
+                post_id=PostIdsCache.get_post_id(vop["author"], vop["permlink"]),
+                voter_id=Accounts.get_id_noexept(vop["voter"]),
                 voter=vop["voter"],
                 author=vop["author"],
-                permlink=escape_characters(vop["permlink"]),
+                permlink=vop["permlink"],
                 vote_percent=0,
                 weight=vop["weight"],
                 rshares=vop["rshares"],
@@ -102,33 +127,65 @@ class Votes(DbAdapterHolder):
                 block_num=vop["block_num"],
             )
 
+    @classmethod
+    def swap_buffers(cls):
+        """Detach collected votes, so they can be flushed while new ones are being collected"""
+        frozen = (cls._votes_data, cls._votes_per_post)
+        cls._votes_data = collections.OrderedDict()
+        cls._votes_per_post = {}
+        return frozen
+
+    @classmethod
+    def is_post_pending(cls, frozen, author, permlink):
+        """Check if detached votes contain votes for given post"""
+        return f"{author}/{permlink}" in frozen[1]
+
     @classmethod
     def flush(cls):
         """Flush vote data from cache to database"""
 
         cls.inside_flush = True
+        n = cls.flush_buffers(cls.swap_buffers())
+        cls.inside_flush = False
+
+        return n
+
+    @classmethod
+    def flush_buffers(cls, frozen):
+        """Flush votes detached with swap_buffers to database"""
+        votes_data, _ = frozen
         n = 0
-        if cls._votes_data:
+        if votes_data:
             cls.beginTx()
 
+            # votes for posts found in PostIdsCache are inserted by ids, others are resolved by names
             sql = f"""
+                WITH votes AS MATERIALIZED (
+                    SELECT * FROM {{}} AS T(order_id, post_id, voter_id, voter, author, permlink, weight, rshares, vote_percent, last_update, num_changes, block_num, is_effective)
+                )
                 INSERT INTO {SCHEMA_NAME}.hive_votes
                 (post_id, voter_id, author_id, permlink_id, weight, rshares, vote_percent, last_update, num_changes, block_num, is_effective)
 
-                SELECT hp.id as post_id, ha_v.id as voter_id, ha_a.id as author_id, hpd_p.id as permlink_id,
-                t.weight, t.rshares, t.vote_percent, t.last_update, t.num_changes, t.block_num, t.is_effective
+                SELECT data_source.post_id, data_source.voter_id, data_source.author_id, data_source.permlink_id,
+                data_source.weight, data_source.rshares, data_source.vote_percent, data_source.last_update, data_source.num_changes, data_source.block_num, data_source.is_effective
                 FROM
                 (
-                VALUES
-                  -- order_id, voter, author, permlink, weight, rshares, vote_percent, last_update, num_changes, block_num, is_effective
-                  {{}}
-                ) AS T(order_id, voter, author, permlink, weight, rshares, vote_percent, last_update, num_changes, block_num, is_effective)
-                INNER JOIN {SCHEMA_NAME}.hive_accounts ha_v ON ha_v.name = t.voter
-                INNER JOIN {SCHEMA_NAME}.hive_accounts ha_a ON ha_a.name = t.author
-                INNER JOIN {SCHEMA_NAME}.hive_permlink_data hpd_p ON hpd_p.permlink = t.permlink
-                INNER JOIN {SCHEMA_NAME}.hive_posts hp ON hp.author_id = ha_a.id AND hp.permlink_id = hpd_p.id
-                WHERE hp.counter_deleted = 0
-                ORDER BY t.order_id
+                    SELECT t.order_id, hp.id as post_id, t.voter_id, hp.author_id, hp.permlink_id,
+                    t.weight, t.rshares, t.vote_percent, t.last_update, t.num_changes, t.block_num, t.is_effective
+                    FROM votes t
+                    INNER JOIN {SCHEMA_NAME}.hive_posts hp ON hp.id = t.post_id
+                    WHERE t.post_id IS NOT NULL AND hp.counter_deleted = 0
+                    UNION ALL
+                    SELECT t.order_id, hp.id as post_id, ha_v.id as voter_id, ha_a.id as author_id, hpd_p.id as permlink_id,
+                    t.weight, t.rshares, t.vote_percent, t.last_update, t.num_changes, t.block_num, t.is_effective
+                    FROM votes t
+                    INNER JOIN {SCHEMA_NAME}.hive_accounts ha_v ON ha_v.name = t.voter
+                    INNER JOIN {SCHEMA_NAME}.hive_accounts ha_a ON ha_a.name = t.author
+                    INNER JOIN {SCHEMA_NAME}.hive_permlink_data hpd_p ON hpd_p.permlink = t.permlink
+                    INNER JOIN {SCHEMA_NAME}.hive_posts hp ON hp.author_id = ha_a.id AND hp.permlink_id = hpd_p.id
+                    WHERE t.post_id IS NULL AND hp.counter_deleted = 0
+                ) AS data_source
+                ORDER BY data_source.order_id
                 ON CONFLICT ON CONSTRAINT hive_votes_voter_id_author_id_permlink_id_uk DO
                 UPDATE
                   SET
@@ -142,16 +199,17 @@ class Votes(DbAdapterHolder):
                 """
             # WHERE clause above seems superfluous (and works all the same without it, at least up to 5mln)
 
-            values = []
-            values_limit = 1000
-
-            for _, vd in cls._votes_data.items():
-                values.append(
-                    "({}, '{}', '{}', {}, {}, {}, {}, '{}'::timestamp, {}, {}, {})".format(
-                        len(values),  # for ordering
-                        vd['voter'],
-                        vd['author'],
-                        vd['permlink'],
+            rows = []
+            for order_id, vd in enumerate(votes_data.values()):  # order_id for ordering
+                by_ids = vd['post_id'] is not None and vd['voter_id'] is not None
+                rows.append(
+                    (
+                        order_id,
+                        vd['post_id'] if by_ids else None,
+                        vd['voter_id'] if by_ids else None,
+                        None if by_ids else vd['voter'],
+                        None if by_ids else vd['author'],
+                        None if by_ids else vd['permlink'],
                         vd['weight'],
                         vd['rshares'],
                         vd['vote_percent'],
@@ -161,24 +219,8 @@ class Votes(DbAdapterHolder):
                         vd['is_effective'],
                     )
                 )
+            n = BulkLoader.write(cls.db, VOTES_STAGING, rows, sql)
 
-                if len(values) >= values_limit:
-                    values_str = ','.join(values)
-                    actual_query = sql.format(values_str)
-                    cls.db.query_prepared(actual_query)
-                    values.clear()
-
-            if len(values) > 0:
-                values_str = ','.join(values)
-                actual_query = sql.format(values_str)
-                cls.db.query_prepared(actual_query)
-                values.clear()
-
-            n = len(cls._votes_data)
-            cls._votes_data.clear()
-            cls._votes_per_post.clear()
             cls.commitTx()
 
-        cls.inside_flush = False
-
         return n
@@ -1,4 +1,6 @@
 """Bridge API public endpoints for posts"""
+import asyncio
+
 from hive.conf import SCHEMA_NAME
 from hive.server.bridge_api.objects import _bridge_post_object, append_statistics_to_post, load_profiles
 from hive.server.common.helpers import (
@@ -10,8 +12,9 @@ from hive.server.common.helpers import (
     valid_permlink,
     valid_tag,
 )
+from hive.server.common.batch_loader import get_loader
 from hive.server.common.mutes import Mutes
-from hive.server.database_api.methods import find_votes_impl, VotesPresentation
+from hive.server.database_api.methods import find_votes_impl, find_votes_of_posts, VotesPresentation
 from hive.server.hive_api.common import get_account_id
 from hive.server.hive_api.community import list_top_communities
 from hive.utils.account import safe_db_profile_metadata
@@ -255,12 +258,11 @@ async def get_ranked_posts(
 
     async def process_query_results(sql_result):
         posts = []
-        for row in sql_result:
+        votes, reblogs = await load_votes_and_reblogs(db, sql_result)
+        for row, active_votes, reblog_count in zip(sql_result, votes, reblogs):
             post = _bridge_post_object(row)
-            post['active_votes'] = await find_votes_impl(
-                db, row['author'], row['permlink'], VotesPresentation.BridgeApi
-            )
-            post['reblogs'] = await count_reblogs(db, row['id'])
+            post['active_votes'] = active_votes
+            post['reblogs'] = reblog_count
             post = append_statistics_to_post(post, row, row['is_pinned'])
             posts.append(post)
         return posts
@@ -330,10 +332,11 @@ async def get_account_posts(
     sql_result = await db.query_all(sql, account=account, author=start_author, permlink=start_permlink, limit=limit)
     posts = []
 
-    for row in sql_result:
+    votes, reblogs = await load_votes_and_reblogs(db, sql_result)
+    for row, active_votes, reblog_count in zip(sql_result, votes, reblogs):
         post = _bridge_post_object(row)
-        post['active_votes'] = await find_votes_impl(db, row['author'], row['permlink'], VotesPresentation.BridgeApi)
-        post['reblogs'] = await count_reblogs(db, row['id'])
+        post['active_votes'] = active_votes
+        post['reblogs'] = reblog_count
         if sort == 'blog':
             if post['author'] != account:
                 post['reblogged_by'] = [account]
@@ -461,3 +464,22 @@ async def _follow_contexts(db, accounts, observer_id, include_mute=False):
 async def count_reblogs(db, post_id: int):
     sql = f"""SELECT * FROM {SCHEMA_NAME}.get_reblog_count(:post_id)"""
     return await db.query_one(sql, post_id=post_id)
+
+
+async def _load_reblog_counts(db, post_ids: list):
+    sql = f"""SELECT * FROM {SCHEMA_NAME}.get_reblog_counts((:post_ids)::INTEGER[])"""
+    return {row['post_id']: row['reblogs'] for row in await db.query_all(sql, post_ids=post_ids)}
+
+
+@return_error_info
+async def count_reblogs_of_posts(db, post_ids: list):
+    """Reblog counts of many posts, in order of `post_ids`; lookups done at the same time share a query"""
+    return await get_loader(db, 'reblog_counts', _load_reblog_counts, default=0).load_many(post_ids)
+
+
+async def load_votes_and_reblogs(db, rows):
+    """Bridge style active votes and reblog counts of posts of given rows"""
+    post_ids = [row['id'] for row in rows]
+    return await asyncio.gather(
+        find_votes_of_posts(db, post_ids, VotesPresentation.BridgeApi), count_reblogs_of_posts(db, post_ids)
+    )
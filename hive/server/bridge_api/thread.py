@@ -3,10 +3,9 @@
 import logging
 
 from hive.conf import SCHEMA_NAME
-from hive.server.bridge_api.methods import count_reblogs
+from hive.server.bridge_api.methods import load_votes_and_reblogs
 from hive.server.bridge_api.objects import _bridge_post_object, append_statistics_to_post
 from hive.server.common.helpers import return_error_info, valid_account, valid_permlink
-from hive.server.database_api.methods import find_votes_impl, VotesPresentation
 
 log = logging.getLogger(__name__)
 
@@ -26,13 +25,12 @@ async def get_discussion(context, author: str, permlink: str, observer: str = ''
         return {}
     root_id = rows[0]['id']
     all_posts = {}
+    votes, reblogs = await load_votes_and_reblogs(db, rows)
     root_post = _bridge_post_object(rows[0])
-    root_post['active_votes'] = await find_votes_impl(
-        db, rows[0]['author'], rows[0]['permlink'], VotesPresentation.BridgeApi
-    )
+    root_post['active_votes'] = votes[0]
     root_post = append_statistics_to_post(root_post, rows[0], False)
     root_post['replies'] = []
-    root_post['reblogs'] = await count_reblogs(db, rows[0]['id'])
+    root_post['reblogs'] = reblogs[0]
     all_posts[root_id] = root_post
 
     parent_to_children_id_map = {}
@@ -43,12 +41,10 @@ async def get_discussion(context, author: str, permlink: str, observer: str = ''
             parent_to_children_id_map[parent_id] = []
         parent_to_children_id_map[parent_id].append(rows[index]['id'])
         post = _bridge_post_object(rows[index])
-        post['active_votes'] = await find_votes_impl(
-            db, rows[index]['author'], rows[index]['permlink'], VotesPresentation.BridgeApi
-        )
+        post['active_votes'] = votes[index]
         post = append_statistics_to_post(post, rows[index], False)
         post['replies'] = []
-        post['reblogs'] = await count_reblogs(db, rows[index]['id'])
+        post['reblogs'] = reblogs[index]
         all_posts[post['post_id']] = post
 
     for key in parent_to_children_id_map:
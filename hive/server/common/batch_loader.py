@@ -0,0 +1,67 @@
+"""Coalescing of lookups made by concurrently running API calls into batched queries."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+from hive.server.db import current_method
+
+
+class BatchLoader:
+    """Collects keys requested in the same iteration of event loop and loads them with single `batch_fn` call.
+
+    `batch_fn` is an async function receiving list of unique keys and returning dict of loaded values;
+    keys missing in that dict get `default`. Values are not cached, every lookup reaches the database,
+    only lookups requested at the same time share a query.
+    """
+
+    def __init__(self, batch_fn: Callable[[List], Awaitable[Dict]], default: Any = None):
+        self._batch_fn = batch_fn
+        self._default = default
+        self._pending: Dict[Any, asyncio.Future] = {}
+
+    def load(self, key) -> Awaitable:
+        """Value for given key, loaded together with other keys requested in the meantime."""
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_event_loop()
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            future = loop.create_future()
+            self._pending[key] = future
+        return future
+
+    async def load_many(self, keys: Iterable) -> List:
+        """Values for given keys, in order of keys."""
+        return await asyncio.gather(*[self.load(key) for key in keys])
+
+    def _dispatch(self) -> None:
+        pending = self._pending
+        self._pending = {}
+        asyncio.ensure_future(self._load(pending))
+
+    async def _load(self, pending: Dict[Any, asyncio.Future]) -> None:
+        try:
+            values = await self._batch_fn(list(pending))
+        except Exception as ex:  # pylint: disable=broad-except
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ex)
+            return
+
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(values.get(key, self._default))
+
+
+def get_loader(db, name: str, batch_fn: Callable[[Any, List], Awaitable[Dict]], default: Any = None) -> BatchLoader:
+    """Loader of given name bound to given database adapter; `batch_fn` receives the adapter and keys.
+
+    There is separate loader for each API method, so merged query runs in context of the method which
+    requested its keys (it is routed and has statement timeout as queries of that method).
+    """
+    key = (name, current_method.get())
+    loader = db.loaders.get(key)
+    if loader is None:
+        loader = BatchLoader(lambda keys: batch_fn(db, keys), default)
+        db.loaders[key] = loader
+    return loader
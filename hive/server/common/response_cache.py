@@ -0,0 +1,153 @@
+"""Cache of API results which are valid until next block is completed by the indexer."""
+
+import asyncio
+from collections import OrderedDict
+from functools import wraps
+import inspect
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from hive.conf import SCHEMA_NAME
+from hive.server.common.response_encoder import encode, EncodedJson
+from hive.server.common.single_flight import call_key, SingleFlight
+from hive.utils.stats import BroadcastObject, PrometheusClient
+
+log = logging.getLogger(__name__)
+
+# how often indexer progress is checked, in seconds
+HEAD_POLL_INTERVAL = 0.5
+
+# estimated memory used by an entry beside its encoded result
+ENTRY_OVERHEAD = 256
+
+
+class MethodCacheStat:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+
+class ResponseCache:
+    """LRU cache of method results, keyed by method name and its arguments (observer included).
+
+    All entries are dropped when `last_completed_block_num` advances, so cached result is never older
+    than last completed block (up to `HEAD_POLL_INTERVAL` after indexer completes next one). Size of entry
+    is the size of its encoded result, entries are evicted when their total size exceeds the limit.
+    Concurrent calls with the same key share one call of the method. Errors are not cached. Results are
+    encoded once, when cached, and returned as `EncodedJson` which is then written to responses as is.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._size = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._in_flight = SingleFlight()
+        self._head_block: Optional[int] = None
+        self._stats: Dict[str, MethodCacheStat] = {}
+
+    @property
+    def head_block(self) -> Optional[int]:
+        return self._head_block
+
+    def set_head_block(self, head_block: Optional[int]) -> None:
+        """Drop all entries when indexer completed next block; `None` disables cache until head is known again."""
+        if head_block != self._head_block:
+            self._head_block = head_block
+            self._entries.clear()
+            self._size = 0
+
+    def _stat(self, method: str) -> MethodCacheStat:
+        stat = self._stats.get(method)
+        if stat is None:
+            stat = self._stats[method] = MethodCacheStat()
+        return stat
+
+    async def get(self, method: str, key: Tuple, call: Callable[[], Awaitable]) -> Any:
+        """Cached result for given key, otherwise result of `call()`, shared with concurrent callers."""
+        head_block = self._head_block
+        if head_block is None:
+            return await call()
+
+        stat = self._stat(method)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            stat.hits += 1
+            self._broadcast(method, stat)
+            return entry[0]
+
+        flight_key = (head_block, key)
+        if self._in_flight.is_running(flight_key):
+            stat.shared += 1
+        else:
+            stat.misses += 1
+        self._broadcast(method, stat)
+        return await self._in_flight.run(flight_key, lambda: self._call(head_block, key, call))
+
+    async def _call(self, head_block: int, key: Tuple, call: Callable[[], Awaitable]) -> Any:
+        result = EncodedJson(encode(await call()))
+        self._put(head_block, key, result)
+        return result
+
+    def _put(self, head_block: int, key: Tuple, result: EncodedJson) -> None:
+        if head_block != self._head_block:
+            # next block was completed in the meantime, result may be outdated
+            return
+        size = len(result.data) + ENTRY_OVERHEAD
+        if size > self._max_size:
+            return
+        self._entries[key] = (result, size)
+        self._size += size
+        while self._size > self._max_size:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+    def _broadcast(self, method: str, stat: MethodCacheStat) -> None:
+        requests = stat.hits + stat.shared + stat.misses
+        PrometheusClient.broadcast(
+            [
+                BroadcastObject(f'response_cache_hits_{method}', stat.hits, 'b'),
+                BroadcastObject(f'response_cache_shared_{method}', stat.shared, 'b'),
+                BroadcastObject(f'response_cache_misses_{method}', stat.misses, 'b'),
+                BroadcastObject(f'response_cache_hit_ratio_{method}', (stat.hits + stat.shared) / requests, '%'),
+                BroadcastObject('response_cache_entries', len(self._entries), 'b'),
+                BroadcastObject('response_cache_size', self._size, 'b'),
+            ]
+        )
+
+    def report(self) -> None:
+        for method, stat in sorted(self._stats.items()):
+            requests = stat.hits + stat.shared + stat.misses
+            log.info(
+                f"{method}: {requests} cacheable calls, {stat.hits} cache hits, {stat.shared} shared calls, "
+                f"{stat.misses} misses ({100.0 * (stat.hits + stat.shared) / requests:.2f}% hit ratio)"
+            )
+
+    async def follow_head_block(self, db) -> None:
+        """Keep track of last block completed by the indexer; runs until cancelled."""
+        sql = f"SELECT last_completed_block_num FROM {SCHEMA_NAME}.hive_state"
+        while True:
+            try:
+                self.set_head_block(await db.query_one(sql))
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:  # pylint: disable=broad-except
+                log.warning("could not get last completed block, response cache disabled (%s)", ex)
+                self.set_head_block(None)
+            await asyncio.sleep(HEAD_POLL_INTERVAL)
+
+
+def cache_results(name: str, method: Callable) -> Callable:
+    """Wrap API method so its results are taken from response cache of the app, when there is one."""
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    async def wrapper(context, *args, **kwargs):
+        cache = context.get('response_cache')
+        if cache is None:
+            return await method(context, *args, **kwargs)
+        key = call_key(name, signature, context, args, kwargs)
+        return await cache.get(name, key, lambda: method(context, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,246 @@
+"""Fast JSON encoding of API responses, produced in chunks so large results need not be joined into one buffer."""
+
+from decimal import Decimal
+import logging
+from time import perf_counter as perf
+from typing import Iterable, Iterator, List, Tuple
+
+from aiohttp import web
+from jsonrpcserver.response import ExceptionResponse
+import orjson
+
+from hive.utils.stats import BroadcastObject, PrometheusClient
+
+log = logging.getLogger(__name__)
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# encoded pieces are collected until chunk reaches that size
+CHUNK_SIZE = 64 * 1024
+
+# containers nested deeper than that are encoded as a whole (batch -> response -> result -> items)
+SPLIT_DEPTH = 4
+
+
+class EncodedJson:
+    """Value which is already encoded, f.e. cached result; written as is instead of being encoded again."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def _encode_raw(obj) -> bytes:
+    """Encoding of container with values orjson cannot write as they are (Decimal, EncodedJson); other
+    values are encoded by orjson, so only containers which lead to such values are walked here."""
+    if isinstance(obj, Decimal):
+        return str(obj).encode('ascii')
+    if isinstance(obj, EncodedJson):
+        return obj.data
+    if isinstance(obj, dict):
+        # encoding of single item dict gives the same key as the whole dict would get
+        return b'{' + b','.join(encode({key: None})[1:-5] + encode(value) for key, value in obj.items()) + b'}'
+    if isinstance(obj, (list, tuple)):
+        return b'[' + b','.join(encode(item) for item in obj) + b']'
+    return orjson.dumps(obj, option=ORJSON_OPTIONS)
+
+
+def encode(obj) -> bytes:
+    """Encode object to JSON; Decimal is written as exact number (like simplejson with `use_decimal`), datetime
+    in ISO 8601 format."""
+    raw = []
+
+    def default(value):
+        if isinstance(value, (Decimal, EncodedJson)):
+            # orjson can only write Decimal as float, such objects are written by `_encode_raw`
+            raw.append(value)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    try:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    except TypeError:
+        if not raw:
+            raise
+    return _encode_raw(obj)
+
+
+def serialize(obj) -> str:
+    """Same as `encode`, for consumers which expect str."""
+    return encode(obj).decode('utf-8')
+
+
+def _iter_pieces(obj, depth: int) -> Iterator[bytes]:
+    if isinstance(obj, EncodedJson):
+        yield obj.data
+    elif depth >= SPLIT_DEPTH or not obj or not isinstance(obj, (dict, list)):
+        yield encode(obj)
+    elif isinstance(obj, list):
+        yield b'['
+        for idx, item in enumerate(obj):
+            if idx:
+                yield b','
+            yield from _iter_pieces(item, depth + 1)
+        yield b']'
+    else:
+        yield b'{'
+        for idx, (key, value) in enumerate(obj.items()):
+            # encoding of single item dict gives the same key as the whole dict would get
+            yield (b',' if idx else b'') + encode({key: None})[1:-5]
+            yield from _iter_pieces(value, depth + 1)
+        yield b'}'
+
+
+def _join_chunks(pieces: Iterable[bytes], chunk_size: int) -> Iterator[bytes]:
+    pending: List[bytes] = []
+    size = 0
+    for piece in pieces:
+        pending.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b''.join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b''.join(pending)
+
+
+def iter_encode(obj, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode object to JSON in chunks of at least `chunk_size` bytes (except the last one).
+
+    Top level containers are encoded item by item (f.e. posts of `get_discussion`), so encoded response
+    is never copied into one buffer; the object itself is already whole in memory.
+    """
+    return _join_chunks(_iter_pieces(obj, 0), chunk_size)
+
+
+class ResponseStat:
+    def __init__(self):
+        self.count = 0
+        self.size = 0
+        self.max_size = 0
+        self.encode_time = 0.0
+
+    def update(self, size: int, encode_time: float) -> None:
+        self.count += 1
+        self.size += size
+        self.max_size = max(self.max_size, size)
+        self.encode_time += encode_time
+
+
+class ResponseStats:
+    """Sizes of responses and time spent on their encoding, per API method."""
+
+    _stats = {}
+
+    @classmethod
+    def add(cls, method: str, size: int, encode_time: float) -> None:
+        stat = cls._stats.get(method)
+        if stat is None:
+            stat = cls._stats[method] = ResponseStat()
+        stat.update(size, encode_time)
+        PrometheusClient.broadcast(
+            [
+                BroadcastObject(f'response_count_{method}', stat.count, 'b'),
+                BroadcastObject(f'response_size_{method}', size, 'b'),
+                BroadcastObject(f'response_size_total_{method}', stat.size, 'b'),
+                BroadcastObject(f'response_size_max_{method}', stat.max_size, 'b'),
+                BroadcastObject(f'response_encode_time_{method}', encode_time, 's'),
+                BroadcastObject(f'response_encode_time_total_{method}', stat.encode_time, 's'),
+            ]
+        )
+
+    @classmethod
+    def report(cls) -> None:
+        for method, stat in sorted(cls._stats.items(), key=lambda item: item[1].encode_time, reverse=True):
+            log.info(
+                f"{method}: {stat.count} responses, {stat.size} bytes (max {stat.max_size}), "
+                f"encoded in {stat.encode_time:.4f}s"
+            )
+
+
+class TimedEncoder:
+    """Iterates chunks of encoded response, measuring its size and time spent on encoding."""
+
+    def __init__(self, obj, chunk_size: int = CHUNK_SIZE):
+        self._chunks = iter_encode(obj, chunk_size)
+        self.size = 0
+        self.encode_time = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        start = perf()
+        try:
+            chunk = next(self._chunks)
+        finally:
+            self.encode_time += perf() - start
+        self.size += len(chunk)
+        return chunk
+
+
+def _encode_member(method: str, member: dict) -> List[bytes]:
+    """Chunks of encoded response member; member which cannot be encoded is replaced by error response."""
+    encoder = TimedEncoder(member)
+    try:
+        chunks = list(encoder)
+    except TypeError as ex:
+        log.error("Cannot encode response of %s: %s", method, ex)
+        chunks = [encode(ExceptionResponse(ex, id=member.get('id'), debug=True).deserialized())]
+    ResponseStats.add(method, encoder.size, encoder.encode_time)
+    return chunks
+
+
+def _iter_members(encoded_members: List[List[bytes]], is_batch: bool) -> Iterator[bytes]:
+    if is_batch:
+        yield b'['
+    for idx, chunks in enumerate(encoded_members):
+        if idx:
+            yield b','
+        yield from chunks
+    if is_batch:
+        yield b']'
+
+
+async def write_json(request: web.Request, members: List[Tuple[str, dict]], is_batch: bool, headers: dict):
+    """Send JSON-RPC response made of (method, deserialized response) members.
+
+    All members are encoded before anything is sent, so a result which cannot be encoded turns into
+    an error response of its member instead of a response broken after its headers were sent. Response
+    which fits in a single chunk is sent at once, larger ones are written chunk by chunk with chunked
+    transfer encoding (without joining them). Returns sent response and its first chunk.
+    """
+    encoded_members = [_encode_member(method, member) for method, member in members]
+    chunks = _join_chunks(_iter_members(encoded_members, is_batch), CHUNK_SIZE)
+    first = next(chunks, b'')
+    second = next(chunks, None)
+    if second is None:
+        response = web.Response(
+            body=first, status=200, headers=headers, content_type='application/json', charset='utf-8'
+        )
+        return response, first
+
+    response = web.StreamResponse(status=200, headers=headers)
+    response.content_type = 'application/json'
+    response.charset = 'utf-8'
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    await response.write(first)
+    await response.write(second)
+    for chunk in chunks:
+        await response.write(chunk)
+    await response.write_eof()
+    return response, first
+
+    response = web.StreamResponse(status=200, headers=headers)
+    response.content_type = 'application/json'
+    response.charset = 'utf-8'
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    await response.write(first)
+    await response.write(second)
+    for chunk in chunks:
+        await response.write(chunk)
+    await response.write_eof()
+    return response, first
@@ -0,0 +1,78 @@
+"""Sharing of results between identical API calls running at the same time."""
+
+import asyncio
+from functools import wraps
+import inspect
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from hive.server.common.response_encoder import encode
+from hive.utils.stats import BroadcastObject, PrometheusClient
+
+log = logging.getLogger(__name__)
+
+
+def call_key(name: str, signature: inspect.Signature, context, args, kwargs) -> Tuple[str, bytes]:
+    """Key of API call: method name and its arguments bound to parameters, defaults applied, context skipped."""
+    bound = signature.bind(context, *args, **kwargs)
+    bound.apply_defaults()
+    params = {param: value for param, value in bound.arguments.items() if param != 'context'}
+    return name, encode(params)
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers which come while it runs get its result (or exception).
+
+    Call runs in its own task, so it is not cancelled with the request which started it, as long as other
+    callers wait for it.
+    """
+
+    def __init__(self):
+        self._running: Dict[Hashable, asyncio.Task] = {}
+        self._calls: Dict[str, int] = {}
+        self._shared: Dict[str, int] = {}
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self._running
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable]) -> Any:
+        """Result of `call()`, or of the call with the same key which is already running."""
+        task = self._running.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(key, call))
+            self._running[key] = task
+        return await asyncio.shield(task)
+
+    async def _call(self, key: Hashable, call: Callable[[], Awaitable]) -> Any:
+        try:
+            return await call()
+        finally:
+            del self._running[key]
+
+    async def run_method(self, name: str, key: Hashable, call: Callable[[], Awaitable]) -> Any:
+        """Same as `run`, counts calls of API method which were shared."""
+        shared = self.is_running(key)
+        self._calls[name] = self._calls.get(name, 0) + 1
+        if shared:
+            self._shared[name] = self._shared.get(name, 0) + 1
+            PrometheusClient.broadcast(BroadcastObject(f'single_flight_shared_{name}', self._shared[name], 'b'))
+        return await self.run(key, call)
+
+    def report(self) -> None:
+        for name, shared in sorted(self._shared.items()):
+            log.info(f"{name}: {shared} of {self._calls[name]} calls shared result of identical running call")
+
+
+def share_results(name: str, method: Callable) -> Callable:
+    """Wrap API method so identical calls share results, when app has single flight layer."""
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    async def wrapper(context, *args, **kwargs):
+        flight = context.get('single_flight')
+        if flight is None:
+            return await method(context, *args, **kwargs)
+        key = call_key(name, signature, context, args, kwargs)
+        return await flight.run_method(name, key, lambda: method(context, *args, **kwargs))
+
+    return wrapper
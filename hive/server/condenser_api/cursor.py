@@ -1,7 +1,7 @@
 """Cursor-based pagination queries, mostly supporting condenser_api."""
 from hive.conf import SCHEMA_NAME
 from hive.server.condenser_api.objects import _condenser_post_object
-from hive.server.database_api.methods import find_votes_impl, VotesPresentation
+from hive.server.database_api.methods import find_votes_of_posts, VotesPresentation
 
 
 # pylint: disable=too-many-lines
@@ -36,11 +36,12 @@ async def get_reblogged_by(db, author: str, permlink: str):
 
 async def process_posts(db, sql_result, truncate_body: int = 0):
     posts = []
-    for row in sql_result:
+    votes = await find_votes_of_posts(db, [row['id'] for row in sql_result], VotesPresentation.CondenserApi)
+    for row, active_votes in zip(sql_result, votes):
         row = dict(row)
         post = _condenser_post_object(row, truncate_body=truncate_body)
 
-        post['active_votes'] = await find_votes_impl(db, row['author'], row['permlink'], VotesPresentation.CondenserApi)
+        post['active_votes'] = active_votes
         posts.append(post)
 
     return posts
@@ -11,7 +11,7 @@ import hive.server.condenser_api.cursor as cursor
 from hive.server.condenser_api.methods import get_discussions_by_feed_impl, get_posts_by_given_sort
 from hive.server.condenser_api.objects import _condenser_post_object, load_accounts
 from hive.server.condenser_api.tags import get_top_trending_tags_summary, get_trending_tags
-from hive.server.database_api.methods import find_votes_impl, VotesPresentation
+from hive.server.database_api.methods import find_votes_of_posts, VotesPresentation
 
 log = logging.getLogger(__name__)
 
@@ -231,10 +231,11 @@ async def _load_discussion(db, author, permlink, observer=None):
     posts_by_id = {}
     replies = {}
 
-    for row in sql_result:
+    votes = await find_votes_of_posts(db, [row['id'] for row in sql_result], VotesPresentation.CondenserApi)
+    for row, active_votes in zip(sql_result, votes):
         post = _condenser_post_object(row)
 
-        post['active_votes'] = await find_votes_impl(db, row['author'], row['permlink'], VotesPresentation.CondenserApi)
+        post['active_votes'] = active_votes
         posts.append(post)
 
         parent_key = _ref_parent(post)
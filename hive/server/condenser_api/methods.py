@@ -15,7 +15,7 @@ from hive.server.common.helpers import (
 )
 import hive.server.condenser_api.cursor as cursor
 from hive.server.condenser_api.objects import _condenser_post_object
-from hive.server.database_api.methods import find_votes_impl, VotesPresentation
+from hive.server.database_api.methods import find_votes_impl, find_votes_of_posts, VotesPresentation
 
 
 # pylint: disable=too-many-arguments,line-too-long,too-many-lines
@@ -155,15 +155,15 @@ async def _get_content_replies_impl(db, fat_node_style, author: str, permlink: s
     result = await db.query_all(sql, author=author, permlink=permlink)
 
     posts = []
-    for row in result:
+    votes = await find_votes_of_posts(
+        db,
+        [row['id'] for row in result],
+        VotesPresentation.ActiveVotes if fat_node_style else VotesPresentation.CondenserApi,
+    )
+    for row, active_votes in zip(result, votes):
         row = dict(row)
         post = _condenser_post_object(row, get_content_additions=fat_node_style)
-        post['active_votes'] = await find_votes_impl(
-            db,
-            row['author'],
-            row['permlink'],
-            VotesPresentation.ActiveVotes if fat_node_style else VotesPresentation.CondenserApi,
-        )
+        post['active_votes'] = active_votes
         posts.append(post)
 
     return posts
@@ -266,9 +266,10 @@ async def get_posts_by_given_sort(
         sql, tag=tag, author=start_author, permlink=start_permlink, limit=limit, observer=observer
     )
 
-    for row in sql_result:
+    votes = await find_votes_of_posts(db, [row['id'] for row in sql_result], VotesPresentation.CondenserApi)
+    for row, active_votes in zip(sql_result, votes):
         post = _condenser_post_object(row, truncate_body)
-        post['active_votes'] = await find_votes_impl(db, row['author'], row['permlink'], VotesPresentation.CondenserApi)
+        post['active_votes'] = active_votes
         posts.append(post)
     return posts
 
@@ -398,12 +399,11 @@ async def get_discussions_by_blog(
     result = await db.query_all(sql, account=tag, author=start_author, permlink=start_permlink, limit=limit)
     posts_by_id = []
 
-    for row in result:
+    votes = await find_votes_of_posts(db, [row['id'] for row in result], VotesPresentation.CondenserApi)
+    for row, active_votes in zip(result, votes):
         row = dict(row)
         post = _condenser_post_object(row, truncate_body=truncate_body)
-        post['active_votes'] = await find_votes_impl(
-            db, post['author'], post['permlink'], VotesPresentation.CondenserApi
-        )
+        post['active_votes'] = active_votes
         posts_by_id.append(post)
 
     return posts_by_id
@@ -425,7 +425,8 @@ async def get_discussions_by_feed_impl(
     )
 
     posts = []
-    for row in result:
+    votes = await find_votes_of_posts(db, [row['id'] for row in result], VotesPresentation.CondenserApi)
+    for row, active_votes in zip(result, votes):
         row = dict(row)
         post = _condenser_post_object(row, truncate_body=truncate_body)
         reblogged_by = set(row['reblogged_by'])
@@ -435,7 +436,7 @@ async def get_discussions_by_feed_impl(
             reblogged_by_list.sort()
             post['reblogged_by'] = reblogged_by_list
 
-        post['active_votes'] = await find_votes_impl(db, row['author'], row['permlink'], VotesPresentation.CondenserApi)
+        post['active_votes'] = active_votes
         posts.append(post)
 
     return posts
@@ -491,12 +492,11 @@ async def get_discussions_by_comments(
         sql, account=start_author, author=start_author if start_permlink else '', permlink=start_permlink, limit=limit
     )
 
-    for row in result:
+    votes = await find_votes_of_posts(db, [row['id'] for row in result], VotesPresentation.CondenserApi)
+    for row, active_votes in zip(result, votes):
         row = dict(row)
         post = _condenser_post_object(row, truncate_body=truncate_body)
-        post['active_votes'] = await find_votes_impl(
-            db, post['author'], post['permlink'], VotesPresentation.CondenserApi
-        )
+        post['active_votes'] = active_votes
         posts.append(post)
 
     return posts
@@ -573,11 +573,12 @@ async def get_blog(context, account: str, start_entry_id: int = 0, limit: int =
     result = await db.query_all(sql, account=account, last=start_entry_id, limit=limit)
 
     out = []
-    for row in result:
+    votes = await find_votes_of_posts(db, [row['id'] for row in result], VotesPresentation.CondenserApi)
+    for row, active_votes in zip(result, votes):
         row = dict(row)
         post = _condenser_post_object(row)
 
-        post['active_votes'] = await find_votes_impl(db, row['author'], row['permlink'], VotesPresentation.CondenserApi)
+        post['active_votes'] = active_votes
         out.append(
             {
                 "blog": account,
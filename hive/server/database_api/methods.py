@@ -2,6 +2,7 @@
 from enum import Enum
 
 from hive.conf import SCHEMA_NAME
+from hive.server.common.batch_loader import get_loader
 from hive.server.common.helpers import json_date
 from hive.server.common.helpers import return_error_info, valid_account, valid_date, valid_limit, valid_permlink
 from hive.server.database_api.objects import database_post_object
@@ -275,6 +276,21 @@ async def find_votes_impl(db, author: str, permlink: str, votes_presentation, li
     return api_vote_info(rows, votes_presentation)
 
 
+async def _load_votes(db, post_ids: list):
+    sql = f"SELECT * FROM {SCHEMA_NAME}.find_votes_for_posts((:post_ids)::INT[], :limit)"
+    votes = {}
+    for row in await db.query_all(sql, post_ids=post_ids, limit=1000):
+        votes.setdefault(row['post_id'], []).append(row)
+    return votes
+
+
+@return_error_info
+async def find_votes_of_posts(db, post_ids: list, votes_presentation):
+    """Votes of many posts (up to 1000 each), in order of `post_ids`; lookups done at the same time share a query"""
+    loader = get_loader(db, 'votes', _load_votes, default=())
+    return [api_vote_info(rows, votes_presentation) for rows in await loader.load_many(post_ids)]
+
+
 @return_error_info
 async def find_votes(context, author: str, permlink: str):
     """Returns all votes for the given post"""
@@ -1,17 +1,41 @@
 """Async DB adapter for hivemind API."""
 
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 import logging
+import re
 from time import perf_counter as perf
+from typing import Dict, List, Optional, Sequence, Set
+from weakref import WeakKeyDictionary
 
 from aiopg.sa import create_engine
+from psycopg2 import DatabaseError
 import sqlalchemy
 from sqlalchemy.engine.url import make_url
 
-from hive.utils.stats import Stats
+from hive.conf import SCHEMA_NAME
+from hive.db.prepared_sql import PreparedSql
+from hive.utils.stats import BroadcastObject, PrometheusClient, Stats
 
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 log = logging.getLogger(__name__)
 
+# name of API method which performs queries, selects its statement timeout
+current_method: ContextVar[Optional[str]] = ContextVar('current_method', default=None)
+
+# queries calling bridge_/condenser_ functions are executed as prepared statements
+PREPARED_SQL_PATTERN = re.compile(rf"^\s*SELECT \* FROM {SCHEMA_NAME}\.((?:bridge|condenser)_\w+)\s*\(")
+FUNCTION_PATTERN = re.compile(rf"{SCHEMA_NAME}\.(\w+)\s*\(")
+
+# how often replicas are checked, in seconds
+REPLICA_CHECK_INTERVAL = 2.0
+HEAD_BLOCK_SQL = f"SELECT num FROM {SCHEMA_NAME}.get_head_state()"
+
+# prepared statement does not exist (f.e. after reconnect) or its result type changed after upgrade
+PREPARED_STATEMENT_ERRORS = ('26000', '0A000')
+DUPLICATE_PREPARED_STATEMENT = '42P05'
+
 
 def sqltimer(function):
     """Decorator for DB query methods which tracks timing."""
@@ -25,50 +49,241 @@ def sqltimer(function):
     return _wrapper
 
 
+class ConnectionState:
+    """Settings of pooled connection which persist between its uses."""
+
+    def __init__(self):
+        self.statement_timeout: Optional[int] = None
+        self.prepared: Set[str] = set()
+
+
+async def _create_engine(url, pool_min_size: int, pool_max_size: int):
+    conf = make_url(url)
+    dsn = {}
+    if conf.username:
+        dsn['user'] = conf.username
+    if conf.database:
+        dsn['database'] = conf.database
+    if conf.password:
+        dsn['password'] = conf.password
+    if conf.host:
+        dsn['host'] = conf.host
+    if conf.port:
+        dsn['port'] = conf.port
+    if 'application_name' not in conf.query:
+        dsn['application_name'] = 'hive_server'
+    return await create_engine(**dsn, minsize=pool_min_size, maxsize=pool_max_size, **conf.query)
+
+
+class Replica:
+    """Read-only copy of the database, used while it is reachable and not lagging behind."""
+
+    def __init__(self, idx: int, url: str, weight: int):
+        conf = make_url(url)
+        self.name = f"replica_{idx}"
+        self.host = f"{conf.host or ''}:{conf.port or ''}/{conf.database or ''}"
+        self.url = url
+        self.weight = weight
+        self.engine = None
+        self.healthy = False
+        self.lag: Optional[int] = None
+        self.current_weight = 0
+        self.error: Optional[str] = None
+
+
 class Db:
-    """Wrapper for aiopg.sa db driver."""
+    """Wrapper for aiopg.sa db driver.
+
+    Queries of API methods may be sent to read replicas: they are chosen by smooth weighted round-robin
+    among replicas which respond and lag behind primary by no more than `replica_max_lag` blocks. Queries
+    of methods pinned to primary, queries made outside of API methods and all queries when no replica is
+    usable go to primary.
+    """
 
     @classmethod
-    async def create(cls, url):
-        """Factory method."""
+    async def create(
+        cls,
+        url,
+        pool_min_size: int = 1,
+        pool_max_size: int = 20,
+        acquire_timeout: Optional[float] = None,
+        statement_timeouts: Optional[Dict[str, int]] = None,
+        replica_urls: Sequence[str] = (),
+        replica_weights: Sequence[int] = (),
+        replica_max_lag: int = 20,
+        primary_methods: Sequence[str] = (),
+    ):
+        """Factory method.
+
+        `statement_timeouts` maps API method names to statement timeouts in milliseconds, `default` key
+        applies to other methods; without it, timeout of database role is used.
+        """
         instance = Db()
-        await instance.init(url)
+        instance._acquire_timeout = acquire_timeout
+        instance._statement_timeouts = statement_timeouts or {}
+        await instance.init(url, pool_min_size, pool_max_size)
+        if replica_urls:
+            await instance.init_replicas(
+                replica_urls, replica_weights, replica_max_lag, primary_methods, pool_min_size, pool_max_size
+            )
         return instance
 
     def __init__(self):
         self.db = None
         self._prep_sql = {}
+        self._prepared_sql: Dict[str, Optional[PreparedSql]] = {}
+        self._connections = WeakKeyDictionary()
+        self._acquire_timeout = None
+        self._statement_timeouts = {}
+        self._replicas: List[Replica] = []
+        self._replica_max_lag = 0
+        self._primary_methods: Set[str] = set()
+        self._replica_monitor = None
+        self._routed: Dict[str, int] = {}
+        # BatchLoaders by name and API method, see hive.server.common.batch_loader
+        self.loaders = {}
 
-    async def init(self, url):
+    async def init(self, url, pool_min_size: int = 1, pool_max_size: int = 20):
         """Initialize the aiopg.sa engine."""
-        conf = make_url(url)
-        dsn = {}
-        if conf.username:
-            dsn['user'] = conf.username
-        if conf.database:
-            dsn['database'] = conf.database
-        if conf.password:
-            dsn['password'] = conf.password
-        if conf.host:
-            dsn['host'] = conf.host
-        if conf.port:
-            dsn['port'] = conf.port
-        if 'application_name' not in conf.query:
-            dsn['application_name'] = 'hive_server'
-        self.db = await create_engine(**dsn, maxsize=20, **conf.query)
+        self.db = await _create_engine(url, pool_min_size, pool_max_size)
+
+    async def init_replicas(
+        self,
+        urls: Sequence[str],
+        weights: Sequence[int],
+        max_lag: int,
+        primary_methods: Sequence[str],
+        pool_min_size: int,
+        pool_max_size: int,
+    ):
+        """Start using read replicas; they are taken into rotation after first successful check."""
+        if weights and len(weights) != len(urls):
+            raise ValueError(f"{len(weights)} replica weights given for {len(urls)} replicas")
+        self._replicas = [Replica(idx, url, weights[idx] if weights else 1) for idx, url in enumerate(urls)]
+        self._replica_max_lag = max_lag
+        self._primary_methods = set(primary_methods)
+        self._replica_monitor = asyncio.ensure_future(self._monitor_replicas(pool_min_size, pool_max_size))
+
+    async def _monitor_replicas(self, pool_min_size: int, pool_max_size: int) -> None:
+        while True:
+            try:
+                primary_head = await asyncio.wait_for(self._head_block(self.db), REPLICA_CHECK_INTERVAL)
+            except Exception as ex:  # pylint: disable=broad-except
+                log.warning("Cannot check head block of primary database: %s", ex)
+                primary_head = None
+            await asyncio.gather(
+                *[
+                    self._check_replica(replica, primary_head, pool_min_size, pool_max_size)
+                    for replica in self._replicas
+                ]
+            )
+            await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+
+    async def _check_replica(
+        self, replica: Replica, primary_head: Optional[int], pool_min_size: int, pool_max_size: int
+    ):
+        healthy = False
+        try:
+            # replica which does not answer in time (f.e. hung or unreachable host) is removed from rotation
+            if replica.engine is None:
+                replica.engine = await asyncio.wait_for(
+                    _create_engine(replica.url, pool_min_size, pool_max_size), REPLICA_CHECK_INTERVAL
+                )
+            head = await asyncio.wait_for(self._head_block(replica.engine), REPLICA_CHECK_INTERVAL)
+            if primary_head is not None:
+                replica.lag = primary_head - head
+                healthy = replica.lag <= self._replica_max_lag
+            else:
+                # without primary replicas are only ones which can serve queries
+                healthy = True
+            replica.error = None
+        except Exception as ex:  # pylint: disable=broad-except
+            error = str(ex) or ex.__class__.__name__
+            if error != replica.error:
+                log.warning("Cannot check %s (%s): %s", replica.name, replica.host, error)
+            replica.error = error
+            replica.lag = None
+
+        if healthy != replica.healthy:
+            if healthy:
+                log.info("%s (%s) taken into rotation, lag: %s blocks", replica.name, replica.host, replica.lag)
+            else:
+                log.warning("%s (%s) removed from rotation, lag: %s blocks", replica.name, replica.host, replica.lag)
+            replica.healthy = healthy
+            replica.current_weight = 0
+        PrometheusClient.broadcast(
+            [
+                BroadcastObject(f'db_{replica.name}_healthy', int(healthy), 'b'),
+                BroadcastObject(f'db_{replica.name}_lag', replica.lag if replica.lag is not None else -1, 'b'),
+            ]
+        )
+
+    async def _head_block(self, engine) -> int:
+        async with engine.acquire() as conn:
+            cur = await conn.execute(HEAD_BLOCK_SQL)
+            row = await cur.first()
+        return row[0]
+
+    def _choose_engine(self):
+        """Engine for queries of current API method: next healthy replica or primary."""
+        method = current_method.get()
+        if method is None or method in self._primary_methods:
+            return self.db, 'primary'
+        best = None
+        total = 0
+        for replica in self._replicas:
+            if replica.healthy:
+                replica.current_weight += replica.weight
+                total += replica.weight
+                if best is None or replica.current_weight > best.current_weight:
+                    best = replica
+        if best is None:
+            return self.db, 'primary'
+        best.current_weight -= total
+        return best.engine, best.name
 
     def close(self):
         """Close pool."""
+        if self._replica_monitor is not None:
+            self._replica_monitor.cancel()
         self.db.close()
+        for replica in self._replicas:
+            if replica.engine is not None:
+                replica.engine.close()
 
     async def wait_closed(self):
         """Wait for releasing and closing all acquired connections."""
         await self.db.wait_closed()
+        for replica in self._replicas:
+            if replica.engine is not None:
+                await replica.engine.wait_closed()
+
+    @asynccontextmanager
+    async def _acquire(self):
+        """Connection from the pool, waiting for it no longer than acquire timeout."""
+        engine, name = self._choose_engine() if self._replicas else (self.db, 'primary')
+        start = perf()
+        try:
+            conn = await asyncio.wait_for(engine.acquire(), self._acquire_timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"No free database connection within {self._acquire_timeout}s")
+        self._routed[name] = self._routed.get(name, 0) + 1
+        PrometheusClient.broadcast(
+            [
+                BroadcastObject('db_pool_wait_time', perf() - start, 's'),
+                BroadcastObject(f'db_pool_in_use_{name}', engine.size - engine.freesize, 'b'),
+                BroadcastObject(f'db_queries_{name}', self._routed[name], 'b'),
+            ]
+        )
+        try:
+            yield conn
+        finally:
+            await conn.close()
 
     @sqltimer
     async def query_all(self, sql, **kwargs):
         """Perform a `SELECT n*m`"""
-        async with self.db.acquire() as conn:
+        async with self._acquire() as conn:
             cur = await self._query(conn, sql, **kwargs)
             res = await cur.fetchall()
         return res
@@ -76,7 +291,7 @@ class Db:
     @sqltimer
     async def query_row(self, sql, **kwargs):
         """Perform a `SELECT 1*m`"""
-        async with self.db.acquire() as conn:
+        async with self._acquire() as conn:
             cur = await self._query(conn, sql, **kwargs)
             res = await cur.first()
         return res
@@ -84,7 +299,7 @@ class Db:
     @sqltimer
     async def query_col(self, sql, **kwargs):
         """Perform a `SELECT n*1`"""
-        async with self.db.acquire() as conn:
+        async with self._acquire() as conn:
             cur = await self._query(conn, sql, **kwargs)
             res = await cur.fetchall()
         return [r[0] for r in res]
@@ -92,7 +307,7 @@ class Db:
     @sqltimer
     async def query_one(self, sql, **kwargs):
         """Perform a `SELECT 1*1`"""
-        async with self.db.acquire() as conn:
+        async with self._acquire() as conn:
             cur = await self._query(conn, sql, **kwargs)
             row = await cur.first()
         return row[0] if row else None
@@ -100,16 +315,90 @@ class Db:
     @sqltimer
     async def query(self, sql, **kwargs):
         """Perform a write query"""
-        async with self.db.acquire() as conn:
+        async with self._acquire() as conn:
             await self._query(conn, sql, **kwargs)
 
     async def _query(self, conn, sql, **kwargs):
         """Send a query off to SQLAlchemy."""
+        start = perf()
         try:
-            return await conn.execute(self._sql_text(sql), **kwargs)
+            state = self._connection_state(conn)
+            await self._set_statement_timeout(conn, state)
+            prepared = await self._prepare(conn, state, sql)
+            if prepared is None:
+                result = await conn.execute(self._sql_text(sql), **kwargs)
+            else:
+                result = await self._execute_prepared(conn, state, prepared, **kwargs)
+        except asyncio.CancelledError:
+            if conn.closed:
+                raise
+            # aiopg reports query canceled by the server as cancellation, but keeps the connection
+            log.warning("[SQL-ERR] statement timeout in query %s (%s)", sql, kwargs)
+            raise asyncio.TimeoutError(f"Statement timeout of {current_method.get()} exceeded")
         except Exception as e:
             log.warning("[SQL-ERR] %s in query %s (%s)", e.__class__.__name__, sql, kwargs)
             raise e
+        match = FUNCTION_PATTERN.search(sql)
+        PrometheusClient.broadcast(
+            BroadcastObject(f"db_query_time_{match.group(1) if match else 'other'}", perf() - start, 's')
+        )
+        return result
+
+    def _connection_state(self, conn) -> ConnectionState:
+        state = self._connections.get(conn.connection)
+        if state is None:
+            state = self._connections[conn.connection] = ConnectionState()
+        return state
+
+    async def _set_statement_timeout(self, conn, state: ConnectionState) -> None:
+        """Apply statement timeout of current API method, when connection has a different one."""
+        timeout = self._statement_timeouts.get(current_method.get(), self._statement_timeouts.get('default'))
+        if timeout != state.statement_timeout:
+            await conn.execute(
+                'SET statement_timeout TO DEFAULT' if timeout is None else f'SET statement_timeout = {int(timeout)}'
+            )
+            state.statement_timeout = timeout
+
+    async def _prepare(self, conn, state: ConnectionState, sql: str) -> Optional[PreparedSql]:
+        """Prepared statement for given query on given connection, `None` when query is not prepared."""
+        if sql in self._prepared_sql:
+            prepared = self._prepared_sql[sql]
+        else:
+            match = PREPARED_SQL_PATTERN.match(sql)
+            # names of functions may be longer than allowed for names of statements
+            prepared = PreparedSql(f'hive_query_{len(self._prepared_sql)}', sql) if match else None
+            self._prepared_sql[sql] = prepared
+        if prepared is None or prepared.name in state.prepared:
+            return prepared
+
+        try:
+            await conn.execute(prepared.prepare_sql)
+        except DatabaseError as e:
+            if e.pgcode != DUPLICATE_PREPARED_STATEMENT:
+                # f.e. types of parameters cannot be determined, such query is always sent as text
+                log.warning("Query %s will not be prepared: %s", sql, e)
+                self._prepared_sql[sql] = None
+                return None
+        state.prepared.add(prepared.name)
+        return prepared
+
+    async def _execute_prepared(self, conn, state: ConnectionState, prepared: PreparedSql, **kwargs):
+        try:
+            return await conn.execute(self._sql_text(prepared.execute_sql), **kwargs)
+        except DatabaseError as e:
+            if e.pgcode not in PREPARED_STATEMENT_ERRORS:
+                raise e
+            # statement is gone or its plan is outdated (f.e. after change of schema), it is prepared again
+            # and executed once more on the same connection
+            log.info("Preparing statement %s again: %s", prepared.name, e)
+            state.prepared.discard(prepared.name)
+            try:
+                await conn.execute(f'DEALLOCATE {prepared.name}')
+            except DatabaseError:
+                pass
+        sql = prepared.sql
+        prepared = await self._prepare(conn, state, sql)
+        return await conn.execute(self._sql_text(sql if prepared is None else prepared.execute_sql), **kwargs)
 
     def _sql_text(self, sql):
         if sql in self._prep_sql:
@@ -118,3 +407,14 @@ class Db:
             query = sqlalchemy.text(sql).execution_options(autocommit=False)
             self._prep_sql[sql] = query
         return query
+
+
+def parse_statement_timeouts(entries: List[str]) -> Dict[str, int]:
+    """Map of `method=milliseconds` entries."""
+    timeouts = {}
+    for entry in entries or ():
+        method, sep, timeout = entry.partition('=')
+        if not sep or not timeout.strip().isdigit():
+            raise ValueError(f"statement timeout should be given as method=milliseconds, got: {entry}")
+        timeouts[method.strip()] = int(timeout)
+    return timeouts
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """Hive JSON-RPC API server."""
+import asyncio
 from datetime import datetime
+from functools import wraps
 import logging
 import os
 import sys
@@ -8,8 +10,11 @@ import time
 from time import perf_counter
 
 from aiohttp import web
-from jsonrpcserver import async_dispatch as dispatch
+from jsonrpcserver.async_dispatcher import safe_call
+from jsonrpcserver.dispatcher import create_requests, log_request, response_logger, schema, validate
 from jsonrpcserver.methods import Methods
+from jsonrpcserver.response import BatchResponse, InvalidJSONRPCResponse
+from jsonschema import ValidationError
 import simplejson
 from sqlalchemy.exc import OperationalError
 import psycopg2
@@ -19,27 +24,34 @@ from hive.server.bridge_api import methods as bridge_api
 from hive.server.bridge_api.support import get_post_header as bridge_api_get_post_header
 from hive.server.bridge_api.support import normalize_post as bridge_api_normalize_post
 from hive.server.bridge_api.thread import get_discussion as bridge_api_get_discussion
+from hive.server.common.response_cache import cache_results, ResponseCache
+from hive.server.common.response_encoder import ResponseStats, serialize, write_json
+from hive.server.common.single_flight import share_results, SingleFlight
 from hive.server.condenser_api import methods as condenser_api
 from hive.server.condenser_api.call import call as condenser_api_call
 from hive.server.condenser_api.get_state import get_state as condenser_api_get_state
 from hive.server.condenser_api.tags import get_trending_tags as condenser_api_get_trending_tags
 from hive.server.database_api import methods as database_api
-from hive.server.db import Db
+from hive.server.db import current_method, Db, parse_statement_timeouts
 from hive.server.follow_api import methods as follow_api
 from hive.server.hive_api import community as hive_api_community
 from hive.server.hive_api import notify as hive_api_notify
 from hive.server.hive_api import stats as hive_api_stats
 from hive.server.hive_api.public import get_info as hive_api_get_info
 from hive.server.tags_api import methods as tags_api
+from hive.server.workers import (
+    combine_logger,
+    HEARTBEAT_INTERVAL,
+    pool_size_per_worker,
+    WorkerManager,
+    WorkerSlots,
+)
+from hive.utils.stats import PrometheusClient
 
 
 # pylint: disable=too-many-lines
 
 
-def decimal_serialize(obj):
-    return simplejson.dumps(obj=obj, use_decimal=True)
-
-
 def decimal_deserialize(s):
     return simplejson.loads(s=s, use_decimal=True)
 
@@ -52,8 +64,11 @@ async def db_head_state(context):
     return dict(db_head_block=row['num'], db_head_time=str(row['created_at']), db_head_age=int(time.time() - float(row['age'])))
 
 
-def build_methods():
-    """Register all supported hive_api/condenser_api.calls."""
+def build_methods(cached_methods=()):
+    """Register all supported hive_api/condenser_api.calls; results of `cached_methods` go through response cache.
+
+    Identical calls of any method share results while running, when app has single flight layer.
+    """
     # pylint: disable=expression-not-assigned, line-too-long
     methods = Methods()
 
@@ -174,9 +189,78 @@ def build_methods():
         }
     )
 
+    for name in cached_methods:
+        if name not in methods.items:
+            raise ValueError(f"cannot cache results of unknown method {name}")
+        methods.items[name] = cache_results(name, methods.items[name])
+
+    methods.items = {name: _named_method(name, share_results(name, method)) for name, method in methods.items.items()}
+
     return methods
 
 
+def _named_method(name, method):
+    """Wrap API method so its database queries know which method they belong to."""
+
+    @wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = current_method.set(name)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            current_method.reset(token)
+
+    return wrapper
+
+
+def _skip_serialize(result) -> str:
+    """Results are encoded only once, by `write_json` while response is sent; jsonrpcserver gets this instead."""
+    return ''
+
+
+async def dispatch_requests(parsed, methods, context, batch_concurrency: int):
+    """Call methods of deserialized JSON-RPC request; members of batch run concurrently, up to `batch_concurrency` at once."""
+    # debug=True refs https://github.com/bcb/jsonrpcserver/issues/71
+    try:
+        requests = create_requests(validate(parsed, schema), context=context, convert_camel_case=False)
+    except ValidationError:
+        return InvalidJSONRPCResponse(data=None, debug=True)
+
+    if not isinstance(requests, set):
+        return await safe_call(requests, methods, debug=True, serialize=_skip_serialize)
+
+    if batch_concurrency <= 0 or len(requests) <= batch_concurrency:
+        responses = await asyncio.gather(*[safe_call(r, methods, debug=True, serialize=_skip_serialize) for r in requests])
+        return BatchResponse(responses, serialize_func=_skip_serialize)
+
+    semaphore = asyncio.Semaphore(batch_concurrency)
+
+    async def limited_call(request):
+        async with semaphore:
+            return await safe_call(request, methods, debug=True, serialize=_skip_serialize)
+
+    responses = await asyncio.gather(*[limited_call(r) for r in requests])
+    return BatchResponse(responses, serialize_func=_skip_serialize)
+
+
+def _response_members(methods, parsed, response):
+    """Pairs of (method, deserialized response) of all parts of response to be sent."""
+
+    def method_of(request):
+        # only registered methods are reported, names sent by clients would flood stats
+        method = request.get('method') if isinstance(request, dict) else None
+        return method if isinstance(method, str) and method in methods.items else 'unknown'
+
+    if isinstance(response, BatchResponse):
+        by_id = {}
+        if isinstance(parsed, list):
+            for request in parsed:
+                if isinstance(request, dict) and 'id' in request:
+                    by_id[request['id']] = method_of(request)
+        return [(by_id.get(member.id, 'unknown'), member.deserialized()) for member in response.responses]
+    return [(method_of(parsed), response.deserialized())]
+
+
 def truncate_response_log(logger):
     """Overwrite jsonrpcserver resp logger to truncate output.
 
@@ -224,25 +308,65 @@ def run_server(conf):
         req_res_log = logging.getLogger("Request-Process-Time-Logger")
         conf_stdout_custom_file_logger(req_res_log, log_path)
 
-    methods = build_methods()
+    response_cache_size = conf.get('response_cache_size')
+    methods = build_methods(conf.get('response_cached_methods') if response_cache_size else ())
+    batch_concurrency = conf.get('batch_request_concurrency')
+    statement_timeouts = parse_statement_timeouts(conf.get('statement_timeouts'))
 
     app = web.Application()
     app['config'] = dict()
     app['config']['args'] = conf.args()
     app['config']['hive.MAX_DB_ROW_RESULTS'] = 100000
+    app['config']['db_pool_max_size'] = conf.get('db_pool_max_size')
+    # mutable, as state of running app should not be replaced
+    app['counters'] = dict(requests=0)
 
     # app['config']['hive.logger'] = logger
 
     async def init_db(app):
         """Initialize db adapter."""
         args = app['config']['args']
-        app['db'] = await Db.create(args['database_url'])
+        app['db'] = await Db.create(
+            args['database_url'],
+            pool_min_size=min(args['db_pool_min_size'], app['config']['db_pool_max_size']),
+            pool_max_size=app['config']['db_pool_max_size'],
+            acquire_timeout=args['db_acquire_timeout'] or None,
+            statement_timeouts=statement_timeouts,
+            replica_urls=args['replica_urls'],
+            replica_weights=args['replica_weights'],
+            replica_max_lag=args['replica_max_lag'],
+            primary_methods=args['primary_methods'],
+        )
+        if conf.get('single_flight'):
+            app['single_flight'] = SingleFlight()
+
+    async def init_response_cache(app):
+        """Start following indexer progress, which invalidates cached results."""
+        if response_cache_size:
+            app['response_cache'] = ResponseCache(response_cache_size * 1024 * 1024)
+            app['response_cache_follower'] = asyncio.ensure_future(app['response_cache'].follow_head_block(app['db']))
+
+    async def close_response_cache(app):
+        """Stop following indexer progress and log cache statistics."""
+        if 'response_cache' in app:
+            app['response_cache_follower'].cancel()
+            app['response_cache'].report()
+
+    async def report_single_flight_stats(app):
+        """Log how many calls shared results of identical running calls."""
+        if 'single_flight' in app:
+            app['single_flight'].report()
 
     async def close_db(app):
         """Teardown db adapter."""
         app['db'].close()
         await app['db'].wait_closed()
 
+    async def report_response_stats(app):
+        """Log sizes and encoding times of responses."""
+        # pylint: disable=unused-argument
+        ResponseStats.report()
+
     async def show_info(app):
         from hive.utils.misc import show_app_version, BlocksInfo, PatchLevelInfo
 
@@ -262,9 +386,29 @@ def run_server(conf):
 
         show_app_version(log, blocks_info, patch_level_info)
 
+    async def report_heartbeat(app):
+        """Let other processes know this worker is alive and how many requests it processed."""
+        while True:
+            app['worker_slots'].beat(app['worker_slot'], app['counters']['requests'])
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def start_heartbeat(app):
+        if 'worker_slots' in app:
+            app['heartbeat'] = asyncio.ensure_future(report_heartbeat(app))
+
+    async def stop_heartbeat(app):
+        if 'heartbeat' in app:
+            app['heartbeat'].cancel()
+
     app.on_startup.append(init_db)
     app.on_startup.append(show_info)
+    app.on_startup.append(init_response_cache)
+    app.on_cleanup.append(close_response_cache)
+    app.on_cleanup.append(report_single_flight_stats)
+    app.on_startup.append(start_heartbeat)
+    app.on_cleanup.append(stop_heartbeat)
     app.on_cleanup.append(close_db)
+    app.on_cleanup.append(report_response_stats)
 
     async def head_age(request):
         """Get hive head block age in seconds. 500 status if age > 15s."""
@@ -304,10 +448,19 @@ def run_server(conf):
             status = 200
             result = 'head block age is %d, head block num is %d' % (state['db_head_age'], state['db_head_block'])
 
+        workers = None
+        if 'worker_slots' in app:
+            workers = app['worker_slots'].report()
+            unresponsive = WorkerSlots.unresponsive(workers)
+            if unresponsive and status == 200:
+                status = 500
+                result = f"workers {', '.join(str(worker['pid']) for worker in unresponsive)} are not responding"
+
         return web.json_response(
             status=status,
             data=dict(
                 state=state,
+                workers=workers,
                 result=result,
                 status='OK' if status == 200 else 'WARN',
                 sync_service=is_syncer,
@@ -325,18 +478,12 @@ def run_server(conf):
             return round(time.time() * 1000)
 
         t_start = perf_counter()
+        app['counters']['requests'] += 1
+        http_request = request
         request = await request.text()
-        # debug=True refs https://github.com/bcb/jsonrpcserver/issues/71
-        response = None
+        log_request(request)
         try:
-            response = await dispatch(
-                request,
-                methods=methods,
-                debug=True,
-                context=app,
-                serialize=decimal_serialize,
-                deserialize=decimal_deserialize,
-            )
+            parsed = decimal_deserialize(request)
         except simplejson.errors.JSONDecodeError as ex:
             # first log exception
             # TODO: consider removing this log - potential log spam
@@ -353,15 +500,22 @@ def run_server(conf):
                 "id": -1,
             }
             headers = {'Access-Control-Allow-Origin': '*'}
-            ret = web.json_response(error_response, status=200, headers=headers, dumps=decimal_serialize)
+            ret = web.json_response(error_response, status=200, headers=headers, dumps=serialize)
             if req_res_log is not None:
                 req_res_log.info(f"{current_millis()} Request: {request} processed in {perf_counter() - t_start:.4f}s")
 
             return ret
 
+        response = await dispatch_requests(parsed, methods, app, batch_concurrency)
+
         if response is not None and response.wanted:
             headers = {'Access-Control-Allow-Origin': '*'}
-            ret = web.json_response(response.deserialized(), status=200, headers=headers, dumps=decimal_serialize)
+            # response is encoded once, while being sent; only its beginning is logged
+            ret, first_chunk = await write_json(
+                http_request, _response_members(methods, parsed, response), isinstance(response, BatchResponse), headers
+            )
+            if response_logger.isEnabledFor(logging.INFO):
+                response_logger.info(first_chunk[:1024].decode('utf-8', 'ignore'))
             if req_res_log is not None:
                 req_res_log.info(f"{current_millis()} Request: {request} processed in {perf_counter() - t_start:.4f}s")
             return ret
@@ -372,6 +526,45 @@ def run_server(conf):
 
         return ret
 
+    def serve(sock=None):
+        """Run the server in this process or in forked workers, which share listening socket."""
+        workers = conf.get('workers')
+        if workers <= 1:
+            if sock is None:
+                web.run_app(app, port=app['config']['args']['http_server_port'])
+            else:
+                web.run_app(app, sock=sock)
+            return
+
+        if sock is None:
+            import socket
+
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(('', app['config']['args']['http_server_port']))
+        # connections wait in backlog while workers start
+        sock.listen(128)
+
+        app['config']['db_pool_max_size'] = pool_size_per_worker(conf.db(), conf.get('db_pool_max_size'), workers)
+        conf.disconnect()
+
+        # during reload old and new worker run at the same time
+        slots = WorkerSlots(2 * workers)
+        app['worker_slots'] = slots
+        use_prometheus = PrometheusClient.forward_from_workers()
+        log_listener = combine_logger(req_res_log) if req_res_log is not None else None
+
+        def run_worker(idx):
+            use_prometheus()
+            app['worker_slot'] = idx
+            web.run_app(app, sock=sock)
+
+        try:
+            WorkerManager(run_worker, workers, slots).run()
+        finally:
+            if log_listener is not None:
+                log_listener.stop()
+
     if conf.get('sync_to_s3'):
         app.router.add_get('/head_age', head_age)
     app.router.add_get('/.well-known/healthcheck.json', health)
@@ -407,9 +600,9 @@ def run_server(conf):
             else:
                 with open('hivemind.port', 'w') as port_file:
                     port_file.write(f"{port_from}\n")
-                web.run_app(app, sock=sock)
+                serve(sock)
                 break
         if port_from == port_to:
             raise IOError('No free ports in given range')
     else:
-        web.run_app(app, port=app['config']['args']['http_server_port'])
+        serve()
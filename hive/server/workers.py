@@ -0,0 +1,231 @@
+"""Pre-forked worker processes of the API server, all accepting connections on one listening socket."""
+
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable, Dict, List, Set
+
+log = logging.getLogger(__name__)
+
+# how often workers report they are alive, in seconds
+HEARTBEAT_INTERVAL = 1.0
+# worker which did not report for that long is considered unresponsive
+HEARTBEAT_TIMEOUT = 10.0
+# how long new worker may start during reload before old one is stopped anyway
+READY_TIMEOUT = 60.0
+# how long stopped workers may finish requests in progress before they are killed
+STOP_TIMEOUT = 75.0
+POLL_INTERVAL = 0.2
+# workers which exit sooner after start are started again with increasing delay, up to the max one
+MIN_UPTIME = 5.0
+MAX_RESPAWN_DELAY = 30.0
+
+# connections left for other clients of the database (indexer, maintenance)
+RESERVED_CONNECTIONS = 10
+
+
+def pool_size_per_worker(db, pool_max_size: int, workers: int) -> int:
+    """Size of connection pool of each worker, so pools of all workers fit in connections offered by the database."""
+    max_connections = db.query_one("SELECT setting::int FROM pg_settings WHERE name = 'max_connections'")
+    used_connections = db.query_one("SELECT COUNT(*) FROM pg_stat_activity")
+    available = max(workers, max_connections - used_connections - RESERVED_CONNECTIONS)
+    size = min(pool_max_size, available // workers)
+    if size < pool_max_size:
+        log.warning(
+            f"Database offers {max_connections} connections ({used_connections} in use), "
+            f"pool of each of {workers} workers is limited to {size} connections"
+        )
+    return size
+
+
+class WorkerSlots:
+    """State reported by workers in memory shared with all of them: pid, start time, last heartbeat, requests."""
+
+    FIELDS = 4
+
+    def __init__(self, count: int):
+        self._values = multiprocessing.Array('d', count * self.FIELDS, lock=False)
+        self.count = count
+
+    def assign(self, idx: int, pid: int) -> None:
+        base = idx * self.FIELDS
+        self._values[base : base + self.FIELDS] = [pid, time.time(), 0.0, 0.0]
+
+    def clear(self, idx: int) -> None:
+        base = idx * self.FIELDS
+        self._values[base : base + self.FIELDS] = [0.0] * self.FIELDS
+
+    def beat(self, idx: int, requests: int) -> None:
+        base = idx * self.FIELDS
+        self._values[base + 2] = time.time()
+        self._values[base + 3] = requests
+
+    def is_ready(self, idx: int) -> bool:
+        return self._values[idx * self.FIELDS + 2] > 0
+
+    def report(self) -> List[dict]:
+        """State of running workers, as reported by them."""
+        now = time.time()
+        workers = []
+        for idx in range(self.count):
+            pid, started, heartbeat, requests = self._values[idx * self.FIELDS : (idx + 1) * self.FIELDS]
+            if not pid:
+                continue
+            workers.append(
+                dict(
+                    pid=int(pid),
+                    uptime=int(now - started),
+                    heartbeat_age=round(now - heartbeat, 1) if heartbeat else None,
+                    requests=int(requests),
+                )
+            )
+        return workers
+
+    @staticmethod
+    def unresponsive(workers: List[dict]) -> List[dict]:
+        """Workers which stopped reporting (the ones still starting are not included)."""
+        return [
+            worker
+            for worker in workers
+            if worker['heartbeat_age'] is not None and worker['heartbeat_age'] > HEARTBEAT_TIMEOUT
+        ]
+
+
+def combine_logger(logger: logging.Logger) -> QueueListener:
+    """Route records of given logger in all workers through a queue to its current handlers in this process."""
+    queue = multiprocessing.Queue()
+    listener = QueueListener(queue, *logger.handlers, respect_handler_level=True)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(queue))
+    listener.start()
+    return listener
+
+
+class WorkerManager:
+    """Keeps given number of forked workers running.
+
+    Workers which die are started again. SIGHUP replaces workers one by one (each new one is started
+    before the old one is asked to finish requests in progress and exit), SIGTERM and SIGINT stop all
+    of them gracefully.
+    """
+
+    def __init__(self, run_worker: Callable[[int], None], workers: int, slots: WorkerSlots):
+        self._run_worker = run_worker
+        self._workers = workers
+        self._slots = slots
+        self._pids: Dict[int, int] = {}
+        self._retiring: Set[int] = set()
+        self._started: Dict[int, float] = {}
+        self._respawn_delay = 0.0
+        self._respawn_at = 0.0
+        self._stopping = False
+        self._reload = False
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        log.info(f"Starting {self._workers} workers")
+
+        while not self._stopping:
+            self._reap()
+            if self._reload:
+                self._reload = False
+                self._reload_workers()
+            while len(self._pids) - len(self._retiring) < self._workers and not self._stopping:
+                if time.time() < self._respawn_at:
+                    break
+                self._spawn()
+            time.sleep(POLL_INTERVAL)
+
+        self._stop_all()
+
+    def _on_stop(self, signum, frame):
+        # pylint: disable=unused-argument
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        # pylint: disable=unused-argument
+        self._reload = True
+
+    def _spawn(self) -> int:
+        used = set(self._pids.values())
+        idx = next(idx for idx in range(self._slots.count) if idx not in used)
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                for signum in (signal.SIGTERM, signal.SIGINT):
+                    signal.signal(signum, signal.SIG_DFL)
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                self._run_worker(idx)
+            except BaseException:  # pylint: disable=broad-except
+                log.exception("Worker failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)  # pylint: disable=protected-access
+        self._slots.assign(idx, pid)
+        self._pids[pid] = idx
+        self._started[pid] = time.time()
+        log.info(f"Started worker {pid}")
+        return pid
+
+    def _reap(self) -> None:
+        while self._pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            idx = self._pids.pop(pid, None)
+            if idx is None:
+                continue
+            self._slots.clear(idx)
+            uptime = time.time() - self._started.pop(pid)
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                log.info(f"Worker {pid} finished")
+            elif not self._stopping:
+                if uptime < MIN_UPTIME:
+                    self._respawn_delay = min(MAX_RESPAWN_DELAY, max(1.0, 2 * self._respawn_delay))
+                else:
+                    self._respawn_delay = 0.0
+                self._respawn_at = time.time() + self._respawn_delay
+                log.warning(
+                    f"Worker {pid} exited unexpectedly with status {status}, starting new one in {self._respawn_delay}s"
+                )
+
+    def _reload_workers(self) -> None:
+        log.info("Reloading workers")
+        for old_pid in list(self._pids):
+            if self._stopping:
+                return
+            new_pid = self._spawn()
+            deadline = time.time() + READY_TIMEOUT
+            while new_pid in self._pids and not self._slots.is_ready(self._pids[new_pid]) and time.time() < deadline:
+                time.sleep(POLL_INTERVAL)
+                self._reap()
+            if new_pid not in self._pids:
+                log.error(f"New worker {new_pid} failed to start, remaining workers are not reloaded")
+                return
+            if old_pid in self._pids:
+                self._retiring.add(old_pid)
+                os.kill(old_pid, signal.SIGTERM)
+
+    def _stop_all(self) -> None:
+        log.info("Stopping workers")
+        for pid in self._pids:
+            self._retiring.add(pid)
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.time() + STOP_TIMEOUT
+        while self._pids and time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            self._reap()
+        for pid in self._pids:
+            log.warning(f"Worker {pid} did not finish in time, killing it")
+            os.kill(pid, signal.SIGKILL)
@@ -4,6 +4,7 @@ from datetime import datetime
 import decimal
 import logging
 import math
+import re
 
 from pytz import utc
 import ujson as json
@@ -64,37 +65,54 @@ def to_nai(value):
     return ret
 
 
+class _EscapeTable(dict):
+    """Translation table for `str.translate`; escapes of characters are computed on first use."""
+
+    def __missing__(self, ordinal):
+        ch = chr(ordinal)
+        if ch in SPECIAL_CHARS:
+            escaped = SPECIAL_CHARS[ch]
+        elif ordinal <= 0x80 and ch.isprintable():
+            escaped = ch
+        elif ordinal > 0xFFFF:
+            escaped = f'\\U{ordinal:08x}'
+        else:
+            escaped = f'\\u{ordinal:04x}'
+        self[ordinal] = escaped
+        return escaped
+
+
+_ESCAPE_TABLE = _EscapeTable()
+
+# anything except printable ascii characters that are passed through unescaped
+_NEEDS_ESCAPE = re.compile(r"[^\x20-\x7e]|[\\'%_:]")
+
+
 def escape_characters(text):
     """Escape special charactes"""
     assert isinstance(text, str), f"Expected string got: {type(text)}"
     if len(text.strip()) == 0:
         return "'" + text + "'"
 
-    ret = "E'"
+    if _NEEDS_ESCAPE.search(text) is None:
+        return "E'" + text + "'"
 
-    for ch in text:
-        if ch in SPECIAL_CHARS:
-            dw = SPECIAL_CHARS[ch]
-            ret = ret + dw
+    return "E'" + text.translate(_ESCAPE_TABLE) + "'"
+
+
+def escape_characters_batch(texts):
+    """Escape special characters of every value in `texts`, e.g. whole column of flushed rows."""
+    search = _NEEDS_ESCAPE.search
+    table = _ESCAPE_TABLE
+    ret = []
+    for text in texts:
+        assert isinstance(text, str), f"Expected string got: {type(text)}"
+        if len(text.strip()) == 0:
+            ret.append("'" + text + "'")
+        elif search(text) is None:
+            ret.append("E'" + text + "'")
         else:
-            ordinal = ord(ch)
-            if ordinal <= 0x80 and ch.isprintable():
-                ret = ret + ch
-            else:
-                hexstr = hex(ordinal)[2:]
-                i = len(hexstr)
-                max = 4
-                escaped_value = '\\u'
-                if i > max:
-                    max = 8
-                    escaped_value = '\\U'
-                while i < max:
-                    escaped_value += '0'
-                    i += 1
-                escaped_value += hexstr
-                ret = ret + escaped_value
-
-    ret = ret + "'"
+            ret.append("E'" + text.translate(table) + "'")
     return ret
 
 
@@ -94,6 +94,28 @@ class PrometheusClient:
         else:
             raise Exception(f"Not expected type. Should be list or BroadcastObject, but: {type(obj)} given")
 
+    @staticmethod
+    def forward_from_workers():
+        """Before forking worker processes: returns function which makes a worker broadcast through this process."""
+        if PrometheusClient.deamon is None:
+            return lambda: None
+
+        from multiprocessing import Queue as ProcessQueue
+        from threading import Thread
+
+        workers_queue = ProcessQueue()
+
+        def forward():
+            while True:
+                PrometheusClient.logs_to_broadcast.put(workers_queue.get(True))
+
+        Thread(target=forward, daemon=True).start()
+
+        def use_in_worker():
+            PrometheusClient.logs_to_broadcast = workers_queue
+
+        return use_in_worker
+
 
 class Stat:
     def __init__(self, time):
@@ -287,6 +309,9 @@ class FinalOperationStatusManager(StatusManager):
     # Currently processed blocks stats, merged to global stats, after `next_block`
     current_finals = {}
 
+    # Chain of dependent operations which determined duration of the current ones
+    current_critical_path = []
+
     @staticmethod
     def final_stat(name, time):
         if name in FinalOperationStatusManager.current_finals.keys():
@@ -302,9 +327,25 @@ class FinalOperationStatusManager(StatusManager):
         log.info(f"Current final processing time: {tm :.4f}s.")
         return tm
 
+    @staticmethod
+    def critical_path_stat(path):
+        FinalOperationStatusManager.current_critical_path = [(name, FinalStat(time)) for name, time in path]
+
+    @staticmethod
+    def log_critical_path(label: str):
+        StatusManager.print_row()
+        log.info(label)
+        tm = 0.0
+        for name, stat in FinalOperationStatusManager.current_critical_path:
+            log.info(f"`{name}`: {stat}")
+            tm += stat.time
+        log.info(f"Critical path time: {tm :.4f}s.")
+        return tm
+
     @staticmethod
     def clear():
         FinalOperationStatusManager.current_finals.clear()
+        FinalOperationStatusManager.current_critical_path = []
 
 
 class WaitStat(Stat):
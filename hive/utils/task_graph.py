@@ -0,0 +1,91 @@
+"""Tasks with dependencies executed in threads as soon as tasks they depend on are finished."""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import logging
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class TaskGraph:
+    """Named tasks, each of which may depend on tasks added before it (so the graph has no cycles)."""
+
+    def __init__(self):
+        self._tasks: Dict[str, Tuple[Callable, list, List[str]]] = {}
+
+    def add(self, name: str, method: Callable, args: Optional[list] = None, after: Iterable[str] = ()) -> None:
+        after = list(after)
+        assert name not in self._tasks, f"task {name} added twice"
+        unknown = [dependency for dependency in after if dependency not in self._tasks]
+        assert not unknown, f"task {name} depends on unknown tasks: {unknown}"
+        self._tasks[name] = (method, args or [], after)
+
+    def names(self) -> List[str]:
+        return list(self._tasks)
+
+    def dependencies(self, name: str) -> List[str]:
+        return self._tasks[name][2]
+
+    def run(
+        self,
+        max_workers: int,
+        done: Iterable[str] = (),
+        on_finished: Optional[Callable[[str, float], None]] = None,
+    ) -> Dict[str, float]:
+        """Executes tasks which are not `done` yet, at most `max_workers` at a time.
+
+        `on_finished` is called (in calling thread) with name and elapsed time of each task as soon as it
+        finishes. Returns elapsed times of executed tasks. First exception of a task is raised once running
+        tasks finish; tasks not started by then are not executed.
+        """
+        done = set(done) & set(self._tasks)
+        pending = [name for name in self._tasks if name not in done]
+        running: Dict[Future, str] = {}
+        times = {}
+
+        def timed(method, args):
+            start = perf_counter()
+            method(*args)
+            return perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            while pending or running:
+                for name in [
+                    name for name in pending if all(dependency in done for dependency in self._tasks[name][2])
+                ]:
+                    if len(running) >= max(1, max_workers):
+                        break
+                    pending.remove(name)
+                    method, args, _ = self._tasks[name]
+                    running[pool.submit(timed, method, args)] = name
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        times[name] = future.result()
+                    except Exception as exc:
+                        log.error(f'{name!r} generated an exception: {exc}')
+                        raise exc
+                    done.add(name)
+                    if on_finished is not None:
+                        on_finished(name, times[name])
+
+        return times
+
+    def critical_path(self, times: Dict[str, float]) -> List[Tuple[str, float]]:
+        """The chain of dependent tasks with the longest sum of `times` (missing ones take no time)."""
+        path_time = {}
+        previous = {}
+        for name, (_, _, after) in self._tasks.items():
+            longest = max(after, key=lambda dependency: path_time[dependency], default=None)
+            previous[name] = longest
+            path_time[name] = times.get(name, 0.0) + (path_time[longest] if longest is not None else 0.0)
+
+        path = []
+        name = max(path_time, key=lambda name: path_time[name], default=None)
+        while name is not None:
+            path.append((name, times.get(name, 0.0)))
+            name = previous[name]
+        return path[::-1]
@@ -23,6 +23,8 @@ haf_sync() {
         --prometheus-port 11011 \
         --database-url "${HAF_POSTGRES_URL}" \
         --community-start-block 4998000 \
+        --in-memory-reputations=True \
+        --check-reputations=True \
         2>&1 | tee -i "$LOG_DIR/hivemind-sync.log"
 }
 
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Measures time of escaping strings for SQL literals with `escape_characters` and `escape_characters_batch` of
+hive.utils.normalize, compared to their former char by char implementation. Datasets are strings of mock_data,
+permlinks and 10kB ascii, markdown and unicode bodies; results of all implementations are checked to be equal.
+"""
+import argparse
+import json
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from hive.utils.normalize import SPECIAL_CHARS, escape_characters, escape_characters_batch  # noqa: E402
+
+MOCK_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'mock_data')
+
+
+def legacy_escape_characters(text):
+    if len(text.strip()) == 0:
+        return "'" + text + "'"
+
+    ret = "E'"
+    for ch in text:
+        if ch in SPECIAL_CHARS:
+            ret = ret + SPECIAL_CHARS[ch]
+        else:
+            ordinal = ord(ch)
+            if ordinal <= 0x80 and ch.isprintable():
+                ret = ret + ch
+            else:
+                hexstr = hex(ordinal)[2:]
+                i = len(hexstr)
+                max = 4
+                escaped_value = '\\u'
+                if i > max:
+                    max = 8
+                    escaped_value = '\\U'
+                while i < max:
+                    escaped_value += '0'
+                    i += 1
+                escaped_value += hexstr
+                ret = ret + escaped_value
+    return ret + "'"
+
+
+def collect_strings(node, out):
+    if isinstance(node, str):
+        out.append(node)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            out.append(key)
+            collect_strings(value, out)
+    elif isinstance(node, list):
+        for value in node:
+            collect_strings(value, out)
+
+
+def load_datasets():
+    corpus = []
+    for root, _, files in os.walk(MOCK_DATA_DIR):
+        for name in sorted(files):
+            if name.endswith('.json'):
+                with open(os.path.join(root, name), encoding='utf-8') as file:
+                    collect_strings(json.load(file), corpus)
+
+    return {
+        'mock_data corpus': corpus,
+        'permlinks': [f're-author-{i}-20200323t121700z' for i in range(10000)],
+        'ascii bodies (10kB)': [('Lorem ipsum dolor sit amet. ' * 360)[:10000] for _ in range(100)],
+        'markdown bodies (10kB)': [
+            ("## Title\n![img](https://x.com/a_b.jpg) it's 100%\n" * 200)[:10000] for _ in range(100)
+        ],
+        'unicode bodies (10kB)': [('Zażółć gęślą jaźń 🚀\n' * 500)[:10000] for _ in range(100)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='number of passes over every dataset')
+    args = parser.parse_args()
+
+    print(f"{'dataset':<24}{'values':>8}{'legacy [s]':>12}{'single [s]':>12}{'batch [s]':>12}{'speedup':>10}")
+    for name, values in load_datasets().items():
+        assert [legacy_escape_characters(v) for v in values] == escape_characters_batch(values), name
+
+        legacy = timeit(lambda: [legacy_escape_characters(v) for v in values], number=args.repeat)
+        single = timeit(lambda: [escape_characters(v) for v in values], number=args.repeat)
+        batch = timeit(lambda: escape_characters_batch(values), number=args.repeat)
+        print(f"{name:<24}{len(values):>8}{legacy:>12.4f}{single:>12.4f}{batch:>12.4f}{legacy / batch:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
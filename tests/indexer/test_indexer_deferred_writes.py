@@ -0,0 +1,42 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from hive.db.db_state import DbState
+from hive.indexer.deferred_writes import DeferredWrites
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    monkeypatch.setattr(DbState, 'is_massive_sync', classmethod(lambda cls: True))
+    DeferredWrites.setup(True)
+    yield []
+    DeferredWrites.setup(False)
+
+
+def test_consecutive_writes_grouped_in_order(applied):
+    def first(items):
+        applied.append(('first', items))
+
+    def second(items):
+        applied.append(('second', items))
+
+    for apply, item in [(first, 1), (first, 2), (second, 3), (first, 4), (second, 5), (second, 6)]:
+        DeferredWrites.add(apply, item)
+    assert not applied
+
+    assert DeferredWrites.apply() == 6
+    assert applied == [('first', [1, 2]), ('second', [3]), ('first', [4]), ('second', [5, 6])]
+    assert DeferredWrites.apply() == 0
+
+
+def test_writes_performed_immediately_when_not_collected(applied, monkeypatch):
+    # live sync
+    monkeypatch.setattr(DbState, 'is_massive_sync', classmethod(lambda cls: False))
+    DeferredWrites.add(applied.append, 1)
+    # collecting disabled
+    monkeypatch.setattr(DbState, 'is_massive_sync', classmethod(lambda cls: True))
+    DeferredWrites.setup(False)
+    DeferredWrites.add(applied.append, 2)
+
+    assert applied == [[1], [2]]
+    assert DeferredWrites.apply() == 0
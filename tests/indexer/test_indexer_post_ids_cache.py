@@ -0,0 +1,74 @@
+# pylint: disable=missing-docstring,wrong-import-position
+import pytest
+
+from hive.db.adapter import Db
+
+# indexer modules take shared database adapter when imported
+if Db._instance is None:  # pylint: disable=protected-access
+    Db.set_shared_instance(object())
+
+from hive.indexer.accounts import Accounts
+from hive.indexer.post_ids_cache import PostIdsCache
+from hive.indexer.posts import Posts
+from hive.indexer.votes import Votes
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(Accounts, '_ids', {'alice': 1, 'bob': 2})
+    PostIdsCache.setup(2)
+    yield PostIdsCache
+    PostIdsCache.setup(PostIdsCache.CACHE_SIZE)
+
+
+def test_ids_packed_and_unpacked(cache):
+    cache.put(1, 'post', 2**32 - 1, 7, 3)
+    assert cache.get(1, 'post') == (2**32 - 1, 7, 3)
+    assert cache.get_by_name('alice', 'post') == (2**32 - 1, 7, 3)
+    assert cache.get_post_id('alice', 'post') == 2**32 - 1
+    assert cache.get_post_id('alice', 'other') is None
+    assert cache.get_post_id('unknown', 'post') is None
+
+
+def test_least_recently_used_evicted(cache):
+    cache.put(1, 'a', 10, 1)
+    cache.put(1, 'b', 11, 2)
+    assert cache.get(1, 'a') == (10, 1, 0)  # b becomes least recently used
+    cache.put(2, 'c', 12, 3)
+
+    assert cache.get(1, 'b') is None
+    assert cache.get(1, 'a') == (10, 1, 0)
+    assert cache.get(2, 'c') == (12, 3, 0)
+
+    # edit of cached post refreshes it
+    cache.put(1, 'a', 10, 1)
+    cache.put(2, 'd', 13, 4)
+    assert cache.get(2, 'c') is None
+    assert cache.get(1, 'a') == (10, 1, 0)
+
+
+def test_disabled_cache_keeps_nothing(cache):
+    cache.setup(0)
+    cache.put(1, 'a', 10, 1)
+    assert not cache.is_enabled()
+    assert cache.get(1, 'a') is None
+
+
+def test_deleted_post_invalidated(cache, monkeypatch):
+    monkeypatch.setattr(Votes, 'drop_votes_of_deleted_comment', classmethod(lambda cls, op: None))
+    monkeypatch.setattr(Posts, '_apply_deletes', classmethod(lambda cls, items: None))
+    cache.put(1, 'a', 10, 1)
+    cache.put(2, 'a', 11, 2)
+
+    Posts.delete({'author': 'alice', 'permlink': 'a', 'block_num': 1}, '2016-03-24T16:05:00')
+
+    assert cache.get(1, 'a') is None
+    assert cache.get(2, 'a') == (11, 2, 0)
+
+
+def test_cleared_on_revert(cache):
+    cache.put(1, 'a', 10, 1)
+    cache.put(2, 'b', 11, 2)
+    cache.clear()
+    assert cache.get(1, 'a') is None
+    assert cache.get(2, 'b') is None
@@ -0,0 +1,47 @@
+# pylint: disable=missing-docstring,wrong-import-position
+import json
+
+import pytest
+
+from hive.db.adapter import Db
+
+# indexer modules take shared database adapter when imported
+if Db._instance is None:  # pylint: disable=protected-access
+    Db.set_shared_instance(object())
+
+from hive.indexer.reblog import Reblog
+
+REBLOG = {'account': 'alice', 'author': 'bob', 'permlink': 'post'}
+DELETE = dict(REBLOG, delete='delete')
+
+
+def custom_json(op_id, data):
+    return {'id': op_id, 'json': json.dumps(data), 'required_posting_auths': ['alice']}
+
+
+@pytest.mark.parametrize(
+    'op',
+    [
+        custom_json('follow', ['reblog', DELETE]),
+        custom_json('reblog', ['reblog', DELETE]),
+        custom_json('reblog', DELETE),
+    ],
+)
+def test_deleted_reblog_key(op):
+    assert Reblog.deleted_reblog_key(op) == 'bob/post/alice'
+
+
+@pytest.mark.parametrize(
+    'op',
+    [
+        custom_json('follow', ['reblog', REBLOG]),
+        custom_json('follow', ['reblog', dict(REBLOG, delete='no')]),
+        custom_json('follow', DELETE),
+        custom_json('follow', ['follow', DELETE]),
+        custom_json('community', ['reblog', DELETE]),
+        custom_json('follow', ['reblog', DELETE, 'extra']),
+        {'id': 'follow', 'json': '["reblog", {"delete": "delete"'},
+    ],
+)
+def test_not_deleted_reblog(op):
+    assert Reblog.deleted_reblog_key(op) is None
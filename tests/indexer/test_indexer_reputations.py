@@ -0,0 +1,162 @@
+# pylint: disable=missing-docstring,wrong-import-position
+import random
+
+import pytest
+
+from hive.db.adapter import Db
+
+
+class FakeDb:
+    def __init__(self, accounts):
+        self.accounts = accounts
+
+    def query_all(self, sql):
+        if 'hive_reputation_data' in sql:
+            return []
+        return [
+            dict(id=account_id, reputation=reputation, is_implicit=is_implicit)
+            for account_id, (reputation, is_implicit) in sorted(self.accounts.items())
+        ]
+
+
+# indexer modules take shared database adapter when imported
+if Db._instance is None:  # pylint: disable=protected-access
+    Db.set_shared_instance(FakeDb({}))
+
+from hive.indexer.accounts import Accounts
+from hive.indexer.reputations import PREV_RSHARES_GENERATION_BLOCKS, ReputationEngine
+
+DAY = 24 * 1200
+
+
+def sql_reputations(accounts, votes, retention_blocks):
+    """Reputations changed by votes, following `calculate_account_reputations` rule by rule.
+
+    `accounts` maps id to (reputation, is_implicit), votes are (block_num, author_id, voter_id, permlink, rshares);
+    previous rshares come from `hive_reputation_data`, which keeps votes of last `retention_blocks`.
+    """
+    reputations = {account_id: list(value) for account_id, value in accounts.items()}
+    changed = set()
+    history = []
+    for block_num, author_id, voter_id, permlink, rshares in votes:
+        prev_rshares = 0
+        for prev_block_num, prev_author_id, prev_voter_id, prev_permlink, prev in reversed(history):
+            if (prev_author_id, prev_voter_id, prev_permlink) == (author_id, voter_id, permlink):
+                if prev_block_num >= block_num - retention_blocks:
+                    prev_rshares = prev
+                break
+        history.append((block_num, author_id, voter_id, permlink, rshares))
+
+        voter_rep = reputations[voter_id][0]
+        implicit_author_rep = reputations[author_id][1]
+        if voter_rep < 0:
+            continue
+
+        implicit_voter_rep = reputations[voter_id][1]
+        author_rep = reputations[author_id][0]
+        prev_rep_delta = prev_rshares >> 6
+        if not implicit_author_rep and (
+            prev_rshares > 0
+            or (prev_rshares < 0 and not implicit_voter_rep and voter_rep > author_rep - prev_rep_delta)
+        ):
+            author_rep = author_rep - prev_rep_delta
+            implicit_author_rep = author_rep == 0
+            reputations[author_id] = [author_rep, implicit_author_rep]
+            changed.add(author_id)
+
+        implicit_voter_rep = reputations[voter_id][1]
+        voter_rep = reputations[voter_id][0]
+        if rshares > 0 or (rshares < 0 and not implicit_voter_rep and voter_rep > author_rep):
+            reputations[author_id] = [author_rep + (rshares >> 6), False]
+            changed.add(author_id)
+
+    return [(account_id, reputations[account_id][0], reputations[account_id][1]) for account_id in sorted(changed)]
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    accounts = {
+        1: (0, True),
+        2: (0, True),
+        3: (10**12, False),
+        4: (5 * 10**11, False),
+        5: (-(10**10), False),
+        6: (10**9, False),
+    }
+    monkeypatch.setattr(Accounts, '_ids', {f'account{account_id}': account_id for account_id in accounts})
+    yield accounts
+    ReputationEngine.stop()
+
+
+def engine_reputations(accounts, votes, first_block):
+    ReputationEngine.start(FakeDb(accounts), first_block)
+    for block_num, author_id, voter_id, permlink, rshares in votes:
+        ReputationEngine.process_vote(block_num, f'account{author_id}', f'account{voter_id}', permlink, rshares)
+    return ReputationEngine.changed_reputations()
+
+
+CASES = {
+    'self vote': [
+        (1, 3, 3, 'p', 10**9),
+        (2, 3, 3, 'p', -(10**9)),
+        (3, 1, 1, 'p', 5 * 10**8),
+        (4, 1, 1, 'p', -(10**8)),
+    ],
+    'negative voter reputation': [(1, 4, 5, 'p', 10**12), (2, 4, 5, 'q', -(10**12)), (3, 5, 3, 'p', 10**9)],
+    'implicit flags': [
+        # flag of implicit voter is ignored, flag of explicit voter with higher reputation is not
+        (1, 4, 1, 'p', -(10**12)),
+        (2, 4, 3, 'p', -(10**12)),
+        # author with lower reputation than voter cannot flag
+        (3, 3, 6, 'p', -(10**9)),
+        (4, 2, 3, 'p', -(10**9)),
+    ],
+    'changed vote': [
+        (1, 2, 3, 'p', 10**12),
+        (2, 2, 3, 'p', -(10**11)),
+        (3, 2, 3, 'p', 0),
+        (4, 6, 4, 'p', -(10**11)),
+        (5, 6, 4, 'p', 10**11),
+        (6, 6, 4, 'q', 10**11),
+        (7, 6, 4, 'p', 10**10),
+    ],
+}
+
+
+@pytest.mark.parametrize('votes', CASES.values(), ids=CASES.keys())
+def test_process_vote_same_as_sql(accounts, votes):
+    expected = sql_reputations(accounts, votes, PREV_RSHARES_GENERATION_BLOCKS)
+    assert expected
+    assert engine_reputations(accounts, votes, first_block=1) == expected
+
+
+def test_previous_votes_forgotten_after_generations(accounts):
+    votes = [
+        (DAY, 6, 3, 'p', 10**12),
+        (10 * DAY, 6, 3, 'p', 10**11),  # 9 days old vote is corrected
+        (25 * DAY, 6, 4, 'q', 10**11),
+        (31 * DAY, 2, 1, 'x', 1),  # new generation of previous rshares
+        (40 * DAY, 6, 4, 'q', 10**10),  # 15 days old vote from previous generation is corrected
+        (62 * DAY, 2, 1, 'y', 1),  # new generation, votes before day 31 are forgotten
+        (75 * DAY, 6, 3, 'p', 10**10),  # 65 days old vote is not corrected
+    ]
+    expected = sql_reputations(accounts, votes, PREV_RSHARES_GENERATION_BLOCKS)
+    assert engine_reputations(accounts, votes, first_block=DAY) == expected
+    # reputation of account6 includes last votes only partially corrected: 10**9 + (10**10 >> 6) * 2 + (10**11 >> 6)
+    assert dict((account_id, rep) for account_id, rep, _ in expected)[6] == 10**9 + 2 * (10**10 >> 6) + (
+        10**11 >> 6
+    )
+
+
+def test_random_votes_same_as_sql(accounts):
+    rnd = random.Random(21)
+    votes = []
+    for block_num in range(1, 2001):
+        author_id = rnd.choice(list(accounts))
+        voter_id = rnd.choice(list(accounts))
+        rshares = rnd.choice([0, rnd.randint(-(10**12), 10**12), rnd.randint(-(10**6), 10**6)])
+        votes.append((block_num, author_id, voter_id, rnd.choice('abc'), rshares))
+
+    assert engine_reputations(accounts, votes, first_block=1) == sql_reputations(
+        accounts, votes, PREV_RSHARES_GENERATION_BLOCKS
+    )
@@ -0,0 +1,85 @@
+# pylint: disable=missing-docstring
+import asyncio
+
+import pytest
+
+from hive.server.common.batch_loader import BatchLoader, get_loader
+from hive.server.db import current_method
+
+
+class BatchFn:
+    """Fake batch function which records requested keys and returns their doubles."""
+
+    def __init__(self, error: Exception = None):
+        self.batches = []
+        self.error = error
+
+    async def __call__(self, keys):
+        self.batches.append(keys)
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return {key: key * 2 for key in keys if key >= 0}
+
+
+@pytest.mark.asyncio
+async def test_lookups_at_the_same_time_share_one_batch():
+    batch_fn = BatchFn()
+    loader = BatchLoader(batch_fn)
+
+    results = await asyncio.gather(loader.load_many([1, 2]), loader.load_many([1]), loader.load_many([3, 2]))
+
+    assert results == [[2, 4], [2], [6, 4]]
+    assert batch_fn.batches == [[1, 2, 3]]
+
+    # later lookups make next batch, values are not cached
+    assert await loader.load(1) == 2
+    assert batch_fn.batches == [[1, 2, 3], [1]]
+
+
+@pytest.mark.asyncio
+async def test_values_in_order_of_keys():
+    loader = BatchLoader(BatchFn())
+    assert await loader.load_many([5, 3, 4, 3]) == [10, 6, 8, 6]
+    assert await loader.load_many([]) == []
+
+
+@pytest.mark.asyncio
+async def test_missing_keys_get_default():
+    loader = BatchLoader(BatchFn(), default=())
+    assert await loader.load_many([1, -1, 2]) == [2, (), 4]
+    assert await BatchLoader(BatchFn()).load(-1) is None
+
+
+@pytest.mark.asyncio
+async def test_exception_propagates_to_every_lookup():
+    batch_fn = BatchFn(ValueError('failed'))
+    loader = BatchLoader(batch_fn)
+
+    results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert batch_fn.batches == [[1, 2]]
+
+    batch_fn.error = None
+    assert await loader.load(1) == 2
+
+
+@pytest.mark.asyncio
+async def test_loaders_separate_for_api_methods():
+    class FakeDb:
+        loaders = {}
+
+    db = FakeDb()
+    batches = []
+
+    async def batch_fn(batch_db, keys):
+        assert batch_db is db
+        batches.append((current_method.get(), keys))
+        return {key: key for key in keys}
+
+    async def lookup(method, key):
+        current_method.set(method)
+        return await get_loader(db, 'name', batch_fn).load(key)
+
+    assert await asyncio.gather(lookup('a', 1), lookup('a', 2), lookup('b', 3)) == [1, 2, 3]
+    assert sorted(batches) == [('a', [1, 2]), ('b', [3])]
@@ -0,0 +1,81 @@
+# pylint: disable=missing-docstring
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from hive.server.database_api.methods import find_votes_impl, find_votes_of_posts, VotesPresentation
+
+
+class Row(dict):
+    """Row of query result, with access by column name and as attribute."""
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+def vote(post_id, author, permlink, voter_id, voter, rshares, percent):
+    return Row(
+        post_id=post_id,
+        id=post_id * 100 + voter_id,
+        voter=voter,
+        author=author,
+        permlink=permlink,
+        weight=rshares * 10,
+        rshares=rshares,
+        percent=percent,
+        last_update=datetime(2016, 3, 24, 16, voter_id),
+        num_changes=voter_id % 2,
+        reputation=voter_id * 1000,
+    )
+
+
+POSTS = {1: ('alice', 'first'), 2: ('bob', 'second'), 3: ('carol', 'no-votes')}
+VOTES = [
+    vote(1, 'alice', 'first', 1, 'dave', 100, 10000),
+    vote(1, 'alice', 'first', 2, 'eve', -50, -5000),
+    vote(2, 'bob', 'second', 1, 'dave', 7, 100),
+]
+
+
+class FakeDb:
+    """Answers find_votes and find_votes_for_posts like the SQL functions: votes of post ordered by voter."""
+
+    def __init__(self):
+        self.loaders = {}
+        self.queries = []
+
+    async def query_all(self, sql, **kwargs):
+        self.queries.append(sql)
+        await asyncio.sleep(0)
+        if 'find_votes_for_posts' in sql:
+            post_ids = list(dict.fromkeys(kwargs['post_ids']))
+            return [row for post_id in post_ids for row in VOTES if row.post_id == post_id][
+                : kwargs['limit'] * len(post_ids)
+            ]
+        assert 'find_votes(' in sql
+        key = (kwargs['author'], kwargs['permlink'])
+        return [Row({k: v for k, v in row.items() if k != 'post_id'}) for row in VOTES if POSTS[row.post_id] == key]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('votes_presentation', list(VotesPresentation))
+async def test_votes_of_posts_same_as_find_votes(votes_presentation):
+    db = FakeDb()
+    post_ids = [2, 1, 3, 1]
+
+    expected = [await find_votes_impl(db, *POSTS[post_id], votes_presentation) for post_id in post_ids]
+    assert await find_votes_of_posts(db, post_ids, votes_presentation) == expected
+    assert expected[1] and not expected[2]
+
+
+@pytest.mark.asyncio
+async def test_votes_of_posts_share_one_query():
+    db = FakeDb()
+    results = await asyncio.gather(
+        find_votes_of_posts(db, [1], VotesPresentation.CondenserApi),
+        find_votes_of_posts(db, [2, 3], VotesPresentation.CondenserApi),
+    )
+
+    assert [[v['voter'] for v in votes] for votes in results[0] + results[1]] == [['dave', 'eve'], ['dave'], []]
+    assert len(db.queries) == 1
@@ -0,0 +1,123 @@
+# pylint: disable=missing-docstring
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from hive.server.common.response_cache import ENTRY_OVERHEAD, ResponseCache
+from hive.server.common.response_encoder import encode, EncodedJson, iter_encode
+
+
+class Method:
+    """Fake API method which counts its calls and returns results given to it."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.mark.asyncio
+async def test_result_encoded_once_and_cached():
+    cache = ResponseCache(1024 * 1024)
+    cache.set_head_block(1)
+    method = Method({'votes': [Decimal('12345678901234567890')]})
+
+    first = await cache.get('m', ('m', b'1'), method)
+    second = await cache.get('m', ('m', b'1'), method)
+
+    assert method.calls == 1
+    assert isinstance(first, EncodedJson) and second is first
+    assert first.data == b'{"votes":[12345678901234567890]}'
+    assert b''.join(iter_encode({'id': 1, 'result': first})) == b'{"id":1,"result":{"votes":[12345678901234567890]}}'
+    assert encode([first]) == b'[{"votes":[12345678901234567890]}]'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_call():
+    cache = ResponseCache(1024 * 1024)
+    cache.set_head_block(1)
+    method = Method([1])
+
+    results = await asyncio.gather(*[cache.get('m', ('m', b'1'), method) for _ in range(5)])
+
+    assert method.calls == 1
+    assert all(result is results[0] for result in results)
+
+
+@pytest.mark.asyncio
+async def test_errors_not_cached():
+    cache = ResponseCache(1024 * 1024)
+    cache.set_head_block(1)
+    method = Method(ValueError('failed'), [1])
+
+    with pytest.raises(ValueError):
+        await cache.get('m', ('m', b'1'), method)
+    assert (await cache.get('m', ('m', b'1'), method)).data == b'[1]'
+    assert method.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cleared_when_head_block_changes():
+    cache = ResponseCache(1024 * 1024)
+    cache.set_head_block(1)
+    method = Method([1], [2], [3])
+
+    assert (await cache.get('m', ('m', b'1'), method)).data == b'[1]'
+    cache.set_head_block(1)
+    assert (await cache.get('m', ('m', b'1'), method)).data == b'[1]'
+    cache.set_head_block(2)
+    assert (await cache.get('m', ('m', b'1'), method)).data == b'[2]'
+
+    # no caching while head block is unknown
+    cache.set_head_block(None)
+    assert await cache.get('m', ('m', b'1'), method) == [3]
+    assert method.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_result_of_previous_block_not_cached():
+    cache = ResponseCache(1024 * 1024)
+    cache.set_head_block(1)
+    method = Method([1], [2])
+
+    async def call_during_next_block():
+        result = await method()
+        cache.set_head_block(2)
+        return result
+
+    await cache.get('m', ('m', b'1'), call_during_next_block)
+    assert (await cache.get('m', ('m', b'1'), method)).data == b'[2]'
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_respects_size_cap():
+    entry_size = len(b'"xxxxxxxxxx"') + ENTRY_OVERHEAD
+    cache = ResponseCache(2 * entry_size)
+    cache.set_head_block(1)
+    method = Method(*['x' * 10] * 5)
+
+    await cache.get('m', ('m', b'1'), method)
+    await cache.get('m', ('m', b'2'), method)
+    await cache.get('m', ('m', b'1'), method)  # hit, 2 becomes least recently used
+    await cache.get('m', ('m', b'3'), method)  # evicts 2
+    assert method.calls == 3
+
+    await cache.get('m', ('m', b'1'), method)
+    await cache.get('m', ('m', b'3'), method)
+    assert method.calls == 3
+    await cache.get('m', ('m', b'2'), method)
+    assert method.calls == 4
+
+    # result larger than the whole cache is not cached
+    method = Method(['x' * entry_size] * 2, [])
+    await cache.get('m', ('m', b'4'), method)
+    await cache.get('m', ('m', b'4'), method)
+    assert method.calls == 2
@@ -0,0 +1,83 @@
+# pylint: disable=missing-docstring
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+import simplejson
+
+from hive.server.common.response_encoder import encode, EncodedJson, iter_encode, write_json
+
+
+def simplejson_encode(obj) -> bytes:
+    return simplejson.dumps(
+        obj,
+        use_decimal=True,
+        ensure_ascii=False,
+        separators=(',', ':'),
+        default=lambda value: value.isoformat(),
+    ).encode('utf-8')
+
+
+RESPONSE = {
+    'jsonrpc': '2.0',
+    'result': [
+        {
+            'total_vote_weight': Decimal('12345678901234567890'),
+            'weight': Decimal('0.100'),
+            'rshares': Decimal('-98765.4321'),
+            'zero': Decimal('0'),
+            'exponent': Decimal('1E+2'),
+            'created': datetime(2016, 3, 24, 16, 5),
+            'updated': datetime(2016, 3, 24, 16, 5, 0, 123456),
+            'body': 'decimal: "0.1" \\u0000decimal:1',
+            'echoed': '\x00decimal:1',
+            'tags': ['a', 'ż', Decimal('1.5'), (Decimal('-1'), None)],
+            'nested': {'deep': [{'weight': Decimal('2.50')}], 7: 'key'},
+        }
+    ]
+    * 3,
+    'id': 1,
+}
+
+
+def test_encode_same_as_simplejson():
+    assert encode(RESPONSE) == simplejson_encode(RESPONSE)
+
+
+def test_iter_encode_same_as_encode():
+    assert b''.join(iter_encode(RESPONSE, chunk_size=16)) == encode(RESPONSE)
+    assert len(list(iter_encode(RESPONSE, chunk_size=16))) > 1
+
+
+def test_encode_without_decimals():
+    assert encode({'a': [1, 'x', None, 1.5]}) == b'{"a":[1,"x",null,1.5]}'
+
+
+def test_encoded_json_written_as_is():
+    encoded = EncodedJson(b'{"w":0.100}')
+    assert encode({'result': encoded, 'w': Decimal('1.0')}) == b'{"result":{"w":0.100},"w":1.0}'
+    assert b''.join(iter_encode({'result': encoded})) == b'{"result":{"w":0.100}}'
+
+
+def test_encode_unsupported_type_fails():
+    with pytest.raises(TypeError):
+        encode({'w': Decimal('1'), 'x': object()})
+    with pytest.raises(TypeError):
+        encode({'x': object()})
+
+
+class FakeRequest:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_write_json_replaces_member_which_cannot_be_encoded():
+    members = [
+        ('ok', {'jsonrpc': '2.0', 'result': [Decimal('1.0')], 'id': 1}),
+        ('broken', {'jsonrpc': '2.0', 'result': {'x': object()}, 'id': 2}),
+    ]
+    response, first = await write_json(FakeRequest(), members, True, {})
+
+    assert response.body == first
+    assert first.startswith(b'[{"jsonrpc":"2.0","result":[1.0],"id":1},{"jsonrpc":"2.0","error":{"code":-32000')
+    assert first.endswith(b'"id":2}]')
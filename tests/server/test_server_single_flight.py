@@ -0,0 +1,110 @@
+# pylint: disable=missing-docstring
+import asyncio
+
+import pytest
+
+from hive.server.common.single_flight import share_results, SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'result': len(calls)}
+
+    results = await asyncio.gather(*[flight.run('key', call) for _ in range(5)])
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert not flight.is_running('key')
+
+    # next call after the shared one finished runs again
+    assert await flight.run('key', call) == {'result': 2}
+
+
+@pytest.mark.asyncio
+async def test_different_keys_not_shared():
+    flight = SingleFlight()
+
+    async def call(value):
+        await asyncio.sleep(0)
+        return value
+
+    assert await asyncio.gather(flight.run('a', lambda: call(1)), flight.run('b', lambda: call(2))) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_and_not_retained():
+    flight = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise ValueError('failed')
+
+    results = await asyncio.gather(*[flight.run('key', failing) for _ in range(3)], return_exceptions=True)
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert not flight.is_running('key')
+
+    async def succeeding():
+        return 'ok'
+
+    assert await flight.run('key', succeeding) == 'ok'
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def call():
+        started.set()
+        await release.wait()
+        return 'done'
+
+    first = asyncio.ensure_future(flight.run('key', call))
+    await started.wait()
+    second = asyncio.ensure_future(flight.run('key', call))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert flight.is_running('key')
+
+    release.set()
+    assert await second == 'done'
+    assert not flight.is_running('key')
+
+
+@pytest.mark.asyncio
+async def test_share_results_keys_by_arguments():
+    calls = []
+
+    async def method(context, author: str, limit: int = 10):
+        calls.append((author, limit))
+        await asyncio.sleep(0)
+        return [author, limit]
+
+    wrapped = share_results('m', method)
+    context = {'single_flight': SingleFlight()}
+
+    results = await asyncio.gather(
+        wrapped(context, 'alice'),
+        wrapped(context, 'alice', 10),
+        wrapped(context, limit=10, author='alice'),
+        wrapped(context, 'bob'),
+    )
+
+    assert results == [['alice', 10], ['alice', 10], ['alice', 10], ['bob', 10]]
+    assert sorted(calls) == [('alice', 10), ('bob', 10)]
+    # without single flight layer every call runs
+    assert await wrapped({}, 'alice') == ['alice', 10]
+    assert len(calls) == 3
@@ -0,0 +1,116 @@
+# pylint: disable=missing-docstring
+from datetime import datetime
+from decimal import Decimal
+import struct
+
+import pytest
+
+from hive.db.bulk_loader import (
+    BulkLoader,
+    COPY_HEADER,
+    COPY_TRAILER,
+    _encode_numeric,
+    _encode_timestamp,
+    encode_copy_binary,
+    sql_literal,
+    StagingTable,
+)
+
+# expected values are fields of `COPY (SELECT <literal>) TO STDOUT (FORMAT binary)` output of postgres
+NUMERICS = [
+    (0, '0000000000000000'),
+    (Decimal('0'), '0000000000000000'),
+    (-1, '00010000400000000001'),
+    (Decimal('12345678901234567890'), '000500040000000004d2162e23340d801ed2'),
+    (10**30, '00010007000000000064'),
+    (Decimal('-0.5'), '0001ffff400000011388'),
+    (Decimal('0.100'), '0001ffff0000000303e8'),
+    (Decimal('123.4500'), '0002000000000004007b1194'),
+    (Decimal('1E-10'), '0001fffd0000000a0064'),
+    (Decimal('-98765.4321'), '00030001400000040009223d10e1'),
+    (Decimal('NaN'), '00000000c0000000'),
+]
+
+TIMESTAMPS = [
+    (datetime(2000, 1, 1), '0000000000000000'),
+    (datetime(1970, 1, 1), 'fffca2fec4c82000'),
+    (datetime(2016, 3, 24, 16, 5, 0, 123456), '0001d1cc608d6540'),
+    ('2016-03-24 16:05:00.123456', '0001d1cc608d6540'),
+    ('infinity', '7fffffffffffffff'),
+    ('-infinity', '8000000000000000'),
+]
+
+
+@pytest.mark.parametrize('value, expected', NUMERICS)
+def test_encode_numeric(value, expected):
+    assert _encode_numeric(value).hex() == expected
+
+
+@pytest.mark.parametrize('value, expected', TIMESTAMPS)
+def test_encode_timestamp(value, expected):
+    assert _encode_timestamp(value).hex() == expected
+
+
+def test_encode_copy_binary():
+    rows = [(1, None, Decimal('-1'), 'a\x00b'), (None, datetime(2000, 1, 1), None, None)]
+    payload = encode_copy_binary(rows, ['INT', 'TIMESTAMP', 'NUMERIC', 'TEXT'])
+
+    expected = (
+        COPY_HEADER
+        + bytes.fromhex('0004' + '00000004' + '00000001' + 'ffffffff' + '0000000a' + '00010000400000000001')
+        + struct.pack('!i', 3)
+        + b'a b'
+        + bytes.fromhex('0004' + 'ffffffff' + '00000008' + '0000000000000000' + 'ffffffff' + 'ffffffff')
+        + COPY_TRAILER
+    )
+    assert payload == expected
+
+
+def test_sql_literal():
+    assert sql_literal(None, 'INT') == 'NULL::INT'
+    assert sql_literal(None, 'TEXT') == 'NULL::TEXT'
+    assert sql_literal(0, 'INT') == '0::INT'
+    assert sql_literal(-5, 'BIGINT') == '-5::BIGINT'
+    assert sql_literal(Decimal('12345678901234567890.001'), 'NUMERIC') == '12345678901234567890.001::NUMERIC'
+    assert sql_literal("it's", 'VARCHAR') == "E'it\\047s'::VARCHAR"
+    assert sql_literal(datetime(2016, 3, 24, 16, 5), 'TIMESTAMP') == "'2016-03-24 16:05:00'::TIMESTAMP"
+
+
+class FakeDb:
+    def __init__(self):
+        self.queries = []
+
+    def query_no_return(self, sql):
+        self.queries.append(sql)
+
+    def query_prepared(self, sql):
+        self.queries.append(sql)
+
+    def copy_expert(self, sql, data):
+        self.queries.append(sql)
+
+
+STAGING = StagingTable('staging', [('id', 'INT'), ('name', 'VARCHAR')])
+MERGE_SQL = 'INSERT INTO t SELECT * FROM {} AS s(id, name)'
+
+
+def test_write_few_rows_in_single_values_query(monkeypatch):
+    monkeypatch.setattr(BulkLoader, 'use_copy', True)
+    db = FakeDb()
+    assert BulkLoader.write(db, STAGING, [(1, 'a')], MERGE_SQL) == 1
+    assert db.queries == ["INSERT INTO t SELECT * FROM (VALUES (1::INT, E'a'::VARCHAR)) AS s(id, name)"]
+    assert BulkLoader.write(db, STAGING, [], MERGE_SQL) == 0
+    assert len(db.queries) == 1
+
+
+def test_write_many_rows_with_copy(monkeypatch):
+    monkeypatch.setattr(BulkLoader, 'use_copy', True)
+    db = FakeDb()
+    rows = [(idx, 'a') for idx in range(BulkLoader.COPY_MIN_ROWS)]
+    assert BulkLoader.write(db, STAGING, rows, MERGE_SQL) == len(rows)
+    assert db.queries == [
+        STAGING.create_sql(),
+        STAGING.truncate_sql(),
+        STAGING.copy_sql(),
+        'INSERT INTO t SELECT * FROM staging AS s(id, name)',
+    ]
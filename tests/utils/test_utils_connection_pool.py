@@ -0,0 +1,98 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import pytest
+
+from hive.db.connection_pool import ConnectionPool, IDLE_NAME
+
+
+class FakeDb:
+    """Records queries sent on the connection instead of opening it."""
+
+    def __init__(self, name, fail_on=None):
+        self.name = name
+        self.queries = []
+        self.closed = False
+        self.trx_active = False
+        self.fail_on = fail_on
+        self.clones = []
+
+    def clone(self, name):
+        clone = FakeDb(name, self.fail_on)
+        self.clones.append(clone)
+        return clone
+
+    def query_no_return(self, sql, **kwargs):
+        self.queries.append((sql, kwargs) if kwargs else sql)
+        if sql == self.fail_on:
+            raise RuntimeError('connection lost')
+        if sql == 'ROLLBACK':
+            self.trx_active = False
+
+    def is_trx_active(self):
+        return self.trx_active
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def db():
+    db = FakeDb('root')
+    ConnectionPool.setup(db, max_idle=2)
+    yield db
+    ConnectionPool.close()
+
+
+def test_released_connection_is_reused(db):
+    leased = ConnectionPool.lease(db, 'first')
+    assert leased.name == 'first' and db.clones == [leased]
+    assert leased.queries == [("SELECT set_config('application_name', :name, false)", {'name': 'hivemind_first'})]
+
+    ConnectionPool.release(leased)
+    assert not leased.closed and leased.name == IDLE_NAME
+    assert leased.queries[-1] == 'RESET ALL'
+
+    assert ConnectionPool.lease(db, 'second') is leased
+    assert leased.name == 'second' and len(db.clones) == 1
+
+
+def test_transaction_rolled_back_on_release(db):
+    leased = ConnectionPool.lease(db, 'trx')
+    leased.trx_active = True
+    ConnectionPool.release(leased)
+    assert leased.queries[-2:] == ['ROLLBACK', 'RESET ALL']
+    assert not leased.closed
+
+
+def test_at_most_max_idle_connections_kept(db):
+    leased = [ConnectionPool.lease(db, f'conn_{number}') for number in range(3)]
+    assert len({id(conn) for conn in leased}) == 3
+
+    for conn in leased:
+        ConnectionPool.release(conn)
+    assert [conn.closed for conn in leased] == [False, False, True]
+
+    ConnectionPool.close()
+    assert all(conn.closed for conn in leased)
+
+
+def test_connection_which_cannot_be_reset_is_closed(db):
+    db.fail_on = 'RESET ALL'
+    leased = ConnectionPool.lease(db, 'broken')
+    ConnectionPool.release(leased)
+    assert leased.closed
+
+    db.fail_on = None
+    assert ConnectionPool.lease(db, 'next') is not leased
+
+
+def test_connections_of_other_databases_not_pooled(db):
+    other = FakeDb('other')
+    leased = ConnectionPool.lease(other, 'other_lease')
+    assert other.clones == [leased] and not leased.queries
+    ConnectionPool.release(leased)
+    assert leased.closed
+
+    ConnectionPool.close()
+    leased = ConnectionPool.lease(db, 'without_setup')
+    ConnectionPool.release(leased)
+    assert leased.closed
@@ -3,6 +3,8 @@ import pytest
 
 from datetime import datetime
 from decimal import Decimal
+import json
+import os
 
 from hive.utils.normalize import (
     block_num,
@@ -22,8 +24,13 @@ from hive.utils.normalize import (
     secs_to_str,
     strtobool,
     int_log_level,
+    escape_characters,
+    escape_characters_batch,
+    SPECIAL_CHARS,
 )
 
+MOCK_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'mock_data')
+
 
 def test_secs_to_str():
     assert secs_to_str(0) == '00s'
@@ -135,3 +142,76 @@ def test_int_log_level():
         int_log_level(None)
     with pytest.raises(ValueError):
         int_log_level('')
+
+
+def _reference_escape_characters(text):
+    """Character by character implementation escape_characters has to stay compatible with."""
+    if len(text.strip()) == 0:
+        return "'" + text + "'"
+
+    ret = "E'"
+    for ch in text:
+        if ch in SPECIAL_CHARS:
+            ret = ret + SPECIAL_CHARS[ch]
+        else:
+            ordinal = ord(ch)
+            if ordinal <= 0x80 and ch.isprintable():
+                ret = ret + ch
+            else:
+                hexstr = hex(ordinal)[2:]
+                i = len(hexstr)
+                max = 4
+                escaped_value = '\\u'
+                if i > max:
+                    max = 8
+                    escaped_value = '\\U'
+                while i < max:
+                    escaped_value += '0'
+                    i += 1
+                escaped_value += hexstr
+                ret = ret + escaped_value
+    return ret + "'"
+
+
+def _collect_strings(node, out):
+    if isinstance(node, str):
+        out.append(node)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            out.append(key)
+            _collect_strings(value, out)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_strings(value, out)
+
+
+def _mock_data_strings():
+    strings = []
+    for root, _, files in os.walk(MOCK_DATA_DIR):
+        for name in sorted(files):
+            with open(os.path.join(root, name), encoding='utf-8') as file:
+                content = file.read()
+            strings.append(content)
+            if name.endswith('.json'):
+                _collect_strings(json.loads(content), strings)
+    return strings
+
+
+def test_escape_characters():
+    assert escape_characters('') == "''"
+    assert escape_characters(' \n') == "' \n'"
+    assert escape_characters('abc') == "E'abc'"
+    assert escape_characters("it's 100%") == "E'it\\047s 100\\045'"
+    assert escape_characters('a\x00b') == "E'a b'"
+    assert escape_characters('\u0105\U0001f600') == "E'\\u0105\\U0001f600'"
+
+
+def test_escape_characters_matches_reference():
+    strings = _mock_data_strings()
+    assert strings
+    strings += [chr(ordinal) * 2 for ordinal in range(0x300)]
+    strings += ['x' + chr(ordinal) for ordinal in (0xD7FF, 0xE000, 0xFFFF, 0x10000, 0x10FFFF)]
+
+    for text in strings:
+        assert escape_characters(text) == _reference_escape_characters(text), repr(text)
+    assert escape_characters_batch(strings) == [_reference_escape_characters(text) for text in strings]
@@ -0,0 +1,29 @@
+# pylint: disable=missing-docstring
+import sqlalchemy
+
+from hive.db.prepared_sql import PreparedSql
+
+
+def test_named_params_become_positional():
+    prepared = PreparedSql('q', "SELECT * FROM t WHERE a = :a AND b = :b OR a > :a")
+    assert prepared.params == ['a', 'b']
+    assert prepared.prepare_sql == "PREPARE q AS SELECT * FROM t WHERE a = $1 AND b = $2 OR a > $1"
+    assert prepared.execute_sql == "EXECUTE q(:a, :b)"
+
+
+def test_casts_and_escapes_are_not_params():
+    prepared = PreparedSql('q', r"SELECT (:id)::INT, 'a'::TEXT, x::VARCHAR, '\:literal', (:name_2)::TEXT FROM t")
+    assert prepared.params == ['id', 'name_2']
+    # the same parameters as recognized by sqlalchemy, which binds them in execute_sql
+    assert set(prepared.params) == set(sqlalchemy.text(prepared.sql).compile().params)
+    assert (
+        prepared.prepare_sql == r"PREPARE q AS SELECT ($1)::INT, 'a'::TEXT, x::VARCHAR, '\:literal', ($2)::TEXT FROM t"
+    )
+    assert prepared.execute_sql == "EXECUTE q(:id, :name_2)"
+
+
+def test_query_without_params():
+    prepared = PreparedSql('q', "SELECT 1")
+    assert prepared.params == []
+    assert prepared.prepare_sql == "PREPARE q AS SELECT 1"
+    assert prepared.execute_sql == "EXECUTE q"
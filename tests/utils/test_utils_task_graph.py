@@ -0,0 +1,57 @@
+# pylint: disable=missing-docstring, invalid-name
+import threading
+
+import pytest
+
+from hive.utils.task_graph import TaskGraph
+
+
+def test_task_graph_order():
+    finished = []
+    lock = threading.Lock()
+
+    def task(name):
+        with lock:
+            finished.append(name)
+
+    graph = TaskGraph()
+    graph.add('a', task, ['a'])
+    graph.add('b', task, ['b'])
+    graph.add('c', task, ['c'], after=['a'])
+    graph.add('d', task, ['d'], after=['b', 'c'])
+
+    reported = []
+    times = graph.run(2, on_finished=lambda name, elapsed: reported.append(name))
+    assert set(times) == {'a', 'b', 'c', 'd'}
+    assert finished.index('c') > finished.index('a')
+    assert finished[-1] == 'd'
+    assert sorted(reported) == sorted(finished)
+
+
+def test_task_graph_resume_and_critical_path():
+    executed = []
+    graph = TaskGraph()
+    graph.add('a', executed.append, ['a'])
+    graph.add('b', executed.append, ['b'])
+    graph.add('c', executed.append, ['c'], after=['a', 'b'])
+
+    graph.run(4, done=['a', 'b'])
+    assert executed == ['c']
+
+    assert graph.critical_path({'a': 1.0, 'b': 3.0, 'c': 2.0}) == [('b', 3.0), ('c', 2.0)]
+
+
+def test_task_graph_errors():
+    graph = TaskGraph()
+    with pytest.raises(AssertionError):
+        graph.add('a', print, after=['b'])
+
+    def fail():
+        raise ValueError('failed')
+
+    executed = []
+    graph.add('a', fail)
+    graph.add('b', executed.append, ['b'], after=['a'])
+    with pytest.raises(ValueError):
+        graph.run(1)
+    assert not executed